@@ -1,30 +1,27 @@
 import json
-import requests
 from datetime import datetime
-import math
-from pymongo import MongoClient
 from pymongo.errors import DuplicateKeyError
-from collections import Counter
-import difflib
-
-# MongoDB connection details
-host = "notify.pesuacademy.com"
-port = 27017
-username = "admin"
-password = ""
-auth_db = "admin"
-db_name = "resumes_database"
-api_key = ""
-
-def get_mongo_client():
-    """Initialize and return MongoDB client."""
-    return MongoClient(
-        host=host,
-        port=port,
-        username=username,
-        password=password,
-        authSource=auth_db
-    )
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from similarity import build_embedding_matrix
+from embeddingsnapshot import ResumeSnapshot
+from embeddingcodec import decode_embedding, encode_embedding
+from embeddingprofile import COMPACT_FIELD, encode_compact, get_profile
+from annindex import ResumeAnnIndex
+from titlematch import TitleIndex, normalize_experiences
+from keywordvocab import KeywordOverlap, KeywordVocabulary, resume_term_ids, term_fields
+from matchstore import MatchStore
+from indexcatalog import check_once
+from llmclient import post
+from mongoconn import db_name, get_mongo_client
+from searchfields import match_search_fields, resume_search_fields, total_experience_years
+
+TITLE_SIM_THRESHOLD = 0.85     # experience titles must score strictly above this
+TOP_LIMIT = 500                # per-job `matches` cap, same rule as getResumeScoreForJD
+# Ranking rule for a job's `matches` array: common-key count, then similarity
+MATCH_SORT = {"commonKeyCount": -1, "similarityScore": -1}
 
 def create_embedding(text):
     """Create embeddings using OpenAI API."""
@@ -33,12 +30,7 @@ def create_embedding(text):
         "model": "text-embedding-3-large"
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-
-    response = requests.post("https://api.openai.com/v1/embeddings", headers=headers, json=data)
+    response = post("embeddings", data)
 
     if response.status_code == 200:
         response_data = response.json()
@@ -49,120 +41,174 @@ def create_embedding(text):
     else:
         raise ValueError(f"Error: {response.json()}")
 
-def get_common_keywords(keywords1, keywords2):
-    """Find common keywords between two lists."""
-    return list(set(keywords1) & set(keywords2))
-
-def calculate_cosine_similarity(vec1, vec2):
-    """Calculate cosine similarity between two vectors using pure Python."""
-    if len(vec1) != len(vec2):
-        raise ValueError("Vectors must have the same length")
-
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    norm1 = math.sqrt(sum(a * a for a in vec1))
-    norm2 = math.sqrt(sum(b * b for b in vec2))
-
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-
-    return dot_product / (norm1 * norm2)
-
 def get_common_experiences(resume_exps, jd_exps):
+    if not isinstance(resume_exps, list) or not isinstance(jd_exps, list):
+        return []
+    return match_experiences(normalize_experiences(resume_exps), normalize_experiences(jd_exps))
+
+def match_experiences(resume_titles, jd_titles):
+    """Fuzzy-match pre-normalised (title, duration) lists."""
+    index = TitleIndex([t for t, _ in jd_titles])
     result = []
-    try:
-        if not isinstance(resume_exps, list) or not isinstance(jd_exps, list):
-            return result
-        for r_exp in resume_exps:
-            r_title = str(r_exp.get("title", "")).lower().strip()
-            r_dur = r_exp.get("duration")
-            if not r_title:
-                continue
-            for j_exp in jd_exps:
-                j_title = str(j_exp.get("title", "")).lower().strip()
-                j_dur = j_exp.get("duration")
-                if not j_title:
-                    continue
-                score = difflib.SequenceMatcher(None, r_title, j_title).ratio()
-                if score > 0.85:
-                    result.append({
-                        "resumeTitle": r_title,
-                        "jdTitle": j_title,
-                        "resumeDuration": r_dur,
-                        "jdDuration": j_dur,
-                        "matchScore": round(score, 2)
-                    })
-        return result
-    except Exception as e:
-        print(f"Experience match error: {str(e)}")
-        return result
+    for r_title, r_dur in resume_titles:
+        for k, score in index.search(r_title, TITLE_SIM_THRESHOLD, inclusive=False):
+            j_title, j_dur = jd_titles[k]
+            result.append(experience_match(r_title, r_dur, j_title, j_dur, score))
+    return result
+
+def experience_match(r_title, r_dur, j_title, j_dur, score):
+    return {
+        "resumeTitle": r_title,
+        "jdTitle": j_title,
+        "resumeDuration": r_dur,
+        "jdDuration": j_dur,
+        "matchScore": round(score, 2)
+    }
 
-def process_resume_matches(mongo_client, resume_id):
+# ── JD catalogue cache ─────────────────────────────────────────────────
+# Survives warm invocations: JD embeddings as one unit-normalised float32
+# matrix plus keyword term-id arrays and one trigram index over every JD's
+# experience titles.
+# Rebuilt when the (document count, newest _id) version of
+# `job_description` changes – JD updates are delete + insert, so both
+# inserts and deletes move it.
+JD_CATALOGUE_PROJECTION = {
+    "jobId": 1, "jobDescription": 1, "embedding": 1,
+    "structured_query.keywords": 1, "structured_query.jobExperiences": 1,
+}
+_jd_cache = {"version": None}
+
+def jd_catalogue_version(jd_collection):
+    latest = jd_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return (jd_collection.estimated_document_count(), latest["_id"] if latest else None)
+
+def load_jd_catalogue(jd_collection, vocab):
+    """Return the cached JD catalogue, rebuilding it if `job_description` moved on."""
+    version = jd_catalogue_version(jd_collection)
+    if _jd_cache["version"] == version:
+        return _jd_cache
+
+    job_ids, descriptions, term_ids, term_labels, title_owners, vectors = [], [], [], [], [], []
+    for jd in jd_collection.find({}, JD_CATALOGUE_PROJECTION):
+        if not jd.get("jobId"):
+            continue
+        query = jd.get("structured_query") or {}
+        keywords = query.get("keywords") or []
+        job_ids.append(jd["jobId"])
+        descriptions.append(jd.get("jobDescription", ""))
+        ids, labels = vocab.labelled(keywords)
+        term_ids.append(ids)
+        term_labels.append(labels)
+        for title, duration in normalize_experiences(query.get("jobExperiences", [])):
+            title_owners.append((len(job_ids) - 1, title, duration))
+        vectors.append(decode_embedding(jd.get("embedding")))
+
+    lengths = np.array([0 if v is None else v.shape[0] for v in vectors], dtype=np.int64)
+    dim = int(np.bincount(lengths).argmax()) if len(lengths) and lengths.any() else 0
+    matrix, valid = build_embedding_matrix(vectors, dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+
+    _jd_cache.clear()
+    _jd_cache.update({
+        "version": version, "jobIds": job_ids, "descriptions": descriptions,
+        "termIds": term_ids, "termLabels": term_labels,
+        "titleIndex": TitleIndex([t for _, t, _ in title_owners]), "titleOwners": title_owners,
+        "unit": matrix / norms, "valid": valid, "dim": dim,
+    })
+    print(f"JD catalogue cache rebuilt: {len(job_ids)} JDs")
+    return _jd_cache
+
+def score_resume_against_catalogue(catalogue, resume_vector):
+    """
+    Cosine similarity of one resume against every cached JD in one
+    matrix-vector product. Returns (scores, comparable) where `comparable`
+    is False for JDs whose embedding length differs from the resume's.
+    """
+    n = len(catalogue["jobIds"])
+    if resume_vector is None or resume_vector.shape[0] != catalogue["dim"]:
+        return np.zeros(n), np.zeros(n, dtype=bool)
+    norm = float(np.linalg.norm(resume_vector))
+    if norm == 0:
+        return np.zeros(n), catalogue["valid"]
+    return catalogue["unit"] @ (resume_vector / norm), catalogue["valid"]
+
+def match_catalogue_experiences(catalogue, resume_titles):
+    """JD index → experience matches, searching each resume title once across all JDs."""
+    per_jd = defaultdict(list)
+    for r_title, r_dur in resume_titles:
+        for k, score in catalogue["titleIndex"].search(r_title, TITLE_SIM_THRESHOLD, inclusive=False):
+            j, j_title, j_dur = catalogue["titleOwners"][k]
+            per_jd[j].append(experience_match(r_title, r_dur, j_title, j_dur, score))
+    return per_jd
+
+def process_resume_matches(mongo_client, resume_id, snapshot=None, vocab=None):
     """Process matches for a single resume and correctly add to `matches` collection."""
     db = mongo_client[db_name]
+    vocab = vocab or KeywordVocabulary.load(db)
     resume_collection = db["resumes"]
     jd_collection = db["job_description"]
     resume_matches_collection = db["resume_matches"]
-    matches_collection = db["matches"]
+    store = MatchStore(db)
 
-    resume = resume_collection.find_one({"resumeId": resume_id})
+    snap_vector = snapshot.vector(resume_id) if snapshot is not None else None
+    projection = {"embedding": 0} if snap_vector is not None else None
+    resume = resume_collection.find_one({"resumeId": resume_id}, projection)
     if not resume:
         raise ValueError(f"Resume with ID {resume_id} not found")
 
-    resume_keywords = [skill.get("skillName") for skill in resume.get("skills", [])] + resume.get("keywords", [])
-    resume_embedding = resume.get("embedding", [])
-    resume_experiences = resume.get("jobExperiences", [])
+    resume_embedding = snap_vector if snap_vector is not None else decode_embedding(resume.get("embedding"))
+    resume_experiences = normalize_experiences(resume.get("jobExperiences", []))
     matches = []
+    job_matches = []
+
+    catalogue = load_jd_catalogue(jd_collection, vocab)
+    scores, comparable = score_resume_against_catalogue(catalogue, resume_embedding)
+    experience_matches = match_catalogue_experiences(catalogue, resume_experiences)
+
+    # Keyword overlap with every JD at once: JD term-id CSR × resume indicator
+    overlap = KeywordOverlap(catalogue["termIds"], [resume_term_ids(resume, vocab)], vocab.size)
+    for j in np.flatnonzero((overlap.counts[:, 0] > 0) & comparable):
+        jd_id = catalogue["jobIds"][j]
+        labels = catalogue["termLabels"][j]
+        common_keys = [labels[t] for t in overlap.matched(j, 0).tolist()]
+        common_experiences = experience_matches.get(j, [])
+        similarity_score = float(scores[j])
+
+        resume_match = {
+            "resumeId": resume_id,
+            "name": resume.get("name"),
+            "email": resume.get("email"),
+            "contactNo": resume.get("contactNo"),
+            "address": resume.get("address"),
+            "city": resume.get("city"),
+            "state": resume.get("state"),
+            "country": resume.get("country"),
+            "createdOn": resume.get("createdOn"),
+            "ownedBy": resume.get("ownedBy"),
+            "noticePeriod": resume.get("noticePeriod"),
+            "expectedCTC": resume.get("expectedCTC"),
+            "totalExperience": resume.get("totalExperience"),
+            "commonKeys": common_keys,
+            "commonKeyCount": len(common_keys),
+            "similarityScore": similarity_score,
+            "commonExperiences": common_experiences,
+            **match_search_fields(resume)
+        }
+
+        job_matches.append((jd_id, resume_match))
+
+        matches.append({
+            "jobId": jd_id,
+            "jobDescription": catalogue["descriptions"][j],
+            "commonKeys": common_keys,
+            "similarityScore": similarity_score,
+            "commonExperiences": common_experiences
+        })
 
-    for jd in jd_collection.find():
-        jd_id = jd["jobId"]
-        jd_keywords = jd.get("structured_query", {}).get("keywords", [])
-        jd_embedding = jd.get("embedding", [])
-        jd_experiences = jd.get("structured_query", {}).get("jobExperiences", [])
-        common_keys = get_common_keywords(jd_keywords, resume_keywords)
-        common_experiences = get_common_experiences(resume_experiences, jd_experiences)
-
-        if len(common_keys) >= 1:
-            try:
-                similarity_score = calculate_cosine_similarity(
-                    resume_embedding,
-                    jd_embedding
-                )
-
-                resume_match = {
-                    "resumeId": resume_id,
-                    "name": resume.get("name"),
-                    "email": resume.get("email"),
-                    "contactNo": resume.get("contactNo"),
-                    "address": resume.get("address"),
-                    "city": resume.get("city"),
-                    "state": resume.get("state"),
-                    "country": resume.get("country"),
-                    "createdOn": resume.get("createdOn"),
-                    "ownedBy": resume.get("ownedBy"),
-                    "noticePeriod": resume.get("noticePeriod"),
-                    "expectedCTC": resume.get("expectedCTC"),
-                    "totalExperience": resume.get("totalExperience"),
-                    "commonKeys": common_keys,
-                    "similarityScore": similarity_score,
-                    "commonExperiences": common_experiences
-                }
-
-                matches_collection.update_one(
-                    {"jobId": jd_id},
-                    {"$push": {"matches": resume_match}},
-                    upsert=True
-                )
-
-                matches.append({
-                    "jobId": jd_id,
-                    "jobDescription": jd.get("jobDescription", ""),
-                    "commonKeys": common_keys,
-                    "similarityScore": similarity_score,
-                    "commonExperiences": common_experiences
-                })
-
-            except Exception:
-                continue
+    # Insert in rank order and trim to the same top-N getResumeScoreForJD
+    # keeps; one bulk round trip per layout for every job.
+    jobs_added = store.add_resume(resume_id, job_matches, MATCH_SORT, TOP_LIMIT)
 
     resume_matches_collection.replace_one(
         {"resumeId": resume_id},
@@ -175,22 +221,23 @@ def process_resume_matches(mongo_client, resume_id):
         {"$set": {"processingState": "completed"}}
     )
 
-    print(f"Resume {resume_id} processed. Matches created: {len(matches)}")
-    return len(matches)
+    print(f"Resume {resume_id} processed. Matches created: {len(matches)}, "
+          f"in top {TOP_LIMIT} of {jobs_added} jobs")
+    return len(matches), jobs_added
 
-def delete_resume_data(mongo_client, resume_id):
-    """Delete existing resume data from 3 collections."""
+def delete_resume_data(mongo_client, resume_id, snapshot=None, ann=None):
+    """Delete existing resume data from 3 collections (and its snapshot/ANN entries)."""
     db = mongo_client[db_name]
     resumes_collection = db["resumes"]
     resume_matches_collection = db["resume_matches"]
-    matches_collection = db["matches"]
 
     resumes_collection.delete_many({"resumeId": resume_id})
     resume_matches_collection.delete_many({"resumeId": resume_id})
-    matches_collection.update_many(
-        {"matches.resumeId": resume_id},
-        {"$pull": {"matches": {"resumeId": resume_id}}}
-    )
+    MatchStore(db).remove_resume(resume_id)
+    if snapshot is not None:
+        snapshot.remove([resume_id])
+    if ann is not None:
+        ann.remove(resume_id)
 
 def lambda_handler(event, context):
     """Main Lambda handler function."""
@@ -201,9 +248,14 @@ def lambda_handler(event, context):
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required 'resumeId'"})}
 
         mongo_client = get_mongo_client()
+        check_once(mongo_client[db_name], "resumes", "job_description", "matches",
+                   "resume_matches", "job_matches", "keyword_vocabulary")
+        vocab = KeywordVocabulary.load(mongo_client[db_name])
+        snapshot = ResumeSnapshot.open()
+        ann = ResumeAnnIndex.open()
 
         if resume_data.get("update") == 1:
-            delete_resume_data(mongo_client, resume_data["resumeId"])
+            delete_resume_data(mongo_client, resume_data["resumeId"], snapshot, ann)
         elif resume_data.get("trigger") not in [None, 0]:
             return {"statusCode": 400, "body": json.dumps({"error": "Invalid update value. Use 0 or 1."})}
 
@@ -220,23 +272,7 @@ def lambda_handler(event, context):
         missing_keys = [key for key in all_possible_keys if key not in resume_data]
 
         # Calculate totalExperience from jobExperiences
-        total_experience = 0
-        job_exps = resume_data.get("jobExperiences", [])
-        if isinstance(job_exps, list):
-            for exp in job_exps:
-                dur = exp.get("duration")
-                if dur is None:
-                    continue
-                try:
-                    dur_str = str(dur).strip()
-                    if dur_str == "":
-                        continue
-                    dur_val = float(dur_str)
-                    if dur_val > 0:
-                        total_experience += int(dur_val)
-                except (ValueError, TypeError):
-                    continue
-        resume_data["totalExperience"] = total_experience
+        resume_data["totalExperience"] = total_experience_years(resume_data.get("jobExperiences", []))
 
         embedding_text = f"{json.dumps(resume_data.get('educationalQualifications', []))} " \
                          f"{json.dumps(resume_data.get('jobExperiences', []))} " \
@@ -248,15 +284,25 @@ def lambda_handler(event, context):
         except ValueError as e:
             return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
-        document = {**resume_data, "embedding": embedding, "processingState": "pending"}
+        document = {**resume_data, "embedding": encode_embedding(embedding), "processingState": "pending",
+                    **term_fields(resume_data, vocab), **resume_search_fields(resume_data)}
+        profile = get_profile()
+        if profile:
+            document[COMPACT_FIELD] = encode_compact(embedding, profile)
 
         try:
-            collection.insert_one(document)
+            inserted = collection.insert_one(document)
         except DuplicateKeyError:
             return {"statusCode": 400, "body": json.dumps({"error": "Duplicate resumeId - record already exists"})}
 
+        if snapshot is not None:
+            snapshot.append(resume_data["resumeId"], inserted.inserted_id, embedding)
+        if ann is not None:
+            ann.add(resume_data["resumeId"], embedding)
+
         try:
-            num_matches = process_resume_matches(mongo_client, resume_data["resumeId"])
+            num_matches, jobs_matched = process_resume_matches(mongo_client, resume_data["resumeId"],
+                                                               snapshot, vocab)
         except Exception as e:
             return {"statusCode": 200, "body": json.dumps({
                 "message": "Resume stored but matching failed",
@@ -264,9 +310,6 @@ def lambda_handler(event, context):
                 "matching_error": str(e)
             })}
 
-        db = mongo_client[db_name]
-        jobs_matched = db["matches"].count_documents({"matches.resumeId": resume_data["resumeId"]})
-
         return {
             "statusCode": 200,
             "body": json.dumps({
@@ -281,7 +324,3 @@ def lambda_handler(event, context):
 
     except Exception as e:
         return {"statusCode": 500, "body": json.dumps({"error": f"Internal server error: {str(e)}"})}
-
-    finally:
-        if 'mongo_client' in locals():
-            mongo_client.close()
@@ -1,16 +1,7 @@
 import json
 import re
-from pymongo import MongoClient, errors
-
-def get_mongo_client():
-    """Initialize and return MongoDB client."""
-    return MongoClient(
-        host="notify.pesuacademy.com",
-        port=27017,
-        username="admin",
-        password="",
-        authSource="admin"
-    )
+from indexcatalog import check_once
+from mongoconn import db_name, get_mongo_client
 
 def lambda_handler(event, context):
     try:
@@ -32,14 +23,9 @@ def lambda_handler(event, context):
             }
 
         client = get_mongo_client()
-        db = client["resumes_database"]
+        db = client[db_name]
         collection = db["resume_text"]
-
-        # Ensure unique index
-        try:
-            collection.create_index("resumeId", unique=True)
-        except errors.OperationFailure:
-            pass
+        check_once(db, "resume_text")
 
         # Check for existing document
         existing_doc = collection.find_one({"resumeId": resume_id})
@@ -78,9 +64,3 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "body": json.dumps({"error": f"Internal server error: {str(e)}"})
         }
-    finally:
-        try:
-            if 'client' in locals():
-                client.close()
-        except:
-            pass
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+annindex.py - Persistent IVF-flat index over resume embeddings
+────────────────────────────────────────────────────────────────────────────
+Approximate nearest-neighbour retrieval for the JD → resume matcher. Resume
+vectors (truncated to ANN_DIMS and re-normalised, see embeddingprofile.py)
+are clustered around `nlist` k-means centroids; a query scans only the
+`nprobe` closest inverted lists.
+
+On-disk layout (in ANN_DIR):
+    centroids.npy   (nlist, dim) float32
+    vectors.f32     append-only float32 rows (mmap-able)
+    base.npz        row → list assignment and alive mask
+    ids.json        row → resumeId
+    log.jsonl       add / del operations since the last save()
+    .lock           flock()ed around every mutation
+
+search(q, k) probes lists until it has covered k × ANN_OVERSCAN rows, so
+below that many resumes it scores every row. With the matcher's
+ANN_CANDIDATES = 3000 that is 12k resumes. Up to there, the index only
+saves the document fetch (k resumes read from MongoDB instead of all of
+them), not vector work. Above it the probed share falls (~12% of rows at
+100k). benchmarks/ann_recall.py reports recall@K against the full-vector
+exact ranking and the share of rows probed for any ANN_OVERSCAN / nprobe.
+
+The ingest path calls add()/remove(), which only append to vectors.f32 and
+log.jsonl; save() folds the log into the base files. An open index is kept
+per path for the container's lifetime and catches up by replaying only the
+log lines past its last offset. The base files are re-read only when a
+save() or build swapped them in.
+
+Rebuild from scratch (retrains the centroids) with:
+
+    python annindex.py build [--nlist N]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+from embeddingcodec import decode_embedding
+from embeddingprofile import compact_vector
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+ANN_DIR        = os.environ.get("RESUME_ANN_DIR", "")   # empty → disabled
+ANN_DIMS       = int(os.environ.get("RESUME_ANN_DIMS", "256"))
+ANN_NPROBE     = int(os.environ.get("RESUME_ANN_NPROBE", "16"))
+ANN_OVERSCAN   = float(os.environ.get("RESUME_ANN_OVERSCAN", "4"))   # probe until k × this many rows
+KMEANS_SAMPLE  = 50000         # vectors used to train the centroids
+KMEANS_ITERS   = 12
+LOG_FOLD_OPS   = 5000          # save() once the log grows past this
+# ───────────────────────────────────────────────────────────────────────
+
+CENTROIDS_FILE = "centroids.npy"
+VECTORS_FILE   = "vectors.f32"
+BASE_FILE      = "base.npz"
+IDS_FILE       = "ids.json"
+LOG_FILE       = "log.jsonl"
+LOCK_FILE      = ".lock"
+
+_open_indexes = {}            # path → ResumeAnnIndex, kept across warm invocations
+
+
+def ann_vector(embedding, dims=None):
+    """Stored/query form of an embedding for the index (None if unusable)."""
+    vec = decode_embedding(embedding)
+    if vec is None:
+        return None
+    return compact_vector(vec, {"dims": dims or ANN_DIMS})
+
+
+def train_centroids(sample, nlist, iters=KMEANS_ITERS, seed=0):
+    """Spherical k-means on unit vectors; returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, sample.shape[0])
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if members.shape[0]:
+                centroids[c] = members.sum(axis=0)
+            else:                                   # re-seed empty cluster
+                centroids[c] = sample[rng.integers(sample.shape[0])]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids /= norms
+    return centroids.astype(np.float32)
+
+
+def default_nlist(n):
+    return max(1, int(np.sqrt(max(n, 1))))
+
+
+class ResumeAnnIndex:
+    def __init__(self, path, dim=None):
+        self.path = path
+        self.dim = dim or ANN_DIMS
+        self.centroids = None
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.assign = []          # row → list
+        self.alive = []           # row → bool
+        self.ids = []             # row → resumeId
+        self.row_of = {}          # live resumeId → row
+        self.lists = []           # list → [rows]
+        self.log_ops = 0
+        self.log_bytes = 0        # end of the last whole line replayed from log.jsonl
+        self.base_stamp = None
+
+    # ── open / persist ────────────────────────────────────────────────
+    @classmethod
+    def open(cls, path=None, dim=None):
+        """
+        The index at `path`, None if disabled or not built yet. Kept per
+        path across warm invocations and caught up with other writers.
+        """
+        path = path if path is not None else ANN_DIR
+        if not path or not os.path.exists(os.path.join(path, CENTROIDS_FILE)):
+            return None
+        index = _open_indexes.get(path)
+        if index is None:
+            index = _open_indexes[path] = cls(path, dim)
+        index._refresh()
+        return index
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._file(LOCK_FILE), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _base_stamp(self):
+        """(inode, mtime) of the base files: they are only ever replaced whole."""
+        stamp = []
+        for name in (CENTROIDS_FILE, BASE_FILE, IDS_FILE):
+            try:
+                st = os.stat(self._file(name))
+                stamp.append((st.st_ino, st.st_mtime_ns))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _refresh(self):
+        """
+        Catch up with the files: a full _load() when the base files were
+        replaced (save / build elsewhere) or the log was folded, otherwise
+        a replay of the log lines appended since the last look.
+        """
+        try:
+            log_size = os.path.getsize(self._file(LOG_FILE))
+        except FileNotFoundError:
+            log_size = 0
+        if self.base_stamp != self._base_stamp() or log_size < self.log_bytes:
+            self._load()
+        elif log_size > self.log_bytes:
+            self._replay_log()
+            self._map_vectors()
+
+    def _load(self):
+        self.base_stamp = self._base_stamp()
+        self.centroids = np.load(self._file(CENTROIDS_FILE))
+        self.dim = self.centroids.shape[1]
+        try:
+            base = np.load(self._file(BASE_FILE))
+            self.assign = base["assign"].tolist()
+            self.alive = base["alive"].tolist()
+            with open(self._file(IDS_FILE)) as fh:
+                self.ids = json.load(fh)
+        except FileNotFoundError:
+            self.assign, self.alive, self.ids = [], [], []
+
+        self.row_of = {rid: r for r, rid in enumerate(self.ids) if self.alive[r]}
+        self.lists = [[] for _ in range(self.centroids.shape[0])]
+        for r, (lst, ok) in enumerate(zip(self.assign, self.alive)):
+            if ok:
+                self.lists[lst].append(r)
+        self.log_ops, self.log_bytes = 0, 0
+        self._replay_log()
+        self._map_vectors()
+
+    def _replay_log(self):
+        """Apply the whole log lines past `log_bytes`; a torn final line is left for the next writer to cut."""
+        try:
+            with open(self._file(LOG_FILE), "rb") as fh:
+                fh.seek(self.log_bytes)
+                for line in fh:
+                    if not line.endswith(b"\n"):
+                        break                    # torn final line
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    self._replay(op)
+                    self.log_ops += 1
+                    self.log_bytes += len(line)
+        except FileNotFoundError:
+            pass
+
+    def _map_vectors(self):
+        rows = len(self.ids)
+        self.vectors = (np.memmap(self._file(VECTORS_FILE), dtype=np.float32,
+                                  mode="r", shape=(rows, self.dim))
+                        if rows else np.zeros((0, self.dim), dtype=np.float32))
+
+    def _replay(self, op):
+        """Apply one logged operation to the in-memory view."""
+        if op["op"] == "add":
+            row = op["row"]
+            if row != len(self.ids):
+                return                            # vectors file ahead of log
+            self.ids.append(op["id"])
+            self.assign.append(op["list"])
+            self.alive.append(True)
+            prev = op.get("prev")
+            if prev is not None and self.alive[prev]:
+                self.alive[prev] = False
+                self.lists[self.assign[prev]].remove(prev)
+            self.row_of[op["id"]] = row
+            self.lists[op["list"]].append(row)
+        elif op["op"] == "del":
+            row = op["row"]
+            if self.alive[row]:
+                self.alive[row] = False
+                self.lists[self.assign[row]].remove(row)
+            if self.row_of.get(op["id"]) == row:
+                del self.row_of[op["id"]]
+
+    def _append_log(self, op):
+        """Persist one operation and apply it to the in-memory view – caller holds the lock."""
+        line = (json.dumps(op) + "\n").encode()
+        with open(self._file(LOG_FILE), "ab") as fh:
+            fh.truncate(self.log_bytes)          # drop a torn line left by a dead writer
+            fh.write(line)
+        self.log_bytes += len(line)
+        self.log_ops += 1
+        self._replay(op)
+        if op["op"] == "add":
+            self._map_vectors()
+
+    def save(self):
+        """Fold the operation log into the base files."""
+        with self._locked():
+            self._write_base()
+
+    def _write_base(self):
+        np.savez(self._file(BASE_FILE + ".tmp.npz"),
+                 assign=np.asarray(self.assign, dtype=np.int32),
+                 alive=np.asarray(self.alive, dtype=bool))
+        os.replace(self._file(BASE_FILE + ".tmp.npz"), self._file(BASE_FILE))
+        with open(self._file(IDS_FILE + ".tmp"), "w") as fh:
+            json.dump(self.ids, fh)
+        os.replace(self._file(IDS_FILE + ".tmp"), self._file(IDS_FILE))
+        open(self._file(LOG_FILE), "w").close()
+        self.log_ops, self.log_bytes = 0, 0
+        self.base_stamp = self._base_stamp()
+
+    # ── build ─────────────────────────────────────────────────────────
+    @classmethod
+    def build(cls, path, resume_ids, vectors, nlist=None, seed=0):
+        """Train centroids on `vectors` and write a fresh index to `path`."""
+        os.makedirs(path, exist_ok=True)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if vectors.shape[0] > KMEANS_SAMPLE:
+            sample = vectors[rng.choice(vectors.shape[0], KMEANS_SAMPLE, replace=False)]
+        centroids = train_centroids(sample, nlist or default_nlist(vectors.shape[0]), seed=seed)
+
+        assign = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], 10000):
+            assign[start:start + 10000] = np.argmax(vectors[start:start + 10000] @ centroids.T, axis=1)
+
+        index = cls(path, vectors.shape[1])
+        with index._locked_fresh():
+            np.save(index._file(CENTROIDS_FILE), centroids)
+            vectors.tofile(index._file(VECTORS_FILE))
+            index.centroids = centroids
+            index.ids = list(resume_ids)
+            index.assign = assign.tolist()
+            index.alive = [True] * len(index.ids)
+            index._write_base()
+        index._load()
+        return index
+
+    @contextmanager
+    def _locked_fresh(self):
+        with open(self._file(LOCK_FILE), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ── incremental updates ──────────────────────────────────────────
+    def add(self, resume_id, embedding):
+        """Insert or replace one resume (ingest path). Returns False if unusable."""
+        vec = ann_vector(embedding, self.dim)
+        if vec is None or vec.shape[0] != self.dim:
+            return False
+        with self._locked():
+            row = len(self.ids)
+            with open(self._file(VECTORS_FILE), "ab") as fh:
+                fh.truncate(row * self.dim * 4)
+                fh.write(vec.astype("<f4").tobytes())
+            lst = int(np.argmax(self.centroids @ vec))
+            self._append_log({"op": "add", "id": resume_id, "row": row,
+                              "list": lst, "prev": self.row_of.get(resume_id)})
+            fold = self.log_ops >= LOG_FOLD_OPS
+        if fold:
+            self.save()
+        return True
+
+    def remove(self, resume_id):
+        """Delete one resume (delete_resume_data)."""
+        with self._locked():
+            row = self.row_of.get(resume_id)
+            if row is None:
+                return False
+            self._append_log({"op": "del", "id": resume_id, "row": row})
+        return True
+
+    # ── search ────────────────────────────────────────────────────────
+    def __len__(self):
+        return len(self.row_of)
+
+    def probe_rows(self, query, k, nprobe=None):
+        """Live rows in the lists a search for `k` probes (at least `nprobe`, ≥ k × ANN_OVERSCAN rows)."""
+        nprobe = nprobe or ANN_NPROBE
+        want = k * ANN_OVERSCAN
+        probes, covered = [], 0
+        for p in np.argsort(-(self.centroids @ query)):
+            if len(probes) >= nprobe and covered >= want:
+                break
+            probes.append(p)
+            covered += len(self.lists[p])
+        return np.fromiter((r for p in probes for r in self.lists[p]), dtype=np.int64)
+
+    def search(self, query, k, nprobe=None):
+        """
+        Top-`k` resumeIds by inner product with `query` (already an
+        ann_vector). Probes at least `nprobe` of the closest lists, and more
+        until k × ANN_OVERSCAN rows are covered. Returns (ids, scores).
+        """
+        if query is None or query.shape[0] != self.dim or not self.row_of:
+            return [], np.zeros(0, dtype=np.float32)
+        rows = self.probe_rows(query, k, nprobe)
+        if rows.size == 0:
+            return [], np.zeros(0, dtype=np.float32)
+        rows.sort()                                  # sequential mmap reads
+        scores = self.vectors[rows] @ query
+        k = min(k, rows.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.ids[r] for r in rows[top]], scores[top]
+
+
+def build_from_mongo(path, nlist=None):
+    """Full rebuild from the resumes collection."""
+    from mongoconn import db_name, new_client
+    client = new_client()
+    try:
+        ids, vecs = [], []
+        for doc in client[db_name]["resumes"].find({}, {"resumeId": 1, "embedding": 1}):
+            vec = ann_vector(doc.get("embedding"))
+            if doc.get("resumeId") and vec is not None and vec.shape[0] == ANN_DIMS:
+                ids.append(doc["resumeId"])
+                vecs.append(vec)
+        if not vecs:
+            print("No usable resume embeddings – nothing to index")
+            return None
+        index = ResumeAnnIndex.build(path, ids, np.stack(vecs), nlist)
+        print(f"✓ Indexed {len(index)} resumes into {index.centroids.shape[0]} lists at {path}")
+        return index
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the resume ANN index")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--path", default=ANN_DIR or "/tmp/resume_ann")
+    parser.add_argument("--nlist", type=int)
+    args = parser.parse_args()
+    build_from_mongo(args.path, args.nlist)
@@ -0,0 +1,77 @@
+"""
+aiscore_batching.py - Cost and score consistency of batched aiScore prompts
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root against the real database and OpenAI (this spends
+tokens: roughly resumes × (sizes + 1) scorings):
+
+    python -m benchmarks.aiscore_batching --job JOB_ID [--resumes 10] [--sizes 1,3,5]
+
+Takes the job's --resumes newest matches (the candidates fetchjddatanew
+scores) and scores them with fetchjddatanew.score_resumes at every batch
+size. The first size is the reference and is scored twice, so its
+run-to-run spread shows the model's own noise floor. Every size reports:
+
+    tok/resume   total tokens per scored resume (prompt + completion)
+    ms/resume    summed call latency per scored resume
+    retried      resumes a batched answer left out and were rescored alone
+    Δ vs ref     mean / max |aiScore difference| from the reference run
+
+Pick the largest size whose Δ stays near the noise floor and set
+AISCORE_BATCH_SIZE to it.
+"""
+
+import argparse
+import statistics
+
+import fetchjddatanew
+from matchstore import MatchStore
+from mongoconn import db_name, new_client
+
+
+def load_job(job_id, n):
+    client = new_client()
+    try:
+        db = client[db_name]
+        jd = db["job_description"].find_one({"jobId": job_id}, {"jobDescription": 1})
+        if not jd:
+            raise SystemExit(f"job {job_id} not found")
+        ranked = MatchStore(db).ranked(job_id, {"candidates": (fetchjddatanew.RECENCY_RANK, n)})
+        resumes = fetchjddatanew.load_resumes(db, [m["resumeId"] for m in ranked["candidates"]])
+        return jd.get("jobDescription", ""), resumes
+    finally:
+        client.close()
+
+
+def drift(reference, scores):
+    diffs = [abs(scores[rid]["aiScore"] - ref["aiScore"]) for rid, ref in reference.items()
+             if rid in scores and isinstance(ref.get("aiScore"), (int, float))
+             and isinstance(scores[rid].get("aiScore"), (int, float))]
+    return (statistics.mean(diffs), max(diffs)) if diffs else (float("nan"), float("nan"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--job", required=True)
+    ap.add_argument("--resumes", type=int, default=10)
+    ap.add_argument("--sizes", default="1,3,5")
+    args = ap.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    jd_text, resumes = load_job(args.job, args.resumes)
+    print(f"job {args.job}: {len(resumes)} resumes, batch sizes {sizes} "
+          f"(budget {fetchjddatanew.BATCH_TOKEN_BUDGET} resume tokens per request)")
+
+    reference, _ = fetchjddatanew.score_resumes(jd_text, resumes, batch_size=sizes[0])
+    rows = []
+    for label, size in [(f"{sizes[0]} (repeat)", sizes[0])] + [(str(s), s) for s in sizes[1:]]:
+        scores, stats = fetchjddatanew.score_resumes(jd_text, resumes, batch_size=size)
+        rows.append((label, len(scores), stats, drift(reference, scores)))
+
+    print(f"{'size':<12} {'scored':>7} {'tok/resume':>11} {'ms/resume':>10} {'retried':>8} {'Δ vs ref':>14}")
+    for label, scored, stats, (mean_d, max_d) in rows:
+        print(f"{label:<12} {scored:>3}/{len(resumes):<3} {stats['tokens_per_resume']:>11,.0f} "
+              f"{stats['call_ms_per_resume']:>10.0f} {stats['retried']:>8} {mean_d:>8.1f} / {max_d:<4.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+ann_recall.py - IVF-flat recall against the full-vector exact ranking
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root:
+
+    python -m benchmarks.ann_recall                      # 10k and 100k
+    python -m benchmarks.ann_recall --sizes 10000 100000 1000000
+    python -m benchmarks.ann_recall --overscan 1.5 2 4   # tune ANN_OVERSCAN
+
+Generates synthetic clustered resume vectors at the full EMBEDDING_DIM,
+with the decaying per-dimension scale of benchmarks/profile_recall.py so
+the leading dimensions carry most of the signal, as they do for
+text-embedding-3. The ground truth is the exact top-K on those full
+vectors, which is what the matcher ranks by. The index holds their
+ANN_DIMS truncation (annindex.ann_vector), so recall@K includes the
+truncation loss as well as the loss from probing only some lists.
+
+For each overscan × nprobe it reports recall@K, the share of rows the
+probed lists cover (100% means no pruning) and the speed-up over a flat
+scan of the same ANN_DIMS rows. Full vectors are generated in chunks and
+never held at once; 1M × 256 float32 still needs ~1 GB of RAM + disk.
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import annindex
+from annindex import ANN_DIMS, ResumeAnnIndex, default_nlist
+from similarity import EMBEDDING_DIM
+
+CHUNK = 20000
+
+
+def unit_rows(m):
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def synthetic(n, full_dim, dim, n_queries, rng, clusters=256):
+    """(ANN rows, ANN queries, full-vector scores (n, n_queries))."""
+    scale = (1.0 / np.sqrt(1.0 + np.arange(full_dim) / 64.0)).astype(np.float32)
+    centres = rng.standard_normal((clusters, full_dim)).astype(np.float32)
+
+    def sample(m):
+        return unit_rows((centres[rng.integers(0, clusters, m)]
+                          + 0.9 * rng.standard_normal((m, full_dim)).astype(np.float32)) * scale)
+
+    queries = sample(n_queries)
+    docs = np.empty((n, dim), dtype=np.float32)
+    full_scores = np.empty((n, n_queries), dtype=np.float32)
+    for start in range(0, n, CHUNK):
+        full = sample(min(CHUNK, n - start))
+        full_scores[start:start + full.shape[0]] = full @ queries.T
+        docs[start:start + full.shape[0]] = unit_rows(full[:, :dim])
+    return docs, unit_rows(queries[:, :dim]), full_scores
+
+
+def exact_top_k(scores, k):
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def run(n, full_dim, dim, k, n_queries, nprobes, overscans):
+    rng = np.random.default_rng(n)
+    docs, queries, full_scores = synthetic(n, full_dim, dim, n_queries, rng)
+    truth = [set(exact_top_k(full_scores[:, i], k).tolist()) for i in range(n_queries)]
+    ids = [f"r{i}" for i in range(n)]
+    path = tempfile.mkdtemp(prefix="ann_bench_")
+    try:
+        t0 = time.perf_counter()
+        index = ResumeAnnIndex.build(path, ids, docs)
+        t_build = time.perf_counter() - t0
+        print(f"\n▶ {n:,} resumes, truth on {full_dim} dims, index on {dim}: "
+              f"nlist={default_nlist(n)}, build {t_build:.1f}s, K={k}")
+
+        t0 = time.perf_counter()
+        flat = [set(exact_top_k(docs @ q, k).tolist()) for q in queries]
+        t_flat = (time.perf_counter() - t0) / n_queries
+        print(f"  flat {dim:>4}-d         : {t_flat * 1000:8.2f} ms/query, "
+              f"recall@{k} {np.mean([len(f & t) / k for f, t in zip(flat, truth)]):.3f} (truncation only)")
+
+        for overscan in overscans:
+            annindex.ANN_OVERSCAN = overscan
+            for nprobe in nprobes:
+                t0 = time.perf_counter()
+                results = [index.search(q, k, nprobe)[0] for q in queries]
+                t_ann = (time.perf_counter() - t0) / n_queries
+                recall = np.mean([len({int(r[1:]) for r in got} & want) / k
+                                  for got, want in zip(results, truth)])
+                covered = np.mean([index.probe_rows(q, k, nprobe).size for q in queries]) / n
+                print(f"  overscan {overscan:<4} nprobe {nprobe:>3} : {t_ann * 1000:8.2f} ms/query, "
+                      f"recall@{k} {recall:.3f}, rows {covered:6.1%}, speed-up {t_flat / t_ann:5.1f}×")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--full-dim", type=int, default=EMBEDDING_DIM)
+    ap.add_argument("--dim", type=int, default=ANN_DIMS)
+    ap.add_argument("--k", type=int, default=3000)
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    ap.add_argument("--overscan", type=float, nargs="+", default=[annindex.ANN_OVERSCAN])
+    args = ap.parse_args()
+    for n in args.sizes:
+        run(n, args.full_dim, args.dim, min(args.k, n // 2), args.queries, args.nprobe, args.overscan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+llm_keepalive.py - Bare requests.post vs the shared llmclient session
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root (no network or API key needed):
+
+    python -m benchmarks.llm_keepalive [--calls 40] [--workers 4] [--handshake-ms 30]
+
+Starts a local HTTP/1.1 stub that answers /embeddings and /chat/completions
+with canned OpenAI-shaped JSON after --latency-ms. Each new connection also
+sleeps --handshake-ms before it is served, standing in for the TCP + TLS
+setup the real endpoint costs. Both clients make the same calls, first
+sequentially and then from --workers threads (like the aiScore pool in
+fetchjddata). The report shows per-call latency and how many connections
+the stub accepted.
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import llmclient
+
+EMBEDDING = {"data": [{"embedding": [0.0] * 16}]}
+COMPLETION = {"choices": [{"message": {"content": json.dumps({"result": [{"resumeId": "r", "aiScore": 50}]})}}],
+              "usage": {"prompt_tokens": 900, "completion_tokens": 100, "total_tokens": 1000}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"            # keep-alive unless the client closes
+    disable_nagle_algorithm = True           # no delayed-ACK stalls on reused sockets
+    handshake_s = latency_s = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with StubHandler.lock:
+            StubHandler.connections += 1
+        time.sleep(self.handshake_s)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency_s)
+        body = json.dumps(EMBEDDING if self.path.endswith("/embeddings") else COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bare_post(endpoint, payload):
+    return requests.post(f"{llmclient.OPENAI_BASE_URL}/{endpoint}", json=payload,
+                         headers={"Authorization": f"Bearer {llmclient.OPENAI_API_KEY}"})
+
+
+def run(send, calls, workers):
+    def one(i):
+        endpoint = "embeddings" if i % 2 else "chat/completions"
+        t0 = time.perf_counter()
+        send(endpoint, {"model": "stub", "input": "x"}).raise_for_status()
+        return (time.perf_counter() - t0) * 1000
+
+    StubHandler.connections = 0
+    t0 = time.perf_counter()
+    if workers == 1:
+        ms = [one(i) for i in range(calls)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            ms = list(pool.map(one, range(calls)))
+    return ms, time.perf_counter() - t0, StubHandler.connections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    StubHandler.handshake_s = args.handshake_ms / 1000
+    StubHandler.latency_s = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llmclient.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_port}/v1"
+
+    print(f"stub: {args.handshake_ms:.0f} ms per new connection, {args.latency_ms:.0f} ms per call")
+    try:
+        for workers in (1, args.workers):
+            for label, send in (("requests.post", bare_post), ("llmclient.post", llmclient.post)):
+                llmclient.reset_session()
+                ms, wall, conns = run(send, args.calls, workers)
+                print(f"  {label:<15} workers={workers:<2} p50 {statistics.median(ms):6.1f} ms   "
+                      f"mean {statistics.mean(ms):6.1f} ms   wall {wall * 1000:7.0f} ms   "
+                      f"{conns} connections")
+    finally:
+        llmclient.reset_session()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
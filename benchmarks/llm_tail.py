@@ -0,0 +1,139 @@
+"""
+llm_tail.py - Retries, hedging and deadlines against a faulty stub
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root (no network or API key needed):
+
+    python -m benchmarks.llm_tail [--calls 200] [--workers 4] [--error-rate 0.1]
+                                  [--slow-rate 0.03] [--slow-ms 2000] [--deadline 3]
+
+The stub answers /chat/completions in --base-ms ± 30 %. A --slow-rate
+fraction of calls instead take --slow-ms, and an --error-rate fraction get
+a 429 or 503. Each row replays the same call mix from --workers threads,
+like the aiScore pool:
+
+    no retry        one attempt per call (the old behaviour)
+    retry           llmclient retries with jittered backoff
+    retry + hedge   plus a duplicate request past the recent p95 latency
+    deadline        retry + hedge, with every call sharing a --deadline budget
+
+It reports how many calls returned a score, the latency percentiles, and
+the wall time of the whole fan-out.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import ThreadingHTTPServer
+
+import requests
+
+import llmclient
+from benchmarks.llm_keepalive import COMPLETION, StubHandler
+
+
+class FaultyStub(StubHandler):
+    base_s = slow_s = 0.0
+    error_rate = slow_rate = 0.0
+    rng = random.Random(11)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with StubHandler.lock:
+            roll, jitter = self.rng.random(), self.rng.uniform(0.7, 1.3)
+        if roll < self.error_rate:
+            self.send_response(429 if roll < self.error_rate / 2 else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(self.slow_s if roll < self.error_rate + self.slow_rate else self.base_s * jitter)
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass                                   # abandoned (hedged / past-deadline) calls
+
+
+def fan_out(calls, workers, retries, hedge, deadline_s=None):
+    deadline = llmclient.Deadline(deadline_s)
+
+    def one(_):
+        t0 = time.perf_counter()
+        try:
+            resp = llmclient.post("chat/completions", {"model": "stub"},
+                                  deadline=deadline, retries=retries, hedge=hedge)
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return ok, (time.perf_counter() - t0) * 1000
+
+    results = []
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = [pool.submit(one, i) for i in range(calls)]
+    try:
+        for fut in as_completed(futures, timeout=deadline.remaining()):
+            results.append(fut.result())
+    except FutureTimeout:
+        pass
+    wall = time.perf_counter() - t0
+    pool.shutdown(wait=True, cancel_futures=True)
+    return results, wall
+
+
+def report(label, calls, results, wall):
+    ms = sorted(m for ok, m in results if ok)
+    pct = lambda q: ms[min(len(ms) - 1, int(q * len(ms)))] if ms else float("nan")
+    print(f"  {label:<14} scored {len(ms):>4}/{calls:<4} p50 {pct(0.5):7.0f} ms   p95 {pct(0.95):7.0f} ms   "
+          f"p99 {pct(0.99):7.0f} ms   max {(ms[-1] if ms else float('nan')):7.0f} ms   wall {wall:6.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--base-ms", type=float, default=100)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--deadline", type=float, default=3.0, help="seconds, for the last row")
+    args = parser.parse_args()
+
+    FaultyStub.base_s, FaultyStub.slow_s = args.base_ms / 1000, args.slow_ms / 1000
+    FaultyStub.error_rate, FaultyStub.slow_rate = args.error_rate, args.slow_rate
+    server = QuietServer(("127.0.0.1", 0), FaultyStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llmclient.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_port}/v1"
+    llmclient.BACKOFF_BASE_S, llmclient.BACKOFF_CAP_S = 0.05, 0.5   # stub-scale backoff
+
+    print(f"stub: {args.base_ms:.0f} ms ± 30 %, {args.slow_rate:.0%} at {args.slow_ms:.0f} ms, "
+          f"{args.error_rate:.0%} 429/503; {args.calls} calls on {args.workers} workers")
+    rows = [("no retry", 0, False, None),
+            ("retry", llmclient.MAX_RETRIES, False, None),
+            ("retry + hedge", llmclient.MAX_RETRIES, True, None),
+            ("deadline", llmclient.MAX_RETRIES, True, args.deadline)]
+    try:
+        # warm the latency window so hedging has a percentile to work from
+        fan_out(llmclient.LATENCY_WINDOW, args.workers, llmclient.MAX_RETRIES, False)
+        for label, retries, hedge, deadline_s in rows:
+            FaultyStub.rng.seed(11)
+            results, wall = fan_out(args.calls, args.workers, retries, hedge, deadline_s)
+            report(label, args.calls, results, wall)
+        p95 = llmclient.latency_percentile("chat/completions")
+        print(f"  hedge threshold (recent p95): {p95 * 1000:.0f} ms" if p95 else "")
+    finally:
+        llmclient.reset_session()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+llm_throughput.py - Fixed 4-thread pool vs llmbatch.score_batches
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root (no network or API key needed):
+
+    python -m benchmarks.llm_throughput [--batches 60] [--latency-ms 300]
+                                        [--rpm 500] [--tpm 200000]
+
+Scores --batches one-resume batches with fetchjddatanew.call_openai against
+the local stub (every answer reports 1,000 tokens of usage). It runs them
+twice:
+
+    pool(4)     the old ThreadPoolExecutor(max_workers=4) + as_completed
+    llmbatch    score_batches, ≤ LLM_MAX_CONCURRENCY in flight, with the
+                RPM / TPM buckets set from --rpm / --tpm
+
+For each it prints wall time, requests/s and tokens/min. The buckets
+start full (one minute of quota), so a short run may burst above the
+per-minute rate; with a tight --tpm (e.g. 30000) the llmbatch row shows
+the limiter pacing the rest of the run to the quota.
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer
+
+import fetchjddatanew
+import llmbatch
+import llmclient
+from benchmarks.llm_keepalive import COMPLETION, StubHandler
+
+
+async def unlimited(endpoint, payload, deadline=None):
+    return llmclient.post(endpoint, payload, deadline=deadline)
+
+
+def pool_of_four(batches):
+    def call(batch):
+        return asyncio.run(fetchjddatanew.call_openai("jd", batch))
+
+    fetchjddatanew.request = unlimited          # the old path: no limiter in front of post()
+
+    scores = {}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for fut in as_completed([pool.submit(call, b) for b in batches]):
+            scores.update(fut.result())
+    fetchjddatanew.request = llmbatch.request
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rpm", type=int, default=500)
+    parser.add_argument("--tpm", type=int, default=200_000)
+    args = parser.parse_args()
+
+    StubHandler.latency_s = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llmclient.OPENAI_BASE_URL = f"http://127.0.0.1:{server.server_port}/v1"
+    llmbatch.RPM_LIMIT, llmbatch.TPM_LIMIT = args.rpm, args.tpm
+    llmbatch._rpm, llmbatch._tpm = llmbatch.TokenBucket(args.rpm), llmbatch.TokenBucket(args.tpm)
+    batches = [[{"resumeId": f"r{i}", "resumeText": "x" * 2000}] for i in range(args.batches)]
+    tokens = COMPLETION["usage"]["total_tokens"] * args.batches
+
+    print(f"stub: {args.latency_ms:.0f} ms per call; {args.batches} batches, "
+          f"limits {args.rpm} RPM / {args.tpm:,} TPM")
+    try:
+        t0 = time.perf_counter()
+        pool_of_four(batches)
+        wall = time.perf_counter() - t0
+        print(f"  pool(4)    wall {wall:6.2f} s   {args.batches / wall:6.1f} req/s   "
+              f"{tokens / wall * 60:>10,.0f} tok/min   (no RPM/TPM awareness)")
+        report = llmbatch.score_batches(fetchjddatanew.call_openai, "jd", batches, label="llmbatch")
+        print(f"  llmbatch   wall {report.elapsed_s:6.2f} s   {report.calls / report.elapsed_s:6.1f} req/s   "
+              f"{report.tokens / report.elapsed_s * 60:>10,.0f} tok/min   "
+              f"(≤{llmbatch.MAX_CONCURRENCY} in flight)")
+    finally:
+        llmclient.reset_session()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
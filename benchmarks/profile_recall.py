@@ -0,0 +1,106 @@
+"""
+profile_recall.py - recall@K of compact embedding profiles vs exact ranking
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root:
+
+    python -m benchmarks.profile_recall [--n 10000] [--queries 20] [--k 500]
+    python -m benchmarks.profile_recall --mongo 20000     # real resumes/JDs
+
+For every profile in embeddingprofile.PROFILES it ranks the corpus by the
+compact vector, reports first-pass recall@K, then rescores the top
+K + margin on full vectors (as getResumeScoreForJD does) and reports the
+final recall@K. Ranking is by similarity alone, which is the worst case:
+in the matcher the keyword-overlap count orders candidates first.
+
+Synthetic vectors get a decaying per-dimension scale so that, like
+text-embedding-3 (Matryoshka-trained) models, the leading dimensions carry
+most of the signal. Use --mongo to pick a profile for the real corpus.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from embeddingcodec import decode_embedding
+from embeddingprofile import PROFILES, RESCORE_MARGIN, encode_compact
+from similarity import EMBEDDING_DIM
+
+
+def synthetic_corpus(n, n_queries, dim, rng):
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)
+    centres = rng.standard_normal((32, dim)).astype(np.float32)
+    docs = centres[rng.integers(0, 32, n)] + 0.8 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = centres[rng.integers(0, 32, n_queries)] + 0.8 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    return docs * scale, queries * scale
+
+
+def mongo_corpus(n, n_queries):
+    from mongoconn import db_name, new_client
+    client = new_client()
+    try:
+        db = client[db_name]
+        def load(col, limit):
+            vecs = [decode_embedding(d.get("embedding"))
+                    for d in db[col].find({}, {"embedding": 1}).limit(limit)]
+            return np.stack([v for v in vecs if v is not None and v.shape[0] == EMBEDDING_DIM])
+        return load("resumes", n), load("job_description", n_queries)
+    finally:
+        client.close()
+
+
+def unit_rows(m):
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def compact_matrix(m, profile):
+    return np.stack([decode_embedding(encode_compact(v, profile)) for v in m])
+
+
+def top_k(scores, k):
+    k = min(k, scores.shape[0])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10000)
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--k", type=int, default=500)
+    ap.add_argument("--margin", type=int, default=RESCORE_MARGIN)
+    ap.add_argument("--mongo", type=int, default=0, help="sample this many real resumes instead")
+    args = ap.parse_args()
+
+    if args.mongo:
+        docs, queries = mongo_corpus(args.mongo, args.queries)
+    else:
+        docs, queries = synthetic_corpus(args.n, args.queries, EMBEDDING_DIM, np.random.default_rng(7))
+    docs, queries = unit_rows(docs), unit_rows(queries)
+    exact = queries @ docs.T
+    truth = [set(top_k(row, args.k)) for row in exact]
+    print(f"{docs.shape[0]} resumes × {queries.shape[0]} JDs, K={args.k}, margin={args.margin}")
+    print(f"{'profile':<10} {'bytes/vec':>9} {'pass-1 ms':>10} {'recall@K':>9} {'rescored':>9}")
+
+    for name, profile in PROFILES.items():
+        if profile is None:
+            continue
+        c_docs, c_queries = compact_matrix(docs, profile), compact_matrix(queries, profile)
+        t0 = time.perf_counter()
+        approx = c_queries @ c_docs.T
+        t_pass = (time.perf_counter() - t0) * 1000 / queries.shape[0]
+
+        first, final = [], []
+        for q in range(queries.shape[0]):
+            shortlist = top_k(approx[q], args.k + args.margin)
+            first.append(len(truth[q] & set(shortlist[:args.k])) / args.k)
+            rescored = shortlist[np.argsort(-exact[q, shortlist], kind="stable")][:args.k]
+            final.append(len(truth[q] & set(rescored)) / args.k)
+        size = len(encode_compact(docs[0], profile))
+        print(f"{name:<10} {size:>9} {t_pass:>10.2f} {np.mean(first):>9.3f} {np.mean(final):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
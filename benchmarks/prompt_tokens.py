@@ -0,0 +1,131 @@
+"""
+prompt_tokens.py - Input tokens before / after promptbuilder
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root:
+
+    python -m benchmarks.prompt_tokens [--n 200]
+    python -m benchmarks.prompt_tokens --mongo 500        # real resumes/JDs
+
+For each kind of prompt input it counts tokens (promptbuilder.count_tokens)
+the old way and the new way:
+
+    resume text   '### Resume ID ###' + raw resumeText  vs  format_resume
+    resume JSON   json.dumps(resume, indent=2)           vs  format_resume
+    JD            raw jobDescription                     vs  format_jd
+
+and reports totals, the reduction, and how many inputs hit their budget.
+The per-call line adds fetchjddatanew's SYSTEM_PROMPT to the mean JD and
+resume, which is the input of one single-resume scoring request.
+
+The synthetic corpus follows sampleresume.py: sparse profile documents
+full of nulls, and resume text with the run-on whitespace of PDF extraction.
+"""
+
+import argparse
+import json
+import random
+
+import promptbuilder
+from fetchjddatanew import SYSTEM_PROMPT
+from promptbuilder import count_tokens, format_jd, format_resume
+
+WORDS = ("java spring python sql aws kubernetes react node docker microservices "
+         "led team delivered migration pipeline analytics stakeholder design api "
+         "testing agile scrum cloud data platform backend frontend security").split()
+
+
+def synthetic_corpus(n, rng):
+    def sentence(k):
+        return " ".join(rng.choice(WORDS) for _ in range(k))
+
+    json_resumes, text_resumes, jds = [], [], []
+    for i in range(n):
+        json_resumes.append({
+            "resumeId": f"res-{i}", "name": f"Candidate {i}", "email": f"c{i}@example.com",
+            "contactNo": str(rng.randrange(10 ** 10)), "address": None, "city": None,
+            "state": rng.choice(["jakarta", None]), "country": rng.choice(["Indonesia", "India", "USA"]),
+            "countryKey": "india", "regionId": None, "noticePeriod": str(rng.randint(0, 90)),
+            "totalExperience": None, "expectedCTC": None, "createdOn": "2025-03-20T07:36:46.695+00:00",
+            "createdOnEpoch": 1742456206695, "ownedBy": "e5432b3e-da4c-4de6-9543-a820d73bf35d",
+            "educationalQualifications": [{"degree": "bachelors", "field": sentence(2),
+                                           "graduationYear": rng.randint(2000, 2023),
+                                           "institution": sentence(3)}],
+            "jobExperiences": [{"duration": str(rng.randint(1, 8)), "title": sentence(2),
+                                "company": sentence(3), "workingPeriod": None, "industry": None,
+                                "position": None,
+                                "responsibilities": sentence(rng.randint(0, 400)) or None}
+                               for _ in range(rng.randint(1, 5))],
+            "keywords": rng.sample(WORDS, 8),
+            "keywordTerms": rng.sample(WORDS, 8),
+            "skills": [{"skillId": None, "skillName": w} for w in rng.sample(WORDS, 8)],
+        })
+        lines = [sentence(rng.randint(3, 14)) + " " * rng.randint(0, 30) for _ in range(rng.randint(30, 250))]
+        text_resumes.append({"resumeId": f"res-{i}",
+                             "resumeText": ("\n" * rng.randint(1, 3)).join(lines).replace(" ", "  ", 50)})
+        jds.append("\n\n\n".join(sentence(rng.randint(10, 40)) for _ in range(rng.randint(5, 120))))
+    return json_resumes, text_resumes, jds
+
+
+def mongo_corpus(n):
+    from keywordvocab import RESUME_PAYLOAD_PROJECTION
+    from mongoconn import db_name, new_client
+    client = new_client()
+    try:
+        db = client[db_name]
+        json_resumes = list(db["resumes"].find({}, RESUME_PAYLOAD_PROJECTION).limit(n))
+        text_resumes = [d for d in db["resume_text"].find({}, {"_id": 0, "resumeId": 1, "resumeText": 1}).limit(n)
+                        if d.get("resumeText")]
+        jds = [d.get("jobDescription") or "" for d in db["job_description"].find({}, {"jobDescription": 1}).limit(n)]
+        return json_resumes, text_resumes, jds
+    finally:
+        client.close()
+
+
+def old_resume(resume):
+    if resume.get("resumeText"):
+        return f'### Resume ID: {resume["resumeId"]} ###\n"""\n{resume["resumeText"]}\n"""'
+    return json.dumps(resume, indent=2, default=str)
+
+
+def measure(label, items, old, new):
+    built = [new(x) for x in items]
+    before = [count_tokens(old(x)) for x in items]
+    after = [count_tokens(text) for text in built]
+    capped = sum(text.endswith(promptbuilder.TRUNCATION_MARK) or
+                 text.endswith(promptbuilder.TRUNCATION_MARK + '\n"""') for text in built)
+    saved = 1 - sum(after) / max(sum(before), 1)
+    print(f"{label:<12} {len(items):>6} {sum(before):>12,} {sum(after):>12,} {saved:>9.1%} "
+          f"{max(before, default=0):>9,} {max(after, default=0):>9,} {capped:>9}")
+    n = max(len(items), 1)
+    return sum(before) / n, sum(after) / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200)
+    ap.add_argument("--mongo", type=int, default=0, help="sample this many real documents instead")
+    args = ap.parse_args()
+
+    if args.mongo:
+        json_resumes, text_resumes, jds = mongo_corpus(args.mongo)
+    else:
+        json_resumes, text_resumes, jds = synthetic_corpus(args.n, random.Random(7))
+    tokenizer = (f"tiktoken {promptbuilder.ENCODING}" if promptbuilder._encoder() is not None
+                 else "word-piece estimate")
+    print(f"token counts: {tokenizer}; budgets: resume {promptbuilder.RESUME_TOKEN_BUDGET}, "
+          f"JD {promptbuilder.JD_TOKEN_BUDGET}")
+    print(f"{'input':<12} {'docs':>6} {'before tok':>12} {'after tok':>12} {'reduction':>9} "
+          f"{'max before':>9} {'max after':>9} {'truncated':>9}")
+
+    text_before, text_after = measure("resume text", text_resumes, old_resume, format_resume)
+    measure("resume JSON", json_resumes, old_resume, format_resume)
+    jd_before, jd_after = measure("JD", jds, lambda t: t, format_jd)
+
+    system = count_tokens(SYSTEM_PROMPT)
+    before, after = system + jd_before + text_before, system + jd_after + text_after
+    print(f"per call (system {system} + mean JD + mean text resume): {before:,.0f} → {after:,.0f} tokens "
+          f"({1 - after / before:.1%} less)")
+
+
+if __name__ == "__main__":
+    main()
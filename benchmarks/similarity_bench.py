@@ -0,0 +1,98 @@
+"""
+similarity_bench.py - Parity check + throughput benchmark for similarity.py
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root:
+
+    python -m benchmarks.similarity_bench [n_resumes]
+
+Compares the matcher's stage one (getResumeScoreForJD.score_resume_chunk,
+i.e. similarity.cosine_similarity_matrix over SCORE_CHUNK_SIZE chunks)
+against the pure-Python cosine the matcher used before the engine
+(including missing and wrong-length vectors) and reports resumes scored
+per second.
+"""
+
+import math
+import random
+import sys
+import time
+
+import getResumeScoreForJD as matcher
+from keywordvocab import KeywordVocabulary
+from similarity import EMBEDDING_DIM, SCORE_CHUNK_SIZE
+
+PARITY_TOLERANCE = 1e-5
+KEYWORD = "python"             # shared by every resume and the JD, so no pair is filtered out
+
+
+def calculate_cosine_similarity(vec1, vec2):
+    dot = sum(a * b for a, b in zip(vec1, vec2))
+    n1  = math.sqrt(sum(a * a for a in vec1))
+    n2  = math.sqrt(sum(b * b for b in vec2))
+    return 0.0 if n1 == 0 or n2 == 0 else dot / (n1 * n2)
+
+
+def reference_score(resume_emb, jd_embedding):
+    """The per-resume logic lambda_handler used before the engine."""
+    resume_emb = resume_emb or []
+    if isinstance(resume_emb, list) and len(resume_emb) == len(jd_embedding):
+        return calculate_cosine_similarity(resume_emb, jd_embedding)
+    return 0.0
+
+
+def synthetic_embeddings(n, dim, rng):
+    out = []
+    for i in range(n):
+        if i % 50 == 0:
+            out.append(None)                                      # missing
+        elif i % 50 == 1:
+            out.append([rng.uniform(-1, 1) for _ in range(dim // 2)])  # wrong length
+        elif i % 50 == 2:
+            out.append([0.0] * dim)                               # zero norm
+        else:
+            out.append([rng.uniform(-1, 1) for _ in range(dim)])
+    return out
+
+
+def vectorised_scores(embeddings, jd_embedding):
+    vocab = KeywordVocabulary()
+    jd_info = matcher.prepare_jd({"jobId": "bench", "embedding": jd_embedding,
+                                  "structured_query": {"keywords": [KEYWORD]}}, vocab)
+    jd_infos = [jd_info]
+    source = matcher.ResumeEmbeddings()
+    per_jd = [matcher.TopK(None)]
+    stats = {"stage1": 0, "stage1Seconds": 0}
+    for start in range(0, len(embeddings), SCORE_CHUNK_SIZE):
+        chunk = [{"resumeId": f"r{start + i}", "keywords": [KEYWORD], "embedding": e}
+                 for i, e in enumerate(embeddings[start:start + SCORE_CHUNK_SIZE])]
+        matcher.score_resume_chunk(source, chunk, start, jd_infos, {EMBEDDING_DIM: [0]},
+                                   per_jd, vocab, stats)
+    return [c.score for c in sorted(per_jd[0].heap, key=lambda c: c.seq)]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(42)
+    jd_embedding = [rng.uniform(-1, 1) for _ in range(EMBEDDING_DIM)]
+    embeddings = synthetic_embeddings(n, EMBEDDING_DIM, rng)
+
+    t0 = time.perf_counter()
+    expected = [reference_score(e, jd_embedding) for e in embeddings]
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = vectorised_scores(embeddings, jd_embedding)
+    t_vec = time.perf_counter() - t0
+
+    worst = max(abs(a - b) for a, b in zip(expected, got))
+    print(f"parity: max |Δ| = {worst:.2e} over {n} resumes "
+          f"({'OK' if worst <= PARITY_TOLERANCE else 'FAIL'})")
+    print(f"pure python : {n / t_ref:12,.0f} resumes/s  ({t_ref:.3f}s)")
+    print(f"vectorised  : {n / t_vec:12,.0f} resumes/s  ({t_vec:.3f}s)")
+    print(f"speed-up    : {t_ref / t_vec:.1f}×")
+    if worst > PARITY_TOLERANCE:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+staged_ranking.py - Parity + per-stage timings for the two-stage JD matcher
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root:
+
+    python -m benchmarks.staged_ranking [n_resumes] [n_jds]
+
+Scores synthetic resumes against synthetic JDs twice with
+getResumeScoreForJD.match_pending_batch: exhaustively (every keyword-
+qualified candidate gets experience matching and a match record, i.e.
+STAGED_RANKING = False) and staged (only the stage_one_limit leaders).
+Checks the final top TOP_LIMIT per JD is identical and prints candidate
+counts and timings per stage.
+"""
+
+import random
+import sys
+import time
+
+import getResumeScoreForJD as matcher
+from keywordvocab import KeywordVocabulary
+
+DIM = 256
+
+SKILLS = [f"skill{i}" for i in range(300)]
+TITLES = ["software engineer", "senior software engineer", "backend developer",
+          "backend dev", "frontend developer", "data engineer", "data scientist",
+          "devops engineer", "qa engineer", "engineering manager", "product manager"]
+
+
+class ListCursor(list):
+    def batch_size(self, n):
+        return self
+
+
+class ListCollection:
+    """Just enough of a pymongo collection for an unfiltered matcher scan."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, *args, **kwargs):
+        return ListCursor(dict(d) for d in self.docs)    # fresh documents, like a real cursor
+
+
+def synthetic_resume(i, rng):
+    return {
+        "resumeId": f"r{i}",
+        "name": f"Candidate {i}",
+        "keywords": rng.sample(SKILLS, rng.randint(3, 12)),
+        "skills": [{"skillName": s} for s in rng.sample(SKILLS, rng.randint(0, 6))],
+        "jobExperiences": [{"title": rng.choice(TITLES), "duration": str(rng.randint(1, 8))}
+                           for _ in range(rng.randint(1, 4))],
+        "embedding": [rng.gauss(0, 1) for _ in range(DIM)],
+    }
+
+
+def synthetic_jd(j, rng):
+    return {
+        "jobId": f"j{j}",
+        "jobDescription": f"JD {j}",
+        "structured_query": {
+            "keywords": rng.sample(SKILLS, 15),
+            "jobExperiences": [{"title": rng.choice(TITLES), "duration": "3"}
+                               for _ in range(rng.randint(1, 3))],
+        },
+        "embedding": [rng.gauss(0, 1) for _ in range(DIM)],
+    }
+
+
+def run(col, jds, staged):
+    matcher.STAGED_RANKING = staged
+    vocab = KeywordVocabulary()
+    jd_infos = [matcher.prepare_jd(jd, vocab) for jd in jds]
+    stats = {}
+    t0 = time.perf_counter()
+    results = matcher.match_pending_batch(col, jd_infos, vocab, stats=stats)
+    return results, stats, time.perf_counter() - t0
+
+
+def signature(matches):
+    return [(m["resumeId"], m["commonKeys"], m["similarityScore"], m["commonExperiences"])
+            for m in matches]
+
+
+def main():
+    n_resumes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_jds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rng = random.Random(11)
+    col = ListCollection([synthetic_resume(i, rng) for i in range(n_resumes)])
+    jds = [synthetic_jd(j, rng) for j in range(n_jds)]
+
+    exhaustive, ex_stats, t_ex = run(col, jds, False)
+    staged, st_stats, t_st = run(col, jds, True)
+
+    same = all(signature(a) == signature(b) for a, b in zip(exhaustive, staged))
+    print(f"\nparity: {'OK' if same else 'FAIL'} – top {matcher.TOP_LIMIT} identical for "
+          f"{n_jds} JDs over {n_resumes} resumes")
+    for label, stats, total in (("exhaustive", ex_stats, t_ex), ("staged", st_stats, t_st)):
+        print(f"{label:>10}: stage 1 {stats['stage1']:>7} candidates {stats['stage1Seconds']:6.2f}s | "
+              f"stage 2 {stats['stage2']:>7} materialised {stats['stage2Seconds']:6.2f}s | "
+              f"total {total:6.2f}s")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
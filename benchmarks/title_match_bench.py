@@ -0,0 +1,93 @@
+"""
+title_match_bench.py - Parity check + throughput for titlematch.py
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root:
+
+    python -m benchmarks.title_match_bench [n_resumes] [n_jds]
+
+Matches synthetic resume experience titles against every JD's titles with
+the original difflib double loop and with the trigram index, checks both
+produce the same (pair, matchScore) set, and reports pairs skipped by the
+bounds and the speed-up.
+"""
+
+import difflib
+import random
+import sys
+import time
+
+import titlematch
+from titlematch import TitleIndex
+
+THRESHOLD = 0.85
+
+WORDS = ["senior", "junior", "lead", "principal", "software", "backend", "frontend",
+         "full stack", "data", "machine learning", "devops", "qa", "engineer",
+         "developer", "analyst", "manager", "architect", "consultant", "intern", "sr."]
+
+
+def synthetic_titles(n, rng):
+    out = []
+    for _ in range(n):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.2:                       # typo variant
+            k = rng.randrange(len(title))
+            title = title[:k] + title[k + 1:]
+        out.append(title)
+    return out
+
+
+def reference(resumes, jds):
+    out = set()
+    for i, r_titles in enumerate(resumes):
+        for j, j_titles in enumerate(jds):
+            for r in r_titles:
+                for t in j_titles:
+                    score = difflib.SequenceMatcher(None, r, t).ratio()
+                    if score >= THRESHOLD:
+                        out.add((i, j, r, t, round(score, 2)))
+    return out
+
+
+def indexed(resumes, jds):
+    out = set()
+    indexes = [TitleIndex(j_titles) for j_titles in jds]
+    for i, r_titles in enumerate(resumes):
+        for j, index in enumerate(indexes):
+            for r in r_titles:
+                for k, score in index.search(r, THRESHOLD):
+                    out.add((i, j, r, jds[j][k], round(score, 2)))
+    return out
+
+
+def main():
+    n_resumes = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    n_jds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(7)
+    pool = synthetic_titles(400, rng)
+    resumes = [rng.sample(pool, rng.randint(1, 5)) for _ in range(n_resumes)]
+    jds = [rng.sample(pool, rng.randint(1, 3)) for _ in range(n_jds)]
+    pairs = sum(len(r) * len(j) for r in resumes for j in jds)
+
+    t0 = time.perf_counter()
+    expected = reference(resumes, jds)
+    t_ref = time.perf_counter() - t0
+
+    titlematch.title_similarity.cache_clear()
+    t0 = time.perf_counter()
+    got = indexed(resumes, jds)
+    t_idx = time.perf_counter() - t0
+    info = titlematch.title_similarity.cache_info()
+
+    print(f"parity: {'OK' if got == expected else 'FAIL'} ({len(expected)} matches, {pairs:,} pairs)")
+    print(f"difflib calls: {pairs:,} → {info.misses:,} "
+          f"({info.hits:,} served from the LRU, {pairs - info.hits - info.misses:,} skipped by bounds)")
+    print(f"difflib loop : {t_ref:.3f}s")
+    print(f"trigram index: {t_idx:.3f}s")
+    print(f"speed-up     : {t_ref / t_idx:.1f}×")
+    if got != expected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+warm_mongo.py - Per-invocation vs pooled MongoClient latency for fetchresumedata
+────────────────────────────────────────────────────────────────────────────
+Run from the repo root against a real server (MONGO_* env vars, see
+mongoconn.py):
+
+    python -m benchmarks.warm_mongo <resumeId> [--calls 50]
+
+"before" builds a fresh client for every call and closes it afterwards, as
+the handlers did, so each call pays DNS + TCP + TLS + auth. "after" uses
+mongoconn's process-wide client: the first call is the cold start, the rest
+are warm invocations reusing the pool. Reports the handler latency of each.
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import fetchresumedata
+import mongoconn
+
+
+def timed_calls(event, calls, before_call=None, after_call=None):
+    out = []
+    for _ in range(calls):
+        if before_call:
+            before_call()
+        t0 = time.perf_counter()
+        resp = fetchresumedata.lambda_handler(event, None)
+        out.append((time.perf_counter() - t0) * 1000)
+        if after_call:
+            after_call()
+        if resp["statusCode"] != 200:
+            raise SystemExit(f"handler returned {resp['statusCode']}: {resp['body']}")
+    return out
+
+
+def report(label, ms):
+    ms_sorted = sorted(ms)
+    p95 = ms_sorted[min(len(ms) - 1, int(0.95 * len(ms)))]
+    print(f"  {label:<22} n={len(ms):<4} mean {statistics.mean(ms):7.1f} ms   "
+          f"p50 {statistics.median(ms):7.1f} ms   p95 {p95:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("resume_id")
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+    event = {"body": json.dumps({"resumeId": args.resume_id})}
+
+    # before: one client per invocation, closed in `finally`
+    clients = []
+    pooled = fetchresumedata.get_mongo_client
+    fetchresumedata.get_mongo_client = lambda: clients.append(mongoconn.new_client()) or clients[-1]
+    try:
+        before = timed_calls(event, args.calls, after_call=lambda: clients.pop().close())
+    finally:
+        fetchresumedata.get_mongo_client = pooled
+
+    # after: process-wide client, first call cold
+    mongoconn.reset_client()
+    cold = timed_calls(event, 1)
+    warm = timed_calls(event, args.calls)
+    mongoconn.reset_client()
+
+    print(f"fetchresumedata, {mongoconn.host}:{mongoconn.port}")
+    report("before (per call)", before)
+    report("after, cold call", cold)
+    report("after, warm calls", warm)
+    print(f"  warm speed-up (p50)    {statistics.median(before) / statistics.median(warm):.1f}×")
+
+
+if __name__ == "__main__":
+    main()
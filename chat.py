@@ -1,21 +1,13 @@
 import json
-import requests
-from pymongo import MongoClient
 from datetime import datetime
 
-# ✅ MongoDB Setup
-def get_mongo_client():
-    return MongoClient(
-        host="notify.pesuacademy.com",
-        port=27017,
-        username="admin",
-        password="",
-        authSource="admin"
-    )
+from keywordvocab import RESUME_PAYLOAD_PROJECTION, TERMS_FIELD, normalize_terms
+from searchfields import normalize_country
+from indexcatalog import check_once
+from llmclient import post
+from mongoconn import db_name, get_mongo_client
 
 # ✅ OpenAI Setup
-OPENAI_API_KEY = ""
-OPENAI_URL = "https://api.openai.com/v1/chat/completions"
 OPENAI_MODEL = "gpt-4o"
 
 MASTER_PROMPT = """
@@ -145,10 +137,6 @@ You are a resume scoring assistant. You receive:
 """
 
 def call_openai_agent(user_query, previous_context=None):
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY}"
-    }
     messages = [
         {"role": "system", "content": MASTER_PROMPT},
         {"role": "user", "content": user_query}
@@ -161,16 +149,12 @@ def call_openai_agent(user_query, previous_context=None):
         "response_format": {"type": "json_object"},
         "messages": messages
     }
-    response = requests.post(OPENAI_URL, headers=headers, json=payload)
+    response = post("chat/completions", payload)
     response.raise_for_status()
     full = response.json()
     return full["choices"][0]["message"]["content"]
 
 def call_openai_evaluator(user_query, resumes):
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY}"
-    }
     messages = [
         {"role": "system", "content": EVALUATOR_PROMPT},
         {"role": "user", "content": f"Query: {user_query}\n\nResumes: {json.dumps(resumes)}"}
@@ -181,7 +165,7 @@ def call_openai_evaluator(user_query, resumes):
         "response_format": {"type": "json_object"},
         "messages": messages
     }
-    response = requests.post(OPENAI_URL, headers=headers, json=payload)
+    response = post("chat/completions", payload)
     response.raise_for_status()
     full = response.json()
     return full["choices"][0]["message"]["content"]
@@ -228,36 +212,26 @@ def lambda_handler(event, context):
 
         print(f"Filters: country={country}, min_exp={min_exp}, max_exp={max_exp}, job_titles={job_titles}, skills={skills}, top_k={top_k}")
 
+        # Derived fields written at ingest (searchfields.py) – all indexed
         query = {}
         if country:
-            query["country"] = {"$regex": f"^{country.strip().lower()}$", "$options": "i"}
+            query["countryKey"] = normalize_country(country)
 
         if skills:
-            query["$or"] = [{"skills.skillName": {"$in": skills}}, {"keywords": {"$in": skills}}]
+            # keywordTerms holds keywords + skill names, normalised
+            query[TERMS_FIELD] = {"$in": normalize_terms(skills)}
 
-        job_exp_filters = []
-        if job_titles:
-            job_exp_filters.append({"jobExperiences.title": {"$in": job_titles}})
         if min_exp_val > 0:
-            job_exp_filters.append({
-                "$expr": {
-                    "$gte": [
-                        {
-                            "$toInt": {
-                                "$ifNull": [{"$first": "$jobExperiences.duration"}, "0"]
-                            }
-                        },
-                        min_exp_val
-                    ]
-                }
-            })
-        if job_exp_filters:
-            query["$and"] = job_exp_filters
+            query["totalExperience"] = {"$gte": min_exp_val}
+
+        if job_titles:
+            query["jobExperiences.title"] = {"$in": job_titles}
 
         print("Final MongoDB query:", json.dumps(query))
 
-        resumes_collection = mongo_client["resumes_database"]["resumes"]
-        results = list(resumes_collection.find(query, {"_id": 0, "embedding": 0}).limit(top_k))
+        resumes_collection = mongo_client[db_name]["resumes"]
+        check_once(mongo_client[db_name], "resumes")
+        results = list(resumes_collection.find(query, RESUME_PAYLOAD_PROJECTION).limit(top_k))
         print(f"Fetched {len(results)} candidates")
 
         # Second OpenAI call: evaluation step
@@ -271,7 +245,7 @@ def lambda_handler(event, context):
 
         top_resumes = list(resumes_collection.find(
             {"resumeId": {"$in": top_resume_ids}},
-            {"_id": 0, "embedding": 0}
+            RESUME_PAYLOAD_PROJECTION
         ))
 
         final_output = {
@@ -292,6 +266,3 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
-    finally:
-        mongo_client.close()
-        print("MongoDB connection closed")
@@ -0,0 +1,99 @@
+"""
+embeddingcodec.py - Packed binary embedding storage
+────────────────────────────────────────────────────────────────────────────
+Embeddings are stored as a BSON Binary of little-endian float32 (or float16)
+values, pre-normalised to unit length, instead of a 3072-element array of
+doubles (~42 KB → ~12 KB / ~6 KB of BSON per 3072-dim embedding).
+
+Compact first-pass vectors (embeddingprofile.py) use the same container,
+plus an int8 layout: a float32 per-vector scale followed by int8 values.
+
+The Binary subtype tags the element type. Readers go through
+`decode_embedding`, which returns a read-only np.frombuffer view for float32
+and still accepts legacy arrays (dual-read) until migrate_embeddings.py has
+converted every document.
+"""
+
+import os
+
+import numpy as np
+from bson.binary import Binary
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+EMBEDDING_STORAGE = os.environ.get("EMBEDDING_STORAGE", "float32")   # float32 | float16 | array
+# ───────────────────────────────────────────────────────────────────────
+
+SUBTYPE_F32 = 0x80            # user-defined BSON binary subtypes
+SUBTYPE_F16 = 0x81
+SUBTYPE_I8  = 0x82            # <f4 scale + int8 values
+DTYPES = {SUBTYPE_F32: np.dtype("<f4"), SUBTYPE_F16: np.dtype("<f2"), SUBTYPE_I8: np.dtype("i1")}
+I8_HEADER = 4
+SUBTYPES = {"float32": SUBTYPE_F32, "float16": SUBTYPE_F16}
+
+
+def normalize(vec):
+    """Unit-length float32 copy of `vec` (zero vectors stay zero)."""
+    arr = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm > 0 else arr
+
+
+def encode_embedding(vec, storage=None):
+    """Encode a raw embedding for storage in the configured format."""
+    storage = storage or EMBEDDING_STORAGE
+    if storage == "array":
+        return list(vec)
+    subtype = SUBTYPES[storage]
+    packed = normalize(vec).astype(DTYPES[subtype], copy=False)
+    return Binary(packed.tobytes(), subtype)
+
+
+def encode_int8(vec):
+    """Scalar-quantise `vec` to int8 with one float32 scale (max |x| → 127)."""
+    arr = np.asarray(vec, dtype=np.float32)
+    peak = float(np.abs(arr).max()) if arr.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    q = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+    return Binary(np.float32(scale).astype("<f4").tobytes() + q.tobytes(), SUBTYPE_I8)
+
+
+def is_packed(value):
+    return isinstance(value, Binary) and value.subtype in DTYPES
+
+
+def decode_embedding(value):
+    """
+    float32 ndarray for a stored embedding, or None if missing/malformed.
+    Packed float32 decodes zero-copy; float16 is widened; legacy arrays of
+    doubles are converted as-is (not normalised – cosine handles that).
+    """
+    if is_packed(value) and value.subtype == SUBTYPE_I8:
+        if len(value) <= I8_HEADER:
+            return None
+        scale = np.frombuffer(value, dtype="<f4", count=1)[0]
+        return np.frombuffer(value, dtype=np.int8, offset=I8_HEADER).astype(np.float32) * scale
+    if is_packed(value):
+        dtype = DTYPES[value.subtype]
+        if len(value) % dtype.itemsize:
+            return None
+        arr = np.frombuffer(value, dtype=dtype)
+        return arr if dtype == np.float32 else arr.astype(np.float32)
+    if isinstance(value, np.ndarray) and value.ndim == 1 and value.size:
+        return value.astype(np.float32, copy=False)
+    if isinstance(value, list) and value:
+        try:
+            return np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def embedding_length(value):
+    """Element count of a stored embedding without decoding it (0 if unusable)."""
+    if is_packed(value) and value.subtype == SUBTYPE_I8:
+        return max(len(value) - I8_HEADER, 0)
+    if is_packed(value):
+        return len(value) // DTYPES[value.subtype].itemsize
+    if isinstance(value, (list, np.ndarray)):
+        return len(value)
+    return 0
@@ -0,0 +1,65 @@
+"""
+embeddingprofile.py - Compact first-pass embedding profiles
+────────────────────────────────────────────────────────────────────────────
+A profile describes the cheap vector used to rank every candidate before the
+exact rescore on full 3072-dim vectors:
+
+    dims   Matryoshka-style truncation to the first `dims` values, then
+           re-normalised (what the API's `dimensions` parameter does for
+           text-embedding-3 models, done locally so the full vector is kept)
+    quant  "int8" for scalar quantisation with a per-vector scale
+
+Writers store the compact form in `embeddingCompact` next to the full
+`embedding`; benchmarks/profile_recall.py reports recall@K per profile.
+"""
+
+import os
+
+import numpy as np
+
+from embeddingcodec import encode_embedding, encode_int8, normalize
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+PROFILES = {
+    "full"     : None,
+    "d1024"    : {"dims": 1024, "quant": None},
+    "d512"     : {"dims": 512,  "quant": None},
+    "d256"     : {"dims": 256,  "quant": None},
+    "int8"     : {"dims": None, "quant": "int8"},
+    "d512-int8": {"dims": 512,  "quant": "int8"},
+    "d256-int8": {"dims": 256,  "quant": "int8"},
+}
+EMBEDDING_PROFILE = os.environ.get("EMBEDDING_PROFILE", "full")
+RESCORE_MARGIN    = int(os.environ.get("RESCORE_MARGIN", "250"))   # extra candidates rescored exactly
+COMPACT_FIELD     = "embeddingCompact"
+# ───────────────────────────────────────────────────────────────────────
+
+
+def get_profile(name=None):
+    """Profile dict for `name` (default EMBEDDING_PROFILE); None means full vectors."""
+    name = name or EMBEDDING_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown embedding profile {name!r}; choose from {sorted(PROFILES)}")
+    return PROFILES[name]
+
+
+def compact_vector(vec, profile):
+    """Truncated, re-normalised float32 vector for `profile` (before quantisation)."""
+    arr = np.asarray(vec, dtype=np.float32)
+    if profile and profile.get("dims"):
+        arr = arr[:profile["dims"]]
+    return normalize(arr)
+
+
+def encode_compact(vec, profile):
+    """Storage form of the compact vector (BSON Binary)."""
+    arr = compact_vector(vec, profile)
+    if profile and profile.get("quant") == "int8":
+        return encode_int8(arr)
+    return encode_embedding(arr, "float32")
+
+
+def compact_dims(profile, full_dim):
+    if profile and profile.get("dims"):
+        return min(profile["dims"], full_dim)
+    return full_dim
@@ -0,0 +1,405 @@
+"""
+embeddingsnapshot.py - Memory-mapped resume embedding snapshot
+────────────────────────────────────────────────────────────────────────────
+Keeps a local copy of the resume embedding matrix so warm matcher runs only
+pull scalar fields and the delta since the last sync from MongoDB.
+
+On-disk layout (in SNAPSHOT_DIR):
+    embeddings.f32   append-only float32 rows, `dim` values each (mmap-able)
+    index.json       {"dim", "rows", "highWater", "retainedAt",
+                      "ids": {resumeId: [row, oid]}, "tombstones": [row, …]}
+    log.jsonl        add / del / highWater / retained operations since the
+                     last fold, replayed over index.json on open
+    .lock            flock()ed around every mutation
+
+Ingest appends (append, remove, fetch_missing, sync) only add rows to
+embeddings.f32 and lines to log.jsonl. An open snapshot is kept per path for
+the container's lifetime and catches up under the lock by replaying only the
+log lines past its last offset. It parses index.json again only after a fold
+replaced it, so an upload does not grow with the snapshot. compact() (or a
+log past LOG_FOLD_OPS lines) folds the log into index.json.
+
+`highWater` is the largest resumes `_id` folded in. Re-uploads get a new
+`_id`, so they arrive in the delta and tombstone their previous row. Deletes
+are tombstoned directly by the ingest path via `remove()`, and by `retain()`,
+which drops every resume MongoDB no longer has. The matcher's keyword-
+prefiltered scans never see every resume, so `retain_from()` runs its own
+resumeId-only scan once RETAIN_INTERVAL_S has passed (`retainedAt`), or on
+demand:
+
+    python embeddingsnapshot.py sync --retain [--path DIR]
+
+Rows are only rewritten by `compact()`.
+
+Point SNAPSHOT_DIR at shared storage (EFS) to share one snapshot between
+getResumeScoreForJD and addResumeToZap; the default /tmp survives warm
+invocations of a single function.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from bson import ObjectId
+
+from embeddingcodec import decode_embedding
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+SNAPSHOT_DIR      = os.environ.get("RESUME_SNAPSHOT_DIR", "")   # empty → disabled
+SNAPSHOT_DIM      = 3072          # text-embedding-3-large
+COMPACT_RATIO     = 0.25          # compact once this share of rows is dead
+SYNC_BATCH_SIZE   = 500           # cursor batch size for delta pulls
+LOG_FOLD_OPS      = 5000          # fold log.jsonl into index.json past this
+RETAIN_INTERVAL_S = float(os.environ.get("RESUME_SNAPSHOT_RETAIN_HOURS", 24)) * 3600
+# ───────────────────────────────────────────────────────────────────────
+
+DATA_FILE  = "embeddings.f32"
+INDEX_FILE = "index.json"
+LOG_FILE   = "log.jsonl"
+LOCK_FILE  = ".lock"
+NO_ROW     = -1                   # resume known, but embedding unusable
+
+_open_snapshots = {}              # (path, dim) → ResumeSnapshot, kept across warm invocations
+
+
+class ResumeSnapshot:
+    def __init__(self, path, dim=SNAPSHOT_DIM):
+        self.path = path
+        self.dim = dim
+        self.rows = 0
+        self.high_water = None
+        self.retained_at = 0.0
+        self.ids = {}             # resumeId → [row, oid-str]
+        self.tombstones = []
+        self.log_ops = 0
+        self.log_bytes = 0        # end of the last whole line in log.jsonl
+        self.index_stamp = None
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+
+    # ── open / persist ────────────────────────────────────────────────
+    @classmethod
+    def open(cls, path=None, dim=SNAPSHOT_DIM):
+        """
+        Open (or start) the snapshot at `path`; returns None if disabled.
+        Kept per path across warm invocations and caught up with other writers.
+        """
+        path = path if path is not None else SNAPSHOT_DIR
+        if not path:
+            return None
+        os.makedirs(path, exist_ok=True)
+        snap = _open_snapshots.get((path, dim))
+        if snap is None:
+            snap = _open_snapshots[(path, dim)] = cls(path, dim)
+        snap._refresh()
+        return snap
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._file(LOCK_FILE), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._refresh()       # pick up other writers' changes
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _index_stamp(self):
+        """(inode, mtime) of index.json, which is only ever replaced whole."""
+        try:
+            st = os.stat(self._file(INDEX_FILE))
+            return st.st_ino, st.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        """
+        Catch up with the files: a full _load() when index.json was replaced
+        (a fold) or the log emptied, otherwise a replay of the log lines
+        appended since the last look.
+        """
+        try:
+            log_size = os.path.getsize(self._file(LOG_FILE))
+        except FileNotFoundError:
+            log_size = 0
+        if self.index_stamp != self._index_stamp() or log_size < self.log_bytes:
+            self._load()
+        elif log_size > self.log_bytes:
+            self._replay_log()
+            self._map()
+
+    def _load(self):
+        self.index_stamp = self._index_stamp()
+        try:
+            with open(self._file(INDEX_FILE)) as fh:
+                meta = json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            meta = {}
+        if meta and meta.get("dim") != self.dim:
+            print(f"» Snapshot dim {meta.get('dim')} ≠ {self.dim}, starting fresh")
+            meta = {}
+        self.rows = meta.get("rows", 0)
+        self.high_water = meta.get("highWater")
+        self.retained_at = meta.get("retainedAt", 0.0)
+        self.ids = meta.get("ids", {})
+        self.tombstones = meta.get("tombstones", [])
+
+        self.log_ops, self.log_bytes = 0, 0
+        self._replay_log()
+        self._map()
+
+    def _replay_log(self):
+        """Apply the whole log lines past `log_bytes`."""
+        try:
+            with open(self._file(LOG_FILE), "rb") as fh:
+                fh.seek(self.log_bytes)
+                for line in fh:
+                    if not line.endswith(b"\n"):
+                        break                    # torn final line
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if not self._apply(op):
+                        break                    # log from before a fold
+                    self.log_ops += 1
+                    self.log_bytes += len(line)
+        except FileNotFoundError:
+            pass
+
+    def _map(self):
+        """Zero-copy read-only view of the committed rows."""
+        if self.rows == 0:
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+            return
+        self.matrix = np.memmap(self._file(DATA_FILE), dtype=np.float32,
+                                mode="r", shape=(self.rows, self.dim))
+
+    def _apply(self, op):
+        """Apply one log operation to the in-memory view; False if it does not fit."""
+        if op["op"] == "add":
+            row = op["row"]
+            if row != NO_ROW and row != self.rows:
+                return False
+            old = self.ids.get(op["id"])
+            if old is not None and old[0] != NO_ROW:
+                self.tombstones.append(old[0])
+            self.ids[op["id"]] = [row, op["oid"]]
+            if row != NO_ROW:
+                self.rows += 1
+        elif op["op"] == "del":
+            entry = self.ids.pop(op["id"], None)
+            if entry is not None and entry[0] != NO_ROW:
+                self.tombstones.append(entry[0])
+        elif op["op"] == "highWater":
+            self.high_water = op["value"]
+        elif op["op"] == "retained":
+            self.retained_at = op["at"]
+        return True
+
+    def _log(self, ops):
+        """Apply `ops` and append them to the log – caller holds the lock."""
+        if not ops:
+            return
+        lines = "".join(json.dumps(op) + "\n" for op in ops).encode()
+        with open(self._file(LOG_FILE), "ab") as fh:
+            fh.truncate(self.log_bytes)          # drop a torn line left by a dead writer
+            fh.write(lines)
+        self.log_bytes += len(lines)
+        self.log_ops += len(ops)
+        if self.log_ops >= LOG_FOLD_OPS:
+            self._fold()
+        else:
+            self._map()
+
+    def _fold(self):
+        """Write the full index and empty the log – caller holds the lock."""
+        tmp = self._file(INDEX_FILE + ".tmp")
+        with open(tmp, "w") as fh:
+            json.dump({
+                "dim"       : self.dim,
+                "rows"      : self.rows,
+                "highWater" : self.high_water,
+                "retainedAt": self.retained_at,
+                "ids"       : self.ids,
+                "tombstones": self.tombstones,
+            }, fh)
+        # Empty the log first: a crash in between leaves the older index,
+        # and the next sync re-pulls what the lost entries had folded in.
+        open(self._file(LOG_FILE), "w").close()
+        os.replace(tmp, self._file(INDEX_FILE))
+        self.log_ops, self.log_bytes = 0, 0
+        self.index_stamp = self._index_stamp()
+        self._map()
+
+    # ── mutation ──────────────────────────────────────────────────────
+    def _append_rows(self, entries, high_water=None):
+        """entries: [(resumeId, oid-str, embedding)] – caller holds the lock."""
+        ops = []
+        with open(self._file(DATA_FILE), "ab") as fh:
+            # Drop rows written by a writer that died before logging them
+            fh.truncate(self.rows * self.dim * 4)
+            for resume_id, oid, emb in entries:
+                old = self.ids.get(resume_id)
+                if old is not None and old[1] == oid:
+                    continue
+                row = decode_embedding(emb)
+                if row is None or row.shape[0] != self.dim:
+                    op = {"op": "add", "id": resume_id, "oid": oid, "row": NO_ROW}
+                else:
+                    fh.write(row.astype("<f4", copy=False).tobytes())
+                    op = {"op": "add", "id": resume_id, "oid": oid, "row": self.rows}
+                self._apply(op)
+                ops.append(op)
+        if high_water is not None and high_water != self.high_water:
+            ops.append({"op": "highWater", "value": high_water})
+            self._apply(ops[-1])
+        self._log(ops)
+
+    def append(self, resume_id, oid, embedding):
+        """Fold one new/updated resume in (ingest path)."""
+        with self._locked():
+            self._append_rows([(resume_id, str(oid), embedding)])
+
+    def remove(self, resume_ids):
+        """Tombstone deleted resumes (ingest path)."""
+        with self._locked():
+            self._tombstone(resume_ids)
+
+    def _tombstone(self, resume_ids):
+        ops = [{"op": "del", "id": rid} for rid in resume_ids if rid in self.ids]
+        for op in ops:
+            self._apply(op)
+        self._log(ops)
+        return len(ops)
+
+    def sync(self, resumes_col):
+        """Pull resumes inserted since the high-water mark. Returns rows pulled."""
+        with self._locked():
+            query = {}
+            if self.high_water:
+                query["_id"] = {"$gt": ObjectId(self.high_water)}
+            pulled = 0
+            batch = []
+            high_water = self.high_water
+            cursor = (resumes_col.find(query, {"resumeId": 1, "embedding": 1})
+                      .sort("_id", 1).batch_size(SYNC_BATCH_SIZE))
+            for doc in cursor:
+                high_water = str(doc["_id"])
+                if not doc.get("resumeId"):
+                    continue
+                batch.append((doc["resumeId"], str(doc["_id"]), doc.get("embedding")))
+                pulled += 1
+                if len(batch) >= SYNC_BATCH_SIZE:
+                    self._append_rows(batch, high_water)
+                    batch = []
+            self._append_rows(batch, high_water)
+        if self.dead_ratio() >= COMPACT_RATIO:
+            self.compact()
+        return pulled
+
+    def fetch_missing(self, resumes_col, resume_ids):
+        """Pull embeddings for ids the snapshot has not seen yet (scan races)."""
+        missing = [rid for rid in resume_ids if rid and rid not in self.ids]
+        if not missing:
+            return 0
+        docs = list(resumes_col.find({"resumeId": {"$in": missing}},
+                                     {"resumeId": 1, "embedding": 1}))
+        with self._locked():
+            self._append_rows([(d["resumeId"], str(d["_id"]), d.get("embedding")) for d in docs])
+        return len(docs)
+
+    def retain(self, live_ids):
+        """Tombstone every resume not in `live_ids` (call after a full scan)."""
+        with self._locked():
+            gone = self._tombstone([rid for rid in self.ids if rid not in live_ids])
+            op = {"op": "retained", "at": time.time()}
+            self._apply(op)
+            self._log([op])
+        if self.dead_ratio() >= COMPACT_RATIO:
+            self.compact()
+        return gone
+
+    def retain_due(self):
+        return time.time() - self.retained_at >= RETAIN_INTERVAL_S
+
+    def retain_from(self, resumes_col):
+        """retain() against every resumeId in `resumes_col` (unfiltered, ids only)."""
+        live = {d["resumeId"] for d in resumes_col.find({}, {"_id": 0, "resumeId": 1})
+                                                  .batch_size(SYNC_BATCH_SIZE * 10)
+                if d.get("resumeId")}
+        return self.retain(live)
+
+    def dead_ratio(self):
+        return len(self.tombstones) / self.rows if self.rows else 0.0
+
+    def compact(self):
+        """Rewrite the data file with live rows only, renumber and fold the log into the index."""
+        with self._locked():
+            live = sorted((entry[0], rid) for rid, entry in self.ids.items() if entry[0] != NO_ROW)
+            tmp = self._file(DATA_FILE + ".tmp")
+            with open(tmp, "wb") as fh:
+                for new_row, (old_row, rid) in enumerate(live):
+                    fh.write(np.ascontiguousarray(self.matrix[old_row]).tobytes())
+                    self.ids[rid][0] = new_row
+            os.replace(tmp, self._file(DATA_FILE))
+            print(f"» Compacted snapshot: {self.rows} → {len(live)} rows")
+            self.rows = len(live)
+            self.tombstones = []
+            self._fold()
+
+    # ── reads ─────────────────────────────────────────────────────────
+    def row_of(self, resume_id):
+        entry = self.ids.get(resume_id)
+        return NO_ROW if entry is None else entry[0]
+
+    def vector(self, resume_id):
+        """Zero-copy view of one resume's embedding (None if unknown)."""
+        row = self.row_of(resume_id)
+        return None if row == NO_ROW else self.matrix[row]
+
+    def gather(self, resume_ids, dim):
+        """
+        (len(resume_ids), dim) float32 matrix + valid mask, same contract as
+        similarity.build_embedding_matrix. Unknown ids and a dim that does
+        not match the snapshot give zero rows.
+        """
+        out = np.zeros((len(resume_ids), dim), dtype=np.float32)
+        valid = np.zeros(len(resume_ids), dtype=bool)
+        if dim != self.dim or self.rows == 0:
+            return out, valid
+        rows = np.fromiter((self.row_of(rid) for rid in resume_ids),
+                           dtype=np.int64, count=len(resume_ids))
+        valid = rows != NO_ROW
+        if valid.any():
+            out[valid] = self.matrix[rows[valid]]
+        return out, valid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the resume embedding snapshot")
+    parser.add_argument("command", choices=["sync", "compact"])
+    parser.add_argument("--path", default=SNAPSHOT_DIR or "/tmp/resume_snapshot")
+    parser.add_argument("--retain", action="store_true",
+                        help="also tombstone resumes MongoDB no longer has (full resumeId scan)")
+    args = parser.parse_args()
+
+    snapshot = ResumeSnapshot.open(args.path)
+    if args.command == "compact":
+        snapshot.compact()
+    else:
+        from mongoconn import db_name, new_client
+        client = new_client()
+        try:
+            resumes_col = client[db_name]["resumes"]
+            print(f"✓ Pulled {snapshot.sync(resumes_col)} resumes into {args.path}")
+            if args.retain:
+                print(f"✓ Tombstoned {snapshot.retain_from(resumes_col)} deleted resumes")
+        finally:
+            client.close()
@@ -7,20 +7,28 @@ then by other criteria like keyword match count and AI score.
 """
 
 import json
-import requests
+import os
 from datetime import datetime, timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pymongo import MongoClient
+from functools import partial
+
+from matchstore import MatchStore
+from indexcatalog import check_once
+from keywordvocab import RESUME_PAYLOAD_PROJECTION
+from llmbatch import request, score_batches
+from llmclient import Deadline
+from mongoconn import db_name, get_mongo_client
+from promptbuilder import count_tokens, format_jd, format_resume
+from scorecache import ScoreCache, prompt_version
+from searchfields import region_countries
 
 # ╭─── CONFIG ───────────────────────────────────────────────────────────╮
-BATCH_SIZE               = 1   # resumes per OpenAI request (changed to 1)
+BATCH_SIZE               = int(os.environ.get("AISCORE_BATCH_SIZE", 1))  # max resumes per OpenAI request;
+                                 # raise only to a size benchmarks.aiscore_batching shows within the noise floor
+BATCH_TOKEN_BUDGET       = 6000  # resume tokens packed into one request
 CANDIDATES_TO_SCORE      = 20  # number of resumes sent to OpenAI
 TOP_RESULTS_RETURNED     = 5   # final resumes returned
-PARALLEL_WORKERS         = 4   # parallel OpenAI calls
 
-OPENAI_API_KEY           = ""  # Add your API key
 OPENAI_MODEL             = "gpt-4o"
-OPENAI_URL               = "https://api.openai.com/v1/chat/completions"
 
 SYSTEM_PROMPT = """ATS Resume Evaluation Prompt
 You are an expert ATS (Applicant Tracking System) assistant skilled at evaluating resumes for a given job description. Your task is to evaluate each resume against the job description independently and assign an aiScore from 0 to 100, representing how well the resume aligns with the JD.
@@ -71,14 +79,6 @@ Output format must be a JSON object with a key named 'result' which holds a list
 
 If any critical information is missing from either the job description or resume, note this in the evaluation as Null and score based on available information. Do not mix up the details between resumes and keep strictly as Null for missing info."""
 
-def get_mongo_client():
-    return MongoClient(
-        host="notify.pesuacademy.com",
-        port=27017,
-        username="admin",
-        password="",
-        authSource="admin"
-    )
 # ╰──────────────────────────────────────────────────────────────────────╯
 
 # ─── Helpers ────────────────────────────────────────────────────────────
@@ -116,8 +116,30 @@ def parse_created_on(val):
     
     return MIN_DT
 
-def safe_normalize_country(value):
-    return value.strip().lower() if isinstance(value, str) else ""
+def created_on_expr(field="$$m.createdOn"):
+    """parse_created_on as an aggregation expression (same fallbacks, MIN_DT floor)."""
+    from_epoch = {"$convert": {
+        "input": {"$convert": {"input": field, "to": "long", "onError": None, "onNull": None}},
+        "to": "date", "onError": None, "onNull": None}}
+    from_iso = {"$dateFromString": {"dateString": field, "onError": None, "onNull": None}}
+    return {"$ifNull": [
+        {"$switch": {"branches": [
+            {"case": {"$eq": [{"$type": field}, "string"]}, "then": {"$ifNull": [from_iso, from_epoch]}},
+            {"case": {"$isNumber": field}, "then": from_epoch},
+        ], "default": None}},
+        MIN_DT,
+    ]}
+
+def created_on_key(m):
+    """Sort key for a match: stored createdOnEpoch, else parsed createdOn."""
+    epoch = m.get("createdOnEpoch")
+    return parse_created_on(epoch if epoch is not None else m.get("createdOn"))
+
+# Rank keys for MatchStore.ranked, mirroring the Python sorts they replace;
+# createdOnEpoch is written at ingest, the parse only covers older records
+CREATED_ON_RANK = {"$ifNull": ["$$m.createdOnEpoch", {"$toLong": created_on_expr()}]}
+RECENCY_RANK = [(CREATED_ON_RANK, -1)]
+FINAL_RANK   = [(CREATED_ON_RANK, -1), ({"$ifNull": ["$$m.aiScore", 0]}, -1)]
 
 def count_keywords(resume, jd_keywords):
     """Count how many of the JD keywords are present in the resume's commonKeys"""
@@ -128,26 +150,89 @@ def count_keywords(resume, jd_keywords):
     
     return len(resume_keywords)  # Just return the count of keywords
 
+def load_resumes(db, resume_ids):
+    """Resume documents (no embeddings) with their resumeText attached."""
+    resume_docs = list(db["resumes"].find(
+        {"resumeId": {"$in": resume_ids}},
+        RESUME_PAYLOAD_PROJECTION
+    ))
+    text_map = {
+        d["resumeId"]: d.get("resumeText")
+        for d in db["resume_text"].find(
+            {"resumeId": {"$in": resume_ids}},
+            {"_id": 0, "resumeId": 1, "resumeText": 1}
+        )
+    }
+    for r in resume_docs:
+        r["resumeText"] = text_map.get(r["resumeId"])
+    return resume_docs
+
 # ─── OpenAI call ────────────────────────────────────────────────────────
-def call_openai(jd_text, resumes_batch):
-    # Since BATCH_SIZE is 1, this will always be a single resume
-    resume = resumes_batch[0]
-    rid = resume.get("resumeId")
-    if not rid:
+PROMPT_VERSION = prompt_version(SYSTEM_PROMPT, "single" if BATCH_SIZE == 1 else "batched")
+SCORE_FIELDS = ("aiScore", "keyMatchPoints", "compensationFit",
+                "locationStatus", "availabilityMatch", "hiringRecommendation")
+
+def pack_batches(resumes, size=BATCH_SIZE, budget=BATCH_TOKEN_BUDGET):
+    """
+    Greedy packing in rank order: at most `size` resumes and `budget`
+    estimated tokens per batch (a resume over budget still gets its own).
+    """
+    batches, current, used = [], [], 0
+    for resume in resumes:
+        cost = count_tokens(format_resume(resume))
+        if current and (len(current) >= size or used + cost > budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(resume)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def demux_results(batch, result_list, trust_lone=False):
+    """
+    Map `result` entries back to the batch by resumeId. Returns
+    (scores, rejected): entries whose resumeId is not in the batch, or
+    repeats one already seen, are rejected. With `trust_lone` (single-
+    resume scoring, batch size 1) a lone result for a lone resume is kept
+    whatever ID the model echoed; when batching, every entry must echo an
+    ID from its batch.
+    """
+    by_id = {str(r["resumeId"]): r["resumeId"] for r in batch}
+    entries = [e for e in result_list if isinstance(e, dict)]
+    lone = trust_lone and len(by_id) == 1 and len(entries) == 1
+    scores, rejected = {}, []
+    for entry in entries:
+        rid = by_id.get(str(entry.get("resumeId")))
+        if rid is None and lone:
+            rid = next(iter(by_id.values()))
+        if rid is None or rid in scores:
+            rejected.append(entry.get("resumeId"))
+            continue
+        scores[rid] = {f: entry.get(f) for f in SCORE_FIELDS}
+    return scores, rejected
+
+async def call_openai(jd_text, resumes_batch, deadline=None, batch_size=BATCH_SIZE):
+    resumes_batch = [r for r in resumes_batch if r.get("resumeId")]
+    if not resumes_batch:
         return {}
-    
-    if resume.get("resumeText"):
-        formatted_resume = f'### Resume ID: {rid} ###\n"""\n{resume["resumeText"]}\n"""'
-    else:
-        formatted_resume = json.dumps(resume, indent=2)
 
-    user_prompt = f"""Here is the job description:
+    if len(resumes_batch) == 1:
+        user_prompt = f"""Here is the job description:
 \"\"\"{jd_text}\"\"\"
 
 Here is the resume:
-{formatted_resume}
+{format_resume(resumes_batch[0])}
 
 Evaluate this resume individually and return only JSON in the exact format described above."""
+    else:
+        user_prompt = f"""Here is the job description:
+\"\"\"{jd_text}\"\"\"
+
+Here are the resumes:
+{chr(10).join(format_resume(r) for r in resumes_batch)}
+
+Evaluate each resume individually and return only JSON in the exact format described above, with exactly one result per resume whose resumeId is the Resume ID shown above it."""
 
     payload = {
         "model": OPENAI_MODEL,
@@ -159,39 +244,63 @@ Evaluate this resume individually and return only JSON in the exact format descr
     }
 
     try:
-        resp = requests.post(
-            OPENAI_URL,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            },
-            json=payload,
-            timeout=120,
-        )
+        resp = await request("chat/completions", payload, deadline)
         resp.raise_for_status()
         content = resp.json()["choices"][0]["message"]["content"]
         parsed = json.loads(content)
         
         result_list = parsed.get("result", [])
-        if result_list and isinstance(result_list[0], dict):
-            result_item = result_list[0]
-            return {
-                result_item.get("resumeId", rid): {
-                    "aiScore": result_item.get("aiScore"),
-                    "keyMatchPoints": result_item.get("keyMatchPoints"),
-                    "compensationFit": result_item.get("compensationFit"),
-                    "locationStatus": result_item.get("locationStatus"),
-                    "availabilityMatch": result_item.get("availabilityMatch"),
-                    "hiringRecommendation": result_item.get("hiringRecommendation")
-                }
-            }
-        return {}
+        scores, rejected = demux_results(resumes_batch, result_list if isinstance(result_list, list) else [],
+                                         trust_lone=batch_size == 1)
+        if rejected:
+            print(f"! aiScore: ignored {len(rejected)} result(s) with unknown or repeated resumeId: {rejected}")
+        if len(scores) < len(resumes_batch):
+            print(f"! aiScore: {len(resumes_batch) - len(scores)} of {len(resumes_batch)} resumes missing from the answer")
+        return scores
     except Exception as e:
         print(f"OpenAI API error: {e}")
         return {}
 
+def score_resumes(jd_text, resumes, deadline=None, batch_size=BATCH_SIZE):
+    """
+    AI-score `resumes`, up to batch_size per request within
+    BATCH_TOKEN_BUDGET. Resumes a batched answer left out are rescored one
+    per request. Returns (scores, stats); stats has the tokens and call
+    latency per scored resume used to tune batch size.
+    """
+    deadline = deadline or Deadline()
+    jd_text = format_jd(jd_text)
+    batches = pack_batches(resumes, batch_size)
+    call = partial(call_openai, batch_size=batch_size)
+    reports = [score_batches(call, jd_text, batches, deadline)]
+    scores = dict(reports[0].scores)
+
+    retry = [r for b in batches if len(b) > 1 for r in b if r["resumeId"] not in scores]
+    if deadline.remaining() == 0:
+        retry = []
+    if retry:
+        print(f"↪  aiScore: rescoring {len(retry)} resume(s) missing from batched answers individually")
+        reports.append(score_batches(call, jd_text, [[r] for r in retry], deadline,
+                                     label="aiScore retry"))
+        scores.update(reports[-1].scores)
+
+    scored = max(len(scores), 1)
+    stats = {
+        "batches": len(batches),
+        "retried": len(retry),
+        "unfinished": sum(r.unfinished for r in reports),
+        "tokens_per_resume": sum(r.tokens for r in reports) / scored,
+        "call_ms_per_resume": sum(r.call_s for r in reports) * 1000 / scored,
+        "elapsed_s": sum(r.elapsed_s for r in reports),
+    }
+    print(f"» aiScore: {len(scores)}/{len(resumes)} resumes scored in {stats['batches']} batch(es) "
+          f"of ≤{batch_size} ({stats['retried']} retried) – {stats['tokens_per_resume']:,.0f} tokens, "
+          f"{stats['call_ms_per_resume']:.0f} ms call time per scored resume")
+    return scores, stats
+
 # ─── Lambda entry ───────────────────────────────────────────────────────
 def lambda_handler(event, context):
+    deadline = Deadline.from_context(context)
     client = get_mongo_client()
     try:
         print("Processing request...")
@@ -204,116 +313,62 @@ def lambda_handler(event, context):
             return {"statusCode": 400,
                     "body": json.dumps({"error": "Missing 'jobId'"})}
 
-        db   = client["resumes_database"]
+        db   = client[db_name]
+        check_once(db, "job_description", "matches", "job_matches", "resumes", "resume_text", "ai_scores")
         jd   = db["job_description"].find_one({"jobId": jd_id},
-                                              {"_id": 0, "embedding": 0})
+                                              {"_id": 0, "embedding": 0, "embeddingCompact": 0})
         if not jd:
             return {"statusCode": 404,
                     "body": json.dumps({"error": "Job description not found"})}
         jd_text = jd.get("jobDescription", "")
         jd_keywords = jd.get("structured_query", {}).get("keywords", [])
 
-        match_doc = db["matches"].find_one({"jobId": jd_id}, {"_id": 0})
-        matches_all = match_doc.get("matches", []) if match_doc else []
-        print(f"Found {len(matches_all)} initial matches")
-
-        # ── Apply filters ─────────────────────────────────────────────
+        valid = region_countries(region)
         if kw_flt:
             print(f"Applying keyword filter: {kw_flt}")
-            kw_set = set(kw_flt)
-            matches_all = [
-                m for m in matches_all
-                if kw_set.issubset(set(m.get("commonKeys", [])))
-            ]
-            print(f"After keyword filter: {len(matches_all)} matches")
-
-        region_id_to_countries = {
-            "0966bbc7-8d15-11ef-a224-000c29dc611c": ["Australia"],
-            "2039bca5-8d14-11ef-a224-000c29dc611c": ["United Arab Emirates", "Uae"],
-            "2853b6af-04af-11f0-b74e-52540e737e83": ["Hong Kong", "Hong Kong Sar"],
-            "28820f8a-04af-11f0-b74e-52540e737e83": ["Japan"],
-            "28cccee1-04af-11f0-b74e-52540e737e83": ["Germany"],
-            "29ef8adf-8d16-11ef-a224-000c29dc611c": ["Saudi Arabia", "Ksa"],
-            "3e58491b-8d13-11ef-a224-000c29dc611c": ["Philippines", "The Philippines"],
-            "6f48aadb-08a0-11f0-a380-5254828ec570": ["Singapore"],
-            "7c1f71d7-8d25-11ef-a224-000c29dc611c": ["Thailand"],
-            "9a7be17b-8d15-11ef-a224-000c29dc611c": ["New Zealand"],
-            "9e21a39d-d1a6-4aca-bfc2-4a241d4cbec8": ["India", "Ind"],
-            "a227528b-8d13-11ef-a224-000c29dc611c": ["Malaysia"],
-            "ba184d1f-8d14-11ef-a224-000c29dc611c": ["United States", "Usa", "Us"],
-            "c7c45e99-ff53-42e1-981b-3ba1f0794b24": ["Indonesia"],
-            "e573ba69-2886-11ef-b4be-000c29dc611c": ["Vietnam", "Viet Nam", "Vn", "Vietnamese"],
-        }
-        if region and region in region_id_to_countries:
+        if valid is not None:
             print(f"Applying region filter: {region}")
-            valid = {safe_normalize_country(c) for c in region_id_to_countries[region]}
-            matches_all = [
-                m for m in matches_all
-                if safe_normalize_country(m.get("country")) in valid
-            ]
-            print(f"After region filter: {len(matches_all)} matches")
-
-        # ── Initial selection for AI scoring ───────────────────────────
-        print("Initial sort by creation date (newest first)")
-        for m in matches_all:
-            m["_parsed_date"] = parse_created_on(m.get("createdOn"))
-        
-        # Sort just by creation date for initial selection
-        matches_all.sort(
-            key=lambda m: m["_parsed_date"],
-            reverse=True  # newest first
-        )
-        
-        # Select top candidates for AI scoring
-        top_candidates = matches_all[:CANDIDATES_TO_SCORE]
+
+        # ── Filter + rank in MongoDB ───────────────────────────────────
+        # Newest CANDIDATES_TO_SCORE go to AI scoring. Fresh scores can only
+        # move those records, so the final top N is among them plus the top
+        # CANDIDATES_TO_SCORE + N by stored rank – no refetch needed.
+        match_store = MatchStore(db)
+        ranked = match_store.ranked(jd_id, {
+            "candidates": (RECENCY_RANK, CANDIDATES_TO_SCORE),
+            "finalists":  (FINAL_RANK, CANDIDATES_TO_SCORE + TOP_RESULTS_RETURNED),
+        }, keywords=kw_flt, countries=valid)
+        top_candidates = ranked["candidates"]
         print(f"Selected {len(top_candidates)} newest candidates for AI scoring")
 
         # ── AI Score calculation ─────────────────────────────────────────
         to_score = [m for m in top_candidates if "aiScore" not in m]
         if to_score:
             print(f"Getting AI scores for {len(to_score)} candidates")
-            need_ids = [m["resumeId"] for m in to_score]
-            resumes_col = db["resumes"]
-            resume_docs = list(resumes_col.find(
-                {"resumeId": {"$in": need_ids}},
-                {"_id": 0, "embedding": 0}
-            ))
-
-            resume_text_col = db["resume_text"]
-            text_map = {
-                d["resumeId"]: d.get("resumeText")
-                for d in resume_text_col.find(
-                    {"resumeId": {"$in": need_ids}},
-                    {"_id": 0, "resumeId": 1, "resumeText": 1}
-                )
-            }
-            for r in resume_docs:
-                rid = r["resumeId"]
-                r["resumeText"] = text_map.get(rid)
-
-            batches = [resume_docs[i:i+BATCH_SIZE]
-                       for i in range(0, len(resume_docs), BATCH_SIZE)]
-
-            scores = {}
-            with ThreadPoolExecutor(max_workers=PARALLEL_WORKERS) as pool:
-                futures = {pool.submit(call_openai, jd_text, b): None for b in batches}
-                for f in as_completed(futures):
-                    scores.update(f.result())
+            resume_docs = load_resumes(db, [m["resumeId"] for m in to_score])
+            stats = {"unfinished": 0}
+            def score_misses(misses):
+                fresh, miss_stats = score_resumes(jd_text, misses, deadline)
+                stats.update(miss_stats)
+                return fresh
+            cache = ScoreCache(db, PROMPT_VERSION, OPENAI_MODEL)
+            scores = cache.read_through(format_jd(jd_text), resume_docs, score_misses)
+            if stats["unfinished"] or deadline.remaining() == 0:
+                print(f"! Deadline reached with {len(scores)} of {len(resume_docs)} "
+                      f"resumes scored – returning partial results")
 
             # Update database with all new fields
-            for rid, score_data in scores.items():
-                update_fields = {
-                    "matches.$.aiScore": score_data.get("aiScore"),
-                    "matches.$.keyMatchPoints": score_data.get("keyMatchPoints"),
-                    "matches.$.compensationFit": score_data.get("compensationFit"),
-                    "matches.$.locationStatus": score_data.get("locationStatus"),
-                    "matches.$.availabilityMatch": score_data.get("availabilityMatch"),
-                    "matches.$.hiringRecommendation": score_data.get("hiringRecommendation")
+            match_store.set_fields(jd_id, {
+                rid: {
+                    "aiScore": score_data.get("aiScore"),
+                    "keyMatchPoints": score_data.get("keyMatchPoints"),
+                    "compensationFit": score_data.get("compensationFit"),
+                    "locationStatus": score_data.get("locationStatus"),
+                    "availabilityMatch": score_data.get("availabilityMatch"),
+                    "hiringRecommendation": score_data.get("hiringRecommendation")
                 }
-                db["matches"].update_one(
-                    {"jobId": jd_id, "matches.resumeId": rid},
-                    {"$set": update_fields}
-                )
+                for rid, score_data in scores.items()
+            })
             
             # Update our local candidates with new scores and fields
             for m in top_candidates:
@@ -326,53 +381,24 @@ def lambda_handler(event, context):
                     m["availabilityMatch"] = score_data.get("availabilityMatch")
                     m["hiringRecommendation"] = score_data.get("hiringRecommendation")
 
-        # ── Refetch and final ranking ──────────────────────────────────
-        upd_doc = db["matches"].find_one({"jobId": jd_id}, {"_id": 0})
-        upd_matches = upd_doc.get("matches", []) if upd_doc else []
+        # ── Merge fresh scores and final ranking ───────────────────────
+        merged = {m["resumeId"]: m for m in ranked["finalists"]}
+        merged.update({m["resumeId"]: m for m in top_candidates})
 
-        # Re-apply filters on refreshed list
-        if kw_flt:
-            kw_set = set(kw_flt)
-            upd_matches = [
-                m for m in upd_matches
-                if kw_set.issubset(set(m.get("commonKeys", [])))
-            ]
-        if region and region in region_id_to_countries:
-            valid = {safe_normalize_country(c) for c in region_id_to_countries[region]}
-            upd_matches = [
-                m for m in upd_matches
-                if safe_normalize_country(m.get("country")) in valid
-            ]
-        
-        # Process dates again for final sorting
-        for m in upd_matches:
-            m["_parsed_date"] = parse_created_on(m.get("createdOn"))
-        
         # ── 3. FINAL RANKING: By date FIRST, then AI score ─────────────
         print("Final ranking: creation date first, then AI score")
-        
-        # First recompute dates for the updated matches
-        for m in upd_matches:
-            m["_parsed_date"] = parse_created_on(m.get("createdOn"))
-        
-        upd_sorted = sorted(
-            upd_matches,
+        final = sorted(
+            merged.values(),
             key=lambda m: (
-                m["_parsed_date"],                # newest first
-                m.get("aiScore", 0)               # then highest AI score
+                created_on_key(m),                        # newest first
+                m.get("aiScore") or 0                     # then highest AI score
             ),
             reverse=True
-        )
-        
-        final = upd_sorted[:TOP_RESULTS_RETURNED]
+        )[:TOP_RESULTS_RETURNED]
 
-        # Clean up and add rank
+        # Add rank
         for i, m in enumerate(final, 1):
             m["rank"] = i
-            if "_parsed_date" in m:
-                del m["_parsed_date"]
-            if "_keyword_count" in m:
-                del m["_keyword_count"]
 
         print(f"Returning {len(final)} final matches")
         return {
@@ -390,6 +416,3 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "body": json.dumps({"error": f"Internal server error: {str(e)}"})
         }
-    finally:
-        client.close()
-        print("MongoDB connection closed")
\ No newline at end of file
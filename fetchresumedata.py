@@ -1,15 +1,7 @@
 import json
-from pymongo import MongoClient
-
-def get_mongo_client():
-    """Initialize and return MongoDB client."""
-    return MongoClient(
-        host="notify.pesuacademy.com",
-        port=27017,
-        username="admin",
-        password="",
-        authSource="admin"
-    )
+from indexcatalog import check_once
+from keywordvocab import RESUME_PAYLOAD_PROJECTION
+from mongoconn import db_name, get_mongo_client
 
 def lambda_handler(event, context):
     """Lambda function to retrieve resume details and matching jobs."""
@@ -23,12 +15,13 @@ def lambda_handler(event, context):
         
         # Connect to MongoDB
         mongo_client = get_mongo_client()
-        db = mongo_client["resumes_database"]
+        db = mongo_client[db_name]
+        check_once(db, "resumes", "resume_matches")
         resume_collection = db["resumes"]
         resume_matches_collection = db["resume_matches"]
         
-        # Fetch resume details excluding the "embedding" field
-        resume = resume_collection.find_one({"resumeId": resume_id}, {"_id": 0, "embedding": 0})
+        # Fetch resume details excluding embeddings and term ids
+        resume = resume_collection.find_one({"resumeId": resume_id}, RESUME_PAYLOAD_PROJECTION)
         
         if not resume:
             return {"statusCode": 404, "body": json.dumps({"error": "Resume not found"})}
@@ -45,7 +38,3 @@ def lambda_handler(event, context):
     
     except Exception as e:
         return {"statusCode": 500, "body": json.dumps({"error": f"Internal server error: {str(e)}"})}
-    
-    finally:
-        if 'mongo_client' in locals():
-            mongo_client.close()
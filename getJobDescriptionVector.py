@@ -1,37 +1,17 @@
 import json
 import boto3
-import requests
-from pymongo import MongoClient
 from pymongo.errors import DuplicateKeyError, PyMongoError
 
-# MongoDB PESU Academy EC2 connection details
-host     = "notify.pesuacademy.com"
-port     = 27017
-username = "admin"
-password = ""                     
-auth_db  = "admin"
-db_name  = "resumes_database"
-
-# ───────────────────────────────────────────────────────────────────────
-# MongoDB client
-def get_mongo_client():
-    return MongoClient(
-        host=host,
-        port=port,
-        username=username,
-        password=password,
-        authSource=auth_db
-    )
-
-client     = get_mongo_client()
-db         = client[db_name]
-collection = db["job_description"]
+from embeddingcodec import encode_embedding
+from embeddingprofile import COMPACT_FIELD, encode_compact, get_profile
+from matchstore import MatchStore
+from indexcatalog import check_once
+from llmclient import post
+from mongoconn import db_name, get_mongo_client
 
 # AWS Lambda client (to trigger resume-matching Lambda)
 lambda_client = boto3.client('lambda')
 
-# OpenAI API
-api_key = ""                      # ← fill in prod key
 # ───────────────────────────────────────────────────────────────────────
 
 
@@ -40,11 +20,10 @@ def delete_jd_data(mongo_client, job_id):
     """Delete existing JD data from the three collections."""
     db_local                   = mongo_client[db_name]
     jd_collection              = db_local["job_description"]
-    matches_collection         = db_local["matches"]
     resume_matches_collection  = db_local["resume_matches"]
 
     jd_collection.delete_many({"jobId": job_id})
-    matches_collection.delete_many({"jobId": job_id})
+    MatchStore(db_local).remove_job(job_id)
     resume_matches_collection.update_many(
         {"matches.jobId": job_id},
         {"$pull": {"matches": {"jobId": job_id}}}
@@ -69,16 +48,11 @@ def trigger_processing_lambda(job_id, structured_jd):
 
 def create_embedding(text):
     """Generate embedding with text-embedding-3-large."""
-    url     = "https://api.openai.com/v1/embeddings"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
     data = {
         "input": text,
         "model": "text-embedding-3-large"
     }
-    resp = requests.post(url, headers=headers, json=data)
+    resp = post("embeddings", data)
     resp.raise_for_status()
     payload = resp.json()
     if "data" in payload:
@@ -88,12 +62,6 @@ def create_embedding(text):
 
 def format_job_description(jd_text):
     """Convert a natural-language JD to structured JSON (4 keys)."""
-    url     = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-
     example_jd_json = """
     {
         "educationalQualifications": [
@@ -134,7 +102,7 @@ def format_job_description(jd_text):
         "response_format": { "type": "json_object" }
     }
 
-    resp = requests.post(url, headers=headers, json=data)
+    resp = post("chat/completions", data)
     resp.raise_for_status()
     payload = resp.json()
     if payload.get("choices"):
@@ -156,6 +124,8 @@ def process_job_description(job_data):
     # Update-flag handling (truthy values → 1)
     raw_flag    = job_data.get("update", 0)
     update_flag = 1 if str(raw_flag).lower() in ("1", "true", "yes") else 0
+    client     = get_mongo_client()
+    collection = client[db_name]["job_description"]
     if update_flag == 1:
         print(f"[update] Deleting existing data for jobId: {job_id}")
         delete_jd_data(client, job_id)
@@ -167,10 +137,14 @@ def process_job_description(job_data):
         document = {
             **job_data,
             "structured_query": structured_jd,
-            "embedding"      : embedding,
+            "embedding"      : encode_embedding(embedding),
             "processingState": "pending"
         }
 
+        profile = get_profile()
+        if profile:
+            document[COMPACT_FIELD] = encode_compact(embedding, profile)
+
         collection.insert_one(document)
         trigger_processing_lambda(job_id, structured_jd)
 
@@ -202,6 +176,7 @@ def process_job_description(job_data):
 def lambda_handler(event, context):
     try:
         req_body = json.loads(event["body"])
+        check_once(get_mongo_client()[db_name], "job_description", "matches", "resume_matches", "job_matches")
         return process_job_description(req_body)
     except (KeyError, json.JSONDecodeError) as exc:
         return {
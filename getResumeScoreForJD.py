@@ -1,175 +1,521 @@
-from pymongo import MongoClient
-import math
+from pymongo import UpdateOne
+import heapq
+import time
 from datetime import datetime
-import difflib
+
+import numpy as np
+
+from similarity import (build_embedding_matrix, cosine_similarities, cosine_similarity_matrix,
+                        to_query_vector, SCORE_CHUNK_SIZE)
+from embeddingsnapshot import ResumeSnapshot
+from embeddingcodec import decode_embedding, embedding_length, is_packed
+from embeddingprofile import COMPACT_FIELD, RESCORE_MARGIN, compact_vector, get_profile
+from annindex import ResumeAnnIndex, ann_vector
+from titlematch import TitleIndex, normalize_experiences
+from keywordvocab import (KeywordOverlap, KeywordVocabulary, TERM_IDS_FIELD, TERMS_FIELD,
+                          normalize_terms, resume_term_ids)
+from matchstore import MatchStore
+from indexcatalog import check_once
+from mongoconn import db_name, get_mongo_client
+from searchfields import match_search_fields
 
 # ── CONFIG ─────────────────────────────────────────────────────────────
-host       = "notify.pesuacademy.com"
-port       = 27017
-username   = "admin"
-password   = ""
-auth_db    = "admin"
-db_name    = "resumes_database"
 TOP_LIMIT  = 500               # keep best N matches per JD
 TITLE_SIM_THRESHOLD = 0.85     # fuzzy title match cut-off
+BATCH_MODE = True              # score all pending JDs in one resumes scan
+KEYWORD_PREFILTER = True       # only fetch resumes sharing a keyword with some pending JD
+ANN_CANDIDATES = 3000          # resumes fetched per JD when the ANN index is on
+ID_BATCH_SIZE  = 5000          # resumeIds per $in query
+SCAN_BATCH_SIZE = 1000         # cursor batch: ~1000 projected resumes stay well under 16 MB
+STAGED_RANKING = True          # False → every keyword-qualified candidate gets stage two
 # ───────────────────────────────────────────────────────────────────────
 
-def calculate_cosine_similarity(vec1, vec2):
-    dot = sum(a * b for a, b in zip(vec1, vec2))
-    n1  = math.sqrt(sum(a * a for a in vec1))
-    n2  = math.sqrt(sum(b * b for b in vec2))
-    return 0.0 if n1 == 0 or n2 == 0 else dot / (n1 * n2)
+# Everything build_match / experience matching reads; vectors are added per source
+MATCH_FIELDS = [
+    "resumeId", "name", "email", "contactNo", "address", "city", "state",
+    "country", "createdOn", "ownedBy", "noticePeriod", "expectedCTC",
+    "totalExperience", "jobExperiences.title", "jobExperiences.duration",
+    TERM_IDS_FIELD, "keywords", "skills.skillName",
+]
 
-def get_common_keywords(list1, list2):
-    if isinstance(list1, str):
-        list1 = [list1]
-    if isinstance(list2, str):
-        list2 = [list2]
-    return list(set(list1) & set(list2))
+def open_snapshot(resumes_col):
+    """Open the local embedding snapshot and fold in the delta (None if disabled)."""
+    snapshot = ResumeSnapshot.open()
+    if snapshot is not None:
+        pulled = snapshot.sync(resumes_col)
+        print(f"» Embedding snapshot: {len(snapshot.ids)} resumes, {pulled} pulled from delta")
+        if snapshot.retain_due():           # matcher scans are keyword-filtered, never full
+            print(f"» Embedding snapshot: {snapshot.retain_from(resumes_col)} deleted resumes dropped")
+    return snapshot
 
-def get_common_experiences(resume_exps, jd_exps):
-    out = []
-    if not isinstance(resume_exps, list) or not isinstance(jd_exps, list):
+class ResumeEmbeddings:
+    """
+    Where the matcher reads resume vectors from during a scan:
+      snapshot – local mmap snapshot, exact, nothing extra over the wire
+      compact  – `embeddingCompact` first pass, exact rescore of the shortlist
+      inline   – full `embedding` read with every resume (original path)
+    """
+    def __init__(self, resumes_col=None, snapshot=None, profile=None):
+        self.resumes_col = resumes_col
+        self.snapshot = snapshot
+        self.profile = profile if snapshot is None else None
+
+    @classmethod
+    def open(cls, resumes_col):
+        return cls(resumes_col, open_snapshot(resumes_col), get_profile())
+
+    @property
+    def needs_rescore(self):
+        return self.profile is not None
+
+    def shortlist_limit(self):
+        return TOP_LIMIT + RESCORE_MARGIN if self.needs_rescore else TOP_LIMIT
+
+    def projection(self):
+        fields = dict.fromkeys(MATCH_FIELDS, 1)
+        if self.snapshot is None:
+            fields[COMPACT_FIELD if self.profile is not None else "embedding"] = 1
+        return fields
+
+    def scan(self, resume_ids=None, terms=None):
+        """
+        All resumes, or only `resume_ids` (fetched in $in batches). With
+        `terms`, only resumes whose `keywordTerms` contain one of them –
+        plus any not backfilled yet, so results match an unfiltered scan.
+        """
+        query = {}
+        if terms is not None:
+            query["$or"] = [{TERMS_FIELD: {"$in": terms}}, {TERMS_FIELD: {"$exists": False}}]
+        projection = self.projection()
+        if resume_ids is None:
+            yield from self.resumes_col.find(query, projection).batch_size(SCAN_BATCH_SIZE)
+            return
+        resume_ids = sorted(resume_ids)
+        for start in range(0, len(resume_ids), ID_BATCH_SIZE):
+            batch = resume_ids[start:start + ID_BATCH_SIZE]
+            yield from (self.resumes_col.find({**query, "resumeId": {"$in": batch}}, projection)
+                        .batch_size(SCAN_BATCH_SIZE))
+
+    def finish_scan(self, seen_ids):
+        if self.snapshot is not None:
+            self.snapshot.retain(seen_ids)
+
+    def query_vector(self, jd_info):
+        return jd_info["compact"] if self.needs_rescore else jd_info["vector"]
+
+    def chunk_matrix(self, chunk_resumes, dim):
+        """(len(chunk_resumes), dim) matrix of scan-pass vectors + valid mask."""
+        if self.snapshot is not None:
+            resume_ids = [r.get("resumeId") for r in chunk_resumes]
+            self.snapshot.fetch_missing(self.resumes_col, resume_ids)
+            return self.snapshot.gather(resume_ids, dim)
+        if self.profile is None:
+            return build_embedding_matrix([r.get("embedding") for r in chunk_resumes], dim)
+
+        # Compact profile: derive the compact vector for resumes stored before
+        # the profile existed (or under another one) from their full embedding.
+        vectors = [r.get(COMPACT_FIELD) for r in chunk_resumes]
+        stale = [r.get("resumeId") for r, v in zip(chunk_resumes, vectors)
+                 if embedding_length(v) != dim]
+        if stale:
+            full = self.full_vectors(stale)
+            for k, r in enumerate(chunk_resumes):
+                if embedding_length(vectors[k]) != dim:
+                    vec = full.get(r.get("resumeId"))
+                    vectors[k] = compact_vector(vec, self.profile) if vec is not None else None
+        return build_embedding_matrix(vectors, dim)
+
+    def full_vectors(self, resume_ids):
+        """resumeId → full decoded embedding, one $in round trip."""
+        out = {}
+        for doc in self.resumes_col.find({"resumeId": {"$in": list(resume_ids)}},
+                                         {"resumeId": 1, "embedding": 1}):
+            vec = decode_embedding(doc.get("embedding"))
+            if vec is not None:
+                out[doc["resumeId"]] = vec
         return out
-    for r in resume_exps:
-        r_title = str(r.get("title", "")).lower().strip()
-        r_dur   = r.get("duration")
-        if not r_title:
-            continue
-        for j in jd_exps:
-            j_title = str(j.get("title", "")).lower().strip()
-            j_dur   = j.get("duration")
-            if not j_title:
-                continue
-            score = difflib.SequenceMatcher(None, r_title, j_title).ratio()
-            if score >= TITLE_SIM_THRESHOLD:
-                out.append({
-                    "resumeTitle": r_title,
-                    "jdTitle"    : j_title,
-                    "resumeDuration": r_dur,
-                    "jdDuration"    : j_dur,
-                    "matchScore"    : round(score, 2)
-                })
+
+    def release_vectors(self, chunk_resumes):
+        """
+        Drop scan-pass vectors once the chunk is scored: leaders keep only the
+        match fields, and the rescore refetches full vectors by resumeId.
+        """
+        for r in chunk_resumes:
+            r.pop("embedding", None)
+            r.pop(COMPACT_FIELD, None)
+
+    def exact_matrix(self, resume_ids, dim):
+        """Full-precision matrix for the rescore shortlist."""
+        full = self.full_vectors(resume_ids)
+        return build_embedding_matrix([full.get(rid) for rid in resume_ids], dim)
+
+def match_titles(resume_titles, jd_titles, jd_index):
+    """Experience matches for pre-normalised (title, duration) lists via the JD's title index."""
+    out = []
+    for r_title, r_dur in resume_titles:
+        for k, score in jd_index.search(r_title, TITLE_SIM_THRESHOLD):
+            j_title, j_dur = jd_titles[k]
+            out.append({
+                "resumeTitle": r_title,
+                "jdTitle"    : j_title,
+                "resumeDuration": r_dur,
+                "jdDuration"    : j_dur,
+                "matchScore"    : round(score, 2)
+            })
     return out
 
+def prepare_jd(jd, vocab):
+    """Validate a pending JD and pull out the fields the matcher needs (None → skip)."""
+    jd_id = jd.get("jobId")
+    if not jd_id:
+        print("» Skipping JD without jobId")
+        return None
+
+    jd_keywords     = jd.get("structured_query", {}).get("keywords") or []
+    jd_embedding    = jd.get("embedding") or []
+    jd_experiences  = jd.get("structured_query", {}).get("jobExperiences") or []
+
+    if not isinstance(jd_keywords, list) or not (isinstance(jd_embedding, list) or is_packed(jd_embedding)):
+        print(f"» Malformed JD {jd_id}, skipping.")
+        return None
+
+    vector  = to_query_vector(jd_embedding)
+    profile = get_profile()
+    term_ids, term_labels = vocab.labelled(jd_keywords)
+    jd_titles = normalize_experiences(jd_experiences)
+    return {
+        "jobId"         : jd_id,
+        "jobDescription": jd.get("jobDescription", ""),
+        "keywords"      : jd_keywords,
+        "terms"         : normalize_terms(jd_keywords),
+        "termIds"       : term_ids,
+        "termLabels"    : term_labels,
+        "experiences"   : jd_titles,
+        "titleIndex"    : TitleIndex([t for t, _ in jd_titles]),
+        "vector"        : vector,
+        "compact"       : compact_vector(vector, profile) if profile and vector is not None else None,
+        "candidates"    : None,
+    }
+
+def ann_candidates(ann, jd_info):
+    """resumeIds the ANN index puts closest to the JD (None → scan everything)."""
+    if ann is None or jd_info["vector"] is None:
+        return None
+    ids, _ = ann.search(ann_vector(jd_info["vector"], ann.dim), ANN_CANDIDATES)
+    print(f"» ANN: {len(ids)} candidate resumes for JD {jd_info['jobId']}")
+    return set(ids)
+
+def build_match(resume, common_keys, common_experiences):
+    return {
+        "resumeId"       : resume.get("resumeId"),
+        "name"           : resume.get("name"),
+        "email"          : resume.get("email"),
+        "contactNo"      : resume.get("contactNo"),
+        "address"        : resume.get("address"),
+        "city"           : resume.get("city"),
+        "state"          : resume.get("state"),
+        "country"        : resume.get("country"),
+        "createdOn"      : resume.get("createdOn"),
+        "ownedBy"        : resume.get("ownedBy"),
+        "noticePeriod"   : resume.get("noticePeriod"),
+        "expectedCTC"    : resume.get("expectedCTC"),
+        "totalExperience": resume.get("totalExperience"),
+        "commonKeys"     : common_keys,
+        "commonKeyCount" : len(common_keys),     # lets $push … $sort apply the ranking rule
+        "similarityScore": 0.0,
+        "commonExperiences": common_experiences,
+        **match_search_fields(resume)
+    }
+
+def rank_matches(matches, limit=None):
+    """Best-first order used for every JD, trimmed to `limit` (default TOP_LIMIT)."""
+    return sorted(
+        matches,
+        key=lambda x: (len(x["commonKeys"]), x["similarityScore"]),
+        reverse=True
+    )[:limit or TOP_LIMIT]
+
+def finalize_matches(source, jd_info, matches):
+    """
+    Final top-TOP_LIMIT for one JD. With a compact profile the first-pass
+    leaders (TOP_LIMIT + RESCORE_MARGIN) are rescored on full vectors first.
+    """
+    if not source.needs_rescore or jd_info["vector"] is None:
+        return rank_matches(matches)
+    shortlist = rank_matches(matches, source.shortlist_limit())
+    resume_ids = [m["resumeId"] for m in shortlist]
+    matrix, _ = source.exact_matrix(resume_ids, jd_info["vector"].shape[0])
+    for m, score in zip(shortlist, cosine_similarities(matrix, jd_info["vector"])):
+        m["similarityScore"] = float(score)
+    print(f"↻ Rescored {len(shortlist)} shortlisted resumes on full vectors")
+    return rank_matches(shortlist)
+
+def match_single_jd(resumes_col, jd_info, vocab, source=None):
+    """Full resumes scan for one JD."""
+    print(f"Fetching resumes for JD {jd_info['jobId']} …")
+    return match_pending_batch(resumes_col, [jd_info], vocab, source)[0]
+
+def stage_one_limit(source):
+    """
+    Candidates per JD that survive the cheap ranking (None → keep all).
+    Stage two adds experience matches but ranks on the same (count, score)
+    key, so only the leaders the final cut can reach are kept: TOP_LIMIT,
+    or the rescore shortlist when a compact profile is rescored.
+    """
+    return source.shortlist_limit() if STAGED_RANKING else None
+
+class Candidate:
+    """
+    Stage-one record: the ranking key plus the projected resume for stage
+    two, without its vector (ResumeEmbeddings.release_vectors), so a heap
+    costs a few KB per leader whatever the vector layout. Ordered like
+    rank_matches – more common keys, then higher similarity, then earlier
+    in the scan – so `a < b` means a ranks lower.
+    """
+    __slots__ = ("count", "score", "seq", "resume")
+
+    def __init__(self, count, score, seq, resume):
+        self.count  = count
+        self.score  = score
+        self.seq    = seq
+        self.resume = resume
+
+    def __lt__(self, other):
+        return (self.count, self.score, other.seq) < (other.count, other.score, self.seq)
+
+class TopK:
+    """Bounded min-heap of the best `limit` candidates (limit None → keep all)."""
+    __slots__ = ("limit", "heap")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.heap  = []
+
+    def push(self, candidate):
+        if self.limit is None:
+            self.heap.append(candidate)
+        elif len(self.heap) < self.limit:
+            heapq.heappush(self.heap, candidate)
+        elif self.heap[0] < candidate:
+            heapq.heapreplace(self.heap, candidate)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def ranked(self):
+        return sorted(self.heap, reverse=True)
+
+def score_resume_chunk(source, chunk, offset, jd_infos, jd_groups, per_jd, vocab, stats):
+    """
+    Stage one for a chunk of resumes against every pending JD: keyword
+    overlap counts for all pairs from the resumes' term-id CSR against the
+    JD indicator matrix, similarity with one matrix-matrix product per
+    embedding dimension. Keyword-qualified pairs go into each JD's TopK heap
+    as Candidate records; `offset` is the chunk's position in the scan.
+    """
+    t0 = time.perf_counter()
+    overlap = KeywordOverlap([resume_term_ids(r, vocab) for r in chunk],
+                             [jd_info["termIds"] for jd_info in jd_infos], vocab.size)
+
+    sims = {}
+    for dim, jd_idx in jd_groups.items():
+        matrix, _ = source.chunk_matrix(chunk, dim)
+        queries   = np.stack([source.query_vector(jd_infos[j]) for j in jd_idx])
+        sims[dim] = (jd_idx, cosine_similarity_matrix(matrix, queries))
+    source.release_vectors(chunk)
+
+    for j, jd_info in enumerate(jd_infos):
+        vector = source.query_vector(jd_info)
+        if vector is not None:
+            jd_idx, table = sims[vector.shape[0]]
+            col = jd_idx.index(j)
+        candidates = jd_info["candidates"]
+        counts = overlap.counts[:, j]
+        for i in np.flatnonzero(counts):
+            resume = chunk[i]
+            if candidates is not None and resume.get("resumeId") not in candidates:
+                continue
+            score = float(table[i, col]) if vector is not None else 0.0
+            per_jd[j].push(Candidate(int(counts[i]), score, offset + i, resume))
+            stats["stage1"] += 1
+    stats["stage1Seconds"] += time.perf_counter() - t0
+
+def materialize_matches(jd_info, leaders, vocab):
+    """Stage two: matched terms, experience matching and the match record for the leaders."""
+    labels = jd_info["termLabels"]
+    matches = []
+    for leader in leaders:
+        resume = leader.resume
+        ids = np.intersect1d(resume_term_ids(resume, vocab), jd_info["termIds"], assume_unique=True)
+        common_keys = [labels[t] for t in ids.tolist()]
+        common_experiences = match_titles(normalize_experiences(resume.get("jobExperiences")),
+                                          jd_info["experiences"], jd_info["titleIndex"])
+        m = build_match(resume, common_keys, common_experiences)
+        m["similarityScore"] = leader.score
+        matches.append(m)
+    return matches
+
+def match_pending_batch(resumes_col, jd_infos, vocab, source=None, stats=None):
+    """
+    Stream the resumes collection once and keep a separate top-TOP_LIMIT
+    list per JD. Returns one ranked match list per entry of `jd_infos`;
+    per-stage candidate counts and timings are added to `stats` if given.
+    """
+    source = source or ResumeEmbeddings(resumes_col)
+    stats = stats if stats is not None else {}
+    for key in ("stage1", "stage1Seconds", "stage2", "stage2Seconds"):
+        stats.setdefault(key, 0)
+    jd_groups = {}
+    for j, jd_info in enumerate(jd_infos):
+        vector = source.query_vector(jd_info)
+        if vector is not None:
+            jd_groups.setdefault(vector.shape[0], []).append(j)
+
+    # With the ANN index on, fetch only the union of the JDs' candidates
+    restrict = None
+    if all(jd_info["candidates"] is not None for jd_info in jd_infos):
+        restrict = set().union(*(jd_info["candidates"] for jd_info in jd_infos))
+
+    # Server-side keyword prefilter: only resumes sharing a term with some JD
+    terms = None
+    if KEYWORD_PREFILTER:
+        terms = sorted(set().union(*(jd_info["terms"] for jd_info in jd_infos)))
+
+    per_jd = [TopK(stage_one_limit(source)) for _ in jd_infos]
+    chunk = []
+    scanned = 0
+    seen_ids = set()
+    print(f"Fetching resumes once for {len(jd_infos)} JDs …")
+    for resume in source.scan(restrict, terms):
+        seen_ids.add(resume.get("resumeId"))
+        chunk.append(resume)
+        if len(chunk) >= SCORE_CHUNK_SIZE:
+            score_resume_chunk(source, chunk, scanned, jd_infos, jd_groups, per_jd, vocab, stats)
+            scanned += len(chunk)
+            chunk = []
+    if chunk:
+        score_resume_chunk(source, chunk, scanned, jd_infos, jd_groups, per_jd, vocab, stats)
+    print(f"✓ Scanned {len(seen_ids)} candidate resumes")
+    # Snapshot pruning needs every live resumeId, i.e. an unfiltered scan
+    # (KEYWORD_PREFILTER off); otherwise open_snapshot's periodic
+    # retain_from() and the ingest path's remove() handle deletes.
+    if restrict is None and terms is None:
+        source.finish_scan(seen_ids)
+
+    t0 = time.perf_counter()
+    results = []
+    for jd_info, heap in zip(jd_infos, per_jd):
+        leaders = heap.ranked()
+        stats["stage2"] += len(leaders)
+        results.append(finalize_matches(source, jd_info, materialize_matches(jd_info, leaders, vocab)))
+    stats["stage2Seconds"] += time.perf_counter() - t0
+
+    print(f"» Stage 1: {stats['stage1']} keyword-qualified candidates ranked "
+          f"in {stats['stage1Seconds']:.2f}s")
+    print(f"» Stage 2: {stats['stage2']} leaders matched on experience "
+          f"in {stats['stage2Seconds']:.2f}s")
+    return results
+
+def reverse_index_op(jd_id, resume_id, info, today):
+    """
+    Idempotent upsert appending `info` to a resume's `matches` unless the
+    jobId is already there. The absence check lives in the update pipeline,
+    not the filter: a `matches.jobId: {$ne: …}` filter with upsert would
+    insert a second document for resumes that already have the job.
+    """
+    present = {"$in": [{"$literal": jd_id}, {"$ifNull": ["$matches.jobId", []]}]}
+    return UpdateOne({"resumeId": resume_id}, [{"$set": {
+        "matches"    : {"$cond": [present, "$matches",
+                                  {"$concatArrays": [{"$ifNull": ["$matches", []]},
+                                                     [{"$literal": info}]]}]},
+        "lastUpdated": {"$cond": [present, "$lastUpdated", today]},
+    }}], upsert=True)
+
+def store_jd_matches(jd_col, store, resume_matches_col, jd_info, matches):
+    """
+    Write one JD's results: `matches`, the resume_matches reverse index as
+    one unordered bulk_write, and `processingState` last, so a JD that fails
+    midway stays pending and the idempotent rerun cannot duplicate entries.
+    """
+    jd_id = jd_info["jobId"]
+    stats = {"jobId": jd_id, "ops": len(matches), "pushed": 0, "upserted": 0}
+
+    # Store in `matches` / `job_matches` (per MATCH_STORE)
+    t0 = time.perf_counter()
+    store.replace_job(jd_id, matches)
+    stats["matchesMs"] = (time.perf_counter() - t0) * 1000
+
+    # Update per-resume reverse index
+    t0 = time.perf_counter()
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    ops = [reverse_index_op(jd_id, m["resumeId"], {
+               "jobId"           : jd_id,
+               "jobDescription"  : jd_info["jobDescription"],
+               "commonKeys"      : m["commonKeys"],
+               "similarityScore" : m["similarityScore"],
+               "commonExperiences": m["commonExperiences"]
+           }, today) for m in matches]
+    if ops:
+        result = resume_matches_col.bulk_write(ops, ordered=False)
+        stats["upserted"] = result.upserted_count
+        stats["pushed"]   = result.modified_count + result.upserted_count
+    stats["reverseIndexMs"] = (time.perf_counter() - t0) * 1000
+
+    # Mark JD processed
+    t0 = time.perf_counter()
+    jd_col.update_one({"jobId": jd_id},
+                      {"$set": {"processingState": "completed"}},
+                      upsert=True)
+    stats["stateMs"] = (time.perf_counter() - t0) * 1000
+
+    print(f"↪  resume_matches: {stats['pushed']} pushed ({stats['upserted']} new resumes), "
+          f"{stats['ops'] - stats['pushed']} already present | "
+          f"matches {stats['matchesMs']:.0f} ms, reverse index {stats['reverseIndexMs']:.0f} ms, "
+          f"state {stats['stateMs']:.0f} ms\n")
+    return stats
+
 def lambda_handler(event, context):
-    client = MongoClient(host=host, port=port,
-                         username=username, password=password,
-                         authSource=auth_db)
+    client = get_mongo_client()
     try:
         db   = client[db_name]
+        check_once(db, "resumes", "job_description", "matches", "resume_matches", "job_matches")
         resumes_col        = db["resumes"]
         jd_col             = db["job_description"]
-        matches_col        = db["matches"]
+        store              = MatchStore(db)
         resume_matches_col = db["resume_matches"]
 
-        print("Fetching JDs with processingState = 'pending' …")
-        for jd in jd_col.find({"processingState": "pending"}):
-            jd_id   = jd.get("jobId")
-            if not jd_id:
-                print("» Skipping JD without jobId")
-                continue
-            print(f"▶ Processing JD {jd_id}")
+        batch_mode = BATCH_MODE
+        if isinstance(event, dict) and "batchMode" in event:
+            batch_mode = bool(event["batchMode"])
 
-            jd_keywords     = jd.get("structured_query", {}).get("keywords") or []
-            jd_embedding    = jd.get("embedding") or []
-            jd_experiences  = jd.get("structured_query", {}).get("jobExperiences") or []
+        vocab = KeywordVocabulary.load(db)
+        ann = ResumeAnnIndex.open()
+        if ann is not None:
+            print(f"» ANN index: {len(ann)} resumes, top {ANN_CANDIDATES} per JD")
 
-            if not isinstance(jd_keywords, list) or not isinstance(jd_embedding, list):
-                print("» Malformed JD, skipping.")
-                continue
-
-            matches = []
-            print("Fetching resumes …")
-            for resume in resumes_col.find():
-                # --- Safe normalisation (fixes the crash) ------------------
-                resume_keywords = resume.get("keywords") or []
-                if not isinstance(resume_keywords, list):
-                    resume_keywords = []
-
-                raw_skills   = resume.get("skills") or []
-                resume_skills = [s.get("skillName") for s in raw_skills if isinstance(s, dict) and s.get("skillName")]
-                combined_tokens = resume_keywords + resume_skills
-                # -----------------------------------------------------------
-
-                if not combined_tokens:
-                    continue
-
-                common_keys = get_common_keywords(jd_keywords, combined_tokens)
-                if not common_keys:
+        print("Fetching JDs with processingState = 'pending' …")
+        if batch_mode:
+            jd_infos = [info for info in (prepare_jd(jd, vocab)
+                                          for jd in jd_col.find({"processingState": "pending"}))
+                        if info is not None]
+            for jd_info in jd_infos:
+                jd_info["candidates"] = ann_candidates(ann, jd_info)
+            if jd_infos:
+                source = ResumeEmbeddings.open(resumes_col)
+                all_matches = match_pending_batch(resumes_col, jd_infos, vocab, source)
+                for jd_info, matches in zip(jd_infos, all_matches):
+                    print(f"▶ Storing {len(matches)} matches for JD {jd_info['jobId']}")
+                    store_jd_matches(jd_col, store, resume_matches_col, jd_info, matches)
+        else:
+            source = ResumeEmbeddings.open(resumes_col)
+            for jd in jd_col.find({"processingState": "pending"}):
+                jd_info = prepare_jd(jd, vocab)
+                if jd_info is None:
                     continue
-
-                resume_exps        = resume.get("jobExperiences") or []
-                common_experiences = get_common_experiences(resume_exps, jd_experiences)
-
-                sim_score = 0.0
-                resume_emb = resume.get("embedding") or []
-                if isinstance(resume_emb, list) and len(resume_emb) == len(jd_embedding):
-                    sim_score = calculate_cosine_similarity(resume_emb, jd_embedding)
-
-                matches.append({
-                    "resumeId"       : resume.get("resumeId"),
-                    "name"           : resume.get("name"),
-                    "email"          : resume.get("email"),
-                    "contactNo"      : resume.get("contactNo"),
-                    "address"        : resume.get("address"),
-                    "city"           : resume.get("city"),
-                    "state"          : resume.get("state"),
-                    "country"        : resume.get("country"),
-                    "createdOn"      : resume.get("createdOn"),
-                    "ownedBy"        : resume.get("ownedBy"),
-                    "noticePeriod"   : resume.get("noticePeriod"),
-                    "expectedCTC"    : resume.get("expectedCTC"),
-                    "totalExperience": resume.get("totalExperience"),
-                    "commonKeys"     : common_keys,
-                    "similarityScore": sim_score,
-                    "commonExperiences": common_experiences
-                })
-
-            print(f"✓ Found {len(matches)} potential matches")
-            matches = sorted(
-                matches,
-                key=lambda x: (len(x["commonKeys"]), x["similarityScore"]),
-                reverse=True
-            )[:TOP_LIMIT]
-
-            # Store in `matches`
-            matches_col.update_one(
-                {"jobId": jd_id},
-                {"$set": {"matches": matches}},
-                upsert=True
-            )
-            # Mark JD processed
-            jd_col.update_one({"jobId": jd_id},
-                              {"$set": {"processingState": "completed"}},
-                              upsert=True)
-
-            # Update per-resume reverse index
-            updated = 0
-            for m in matches:
-                resume_id = m["resumeId"]
-                info = {
-                    "jobId"           : jd_id,
-                    "jobDescription"  : jd.get("jobDescription", ""),
-                    "commonKeys"      : m["commonKeys"],
-                    "similarityScore" : m["similarityScore"],
-                    "commonExperiences": m["commonExperiences"]
-                }
-
-                already = resume_matches_col.find_one(
-                    {"resumeId": resume_id, "matches.jobId": jd_id}
-                )
-                if not already:
-                    resume_matches_col.update_one(
-                        {"resumeId": resume_id},
-                        {
-                            "$push": {"matches": info},
-                            "$set" : {"lastUpdated": datetime.utcnow().strftime("%Y-%m-%d")}
-                        },
-                        upsert=True
-                    )
-                    updated += 1
-            print(f"↪  Updated resume_matches for {updated} resumes\n")
+                jd_info["candidates"] = ann_candidates(ann, jd_info)
+                print(f"▶ Processing JD {jd_info['jobId']}")
+                matches = match_single_jd(resumes_col, jd_info, vocab, source)
+                store_jd_matches(jd_col, store, resume_matches_col, jd_info, matches)
 
         print("All pending JDs processed successfully")
         return {"statusCode": 200,
@@ -178,5 +524,3 @@ def lambda_handler(event, context):
         print("Error:", e)
         return {"statusCode": 500,
                 "body": str(e)}
-    finally:
-        client.close()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+indexcatalog.py - Every index the handlers rely on, in one place
+────────────────────────────────────────────────────────────────────────────
+INDEXES maps collection → [(keys, options)]. Modules that own a collection
+layout (matchstore, searchfields, keywordvocab, scorecache) keep their own lists and
+are folded in here, so this is the single answer to "what should exist".
+
+Indexes are created at deploy time, never on the request path:
+
+    python indexcatalog.py verify      # exit 1 if anything is missing
+    python indexcatalog.py apply       # idempotent create_index for all
+
+Handlers call check_once(db, …) on their first invocation per container;
+it lists the collections' indexes and prints what is missing or differs,
+but creates nothing.
+"""
+
+import argparse
+import sys
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from keywordvocab import TERMS_FIELD, VOCAB_COLLECTION
+from matchstore import INDEXES as MATCH_INDEXES, MATCH_COLLECTION
+from scorecache import CACHE_COLLECTION, INDEXES as SCORE_CACHE_INDEXES
+from searchfields import RESUME_INDEXES
+
+UNIQUE = {"unique": True}
+
+INDEXES = {
+    "resumes": [
+        ([("resumeId", ASCENDING)], UNIQUE),                 # insert dedupe, point reads, $in
+        ([(TERMS_FIELD, ASCENDING)], {}),                    # matcher prefilter, chat skills
+        ([("jobExperiences.title", ASCENDING)], {}),         # chat job titles
+    ] + [(keys, {}) for keys in RESUME_INDEXES],
+    "resume_text": [
+        ([("resumeId", ASCENDING)], UNIQUE),
+    ],
+    "job_description": [
+        ([("jobId", ASCENDING)], UNIQUE),                    # insert dedupe, point reads
+        ([("processingState", ASCENDING)], {}),              # pending scan
+    ],
+    "matches": [
+        ([("jobId", ASCENDING)], UNIQUE),                    # one document per job
+        ([("matches.resumeId", ASCENDING)], {}),             # resume delete $pull, pair reads
+    ],
+    "resume_matches": [
+        ([("resumeId", ASCENDING)], UNIQUE),                 # one document per resume
+        ([("matches.jobId", ASCENDING)], {}),                # JD delete $pull
+    ],
+    MATCH_COLLECTION: MATCH_INDEXES,
+    CACHE_COLLECTION: SCORE_CACHE_INDEXES,                   # TTL; lookups are by _id
+    VOCAB_COLLECTION: [
+        ([("term", ASCENDING)], UNIQUE),
+    ],
+}
+
+_checked = set()
+
+
+def key_spec(keys):
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+def verify(db, collections=None):
+    """
+    Compare the catalogue with the server. Returns {collection: [problem, …]}
+    with only collections that have problems.
+    """
+    problems = {}
+    for name in collections or INDEXES:
+        try:
+            existing = {key_spec(info["key"]): info for info in db[name].index_information().values()}
+        except OperationFailure:
+            existing = {}                      # collection does not exist yet
+        for keys, options in INDEXES[name]:
+            info = existing.get(key_spec(keys))
+            label = ", ".join(f"{f}:{d}" for f, d in key_spec(keys))
+            if info is None:
+                problems.setdefault(name, []).append(f"missing {{{label}}}{' unique' if options.get('unique') else ''}")
+            elif bool(info.get("unique")) != bool(options.get("unique")):
+                problems.setdefault(name, []).append(f"{{{label}}} exists but unique={bool(info.get('unique'))}")
+    return problems
+
+
+def apply(db, collections=None):
+    """Create every catalogued index (no-op for ones that already exist)."""
+    for name in collections or INDEXES:
+        for keys, options in INDEXES[name]:
+            db[name].create_index(keys, **options)
+
+
+def check_once(db, *collections):
+    """Report (never create) missing indexes, once per collection per process."""
+    pending = [c for c in collections if (db.name, c) not in _checked]
+    if not pending:
+        return
+    _checked.update((db.name, c) for c in pending)
+    try:
+        problems = verify(db, pending)
+    except Exception as e:                     # never fail a request over this
+        print(f"! Index check skipped: {e}")
+        return
+    for name, issues in problems.items():
+        for issue in issues:
+            print(f"! Index check: {name} {issue} – run `python indexcatalog.py apply`")
+
+
+if __name__ == "__main__":
+    from mongoconn import db_name, new_client
+    parser = argparse.ArgumentParser(description="Index catalogue")
+    parser.add_argument("command", choices=["apply", "verify"])
+    parser.add_argument("collections", nargs="*", help="limit to these collections")
+    args = parser.parse_args()
+    client = new_client()
+    try:
+        db = client[db_name]
+        if args.command == "apply":
+            apply(db, args.collections)
+        problems = verify(db, args.collections)
+        for name, issues in problems.items():
+            for issue in issues:
+                print(f"✗ {name}: {issue}")
+        if problems:
+            sys.exit(1)
+        print(f"✓ {sum(len(INDEXES[c]) for c in args.collections or INDEXES)} indexes present")
+    finally:
+        client.close()
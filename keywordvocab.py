@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+keywordvocab.py - Shared keyword vocabulary and sparse overlap counting
+────────────────────────────────────────────────────────────────────────────
+Keywords and skill names are normalised (trimmed, lower-cased, inner
+whitespace collapsed) and mapped to stable integer ids. The mapping lives in
+the `keyword_vocabulary` collection ({_id: id, term}) and only ever grows,
+so ids stored on documents never go stale.
+
+Each resume stores its term set twice:
+    keywordIds     sorted, de-duplicated little-endian int32 array packed in
+                   a BSON Binary – a chunk of resumes is then a CSR matrix
+                   (indptr, indices) and its overlap with one or many JDs is
+                   a gather from a JD indicator matrix plus a segmented sum
+    keywordTerms   the normalised strings, multikey-indexed so the matcher
+                   can prefilter server-side with `$in`
+
+Backfill both for existing resumes (and build the index) with:
+
+    python keywordvocab.py backfill
+"""
+
+import argparse
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from searchfields import RESUME_SEARCH_FIELDS
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+VOCAB_COLLECTION   = "keyword_vocabulary"
+COUNTER_COLLECTION = "counters"
+COUNTER_ID         = "keywordId"
+TERM_IDS_FIELD     = "keywordIds"
+TERMS_FIELD        = "keywordTerms"
+BACKFILL_BATCH     = 500
+# ───────────────────────────────────────────────────────────────────────
+
+SUBTYPE_TERM_IDS = 0x90       # user-defined BSON binary subtype: <i4 sorted ids
+
+# Resume reads that end in json.dumps (API payloads, prompts): keywordIds is
+# a BSON Binary, keywordTerms only duplicates keywords / skill names, and the
+# search fields are ingest-time derivations of country / createdOn
+RESUME_PAYLOAD_PROJECTION = {"_id": 0, "embedding": 0, "embeddingCompact": 0,
+                             TERM_IDS_FIELD: 0, TERMS_FIELD: 0,
+                             **dict.fromkeys(RESUME_SEARCH_FIELDS, 0)}
+EMPTY_IDS = np.zeros(0, dtype=np.int32)
+
+_vocabularies = {}            # db name → KeywordVocabulary, kept across warm invocations
+
+
+def normalize_term(term):
+    """Canonical form of a keyword/skill name (None if not a usable string)."""
+    if not isinstance(term, str):
+        return None
+    term = " ".join(term.split()).lower()
+    return term or None
+
+
+def normalize_terms(terms):
+    """Sorted unique normalised terms (accepts a bare string)."""
+    if isinstance(terms, str):
+        terms = [terms]
+    out = {normalize_term(t) for t in terms}
+    out.discard(None)
+    return sorted(out)
+
+
+def resume_terms(resume):
+    """Raw keyword + skill-name strings of a resume, tolerant of bad fields."""
+    keywords = resume.get("keywords") or []
+    if not isinstance(keywords, list):
+        keywords = []
+    skills = resume.get("skills") or []
+    if not isinstance(skills, list):
+        skills = []
+    return keywords + [s.get("skillName") for s in skills if isinstance(s, dict) and s.get("skillName")]
+
+
+def encode_term_ids(ids):
+    return Binary(np.asarray(ids, dtype="<i4").tobytes(), SUBTYPE_TERM_IDS)
+
+
+def decode_term_ids(value):
+    """Sorted int32 array from a stored `keywordIds` (None if absent/foreign)."""
+    if isinstance(value, Binary) and value.subtype == SUBTYPE_TERM_IDS and len(value) % 4 == 0:
+        return np.frombuffer(value, dtype="<i4")
+    return None
+
+
+def resume_term_ids(resume, vocab):
+    """Precomputed `keywordIds`, or a lookup for resumes not backfilled yet."""
+    ids = decode_term_ids(resume.get(TERM_IDS_FIELD))
+    return ids if ids is not None else vocab.lookup(resume_terms(resume))
+
+
+class KeywordVocabulary:
+    """In-process view of `keyword_vocabulary`, kept across warm invocations."""
+
+    def __init__(self, collection=None, counters=None):
+        self.collection = collection
+        self.counters = counters
+        self.ids = {}             # term → id
+        self.max_id = -1
+
+    @classmethod
+    def load(cls, db):
+        """Vocabulary for `db`, refreshed with the terms added since last time."""
+        vocab = _vocabularies.get(db.name)
+        if vocab is None:
+            vocab = _vocabularies[db.name] = cls(db[VOCAB_COLLECTION], db[COUNTER_COLLECTION])
+        vocab.refresh()
+        return vocab
+
+    def refresh(self):
+        """
+        Catch up with the collection. Ids are reserved from the counter before
+        the terms are inserted, so a lower id can land after a higher one has
+        been read: when the `_id > max_id` delta does not account for every
+        document, the whole vocabulary is re-read.
+        """
+        if self.collection is None:
+            return
+        count = self.collection.estimated_document_count()
+        if count == len(self.ids):
+            return
+        for doc in self.collection.find({"_id": {"$gt": self.max_id}}):
+            self._remember(doc["term"], doc["_id"])
+        if len(self.ids) < count:
+            for doc in self.collection.find({}):
+                self._remember(doc["term"], doc["_id"])
+
+    def _remember(self, term, term_id):
+        self.ids[term] = term_id
+        self.max_id = max(self.max_id, term_id)
+
+    @property
+    def size(self):
+        return self.max_id + 1
+
+    def lookup(self, terms):
+        """Sorted unique ids of the known terms among `terms` (unknown ones dropped)."""
+        ids = {self.ids.get(normalize_term(t)) for t in terms}
+        ids.discard(None)
+        return np.array(sorted(ids), dtype=np.int32) if ids else EMPTY_IDS
+
+    def ensure(self, terms):
+        """Sorted unique ids for `terms`, registering unseen terms in Mongo."""
+        normalized = {normalize_term(t) for t in terms}
+        normalized.discard(None)
+        new = sorted(t for t in normalized if t not in self.ids)
+        if new:
+            self._register(new)
+        return np.array(sorted(self.ids[t] for t in normalized), dtype=np.int32) \
+            if normalized else EMPTY_IDS
+
+    def _register(self, terms):
+        if self.collection is None:           # in-memory only (benchmarks/tests)
+            for t in terms:
+                self._remember(t, self.max_id + 1)
+            return
+        counter = self.counters.find_one_and_update(
+            {"_id": COUNTER_ID}, {"$inc": {"seq": len(terms)}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        first = counter["seq"] - len(terms)
+        for offset, term in enumerate(terms):
+            try:
+                self.collection.insert_one({"_id": first + offset, "term": term})
+                self._remember(term, first + offset)
+            except DuplicateKeyError:
+                # Another writer registered the term first; its id wins
+                doc = self.collection.find_one({"term": term})
+                if doc is not None:
+                    self._remember(term, doc["_id"])
+
+    def labelled(self, terms):
+        """
+        (sorted ids, {id: original spelling}) for a JD keyword list; the
+        first spelling of each normalised term is reported back in matches.
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+        ids = self.ensure(terms)
+        labels = {}
+        for t in terms:
+            term_id = self.ids.get(normalize_term(t))
+            if term_id is not None and term_id not in labels:
+                labels[term_id] = t
+        return ids, labels
+
+
+def build_csr(id_arrays):
+    """(indptr, indices) for a list of sorted id arrays."""
+    lengths = np.fromiter((a.shape[0] for a in id_arrays), dtype=np.int64, count=len(id_arrays))
+    indptr = np.zeros(len(id_arrays) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate(id_arrays) if id_arrays else EMPTY_IDS
+    return indptr, indices.astype(np.int64, copy=False)
+
+
+def indicator_matrix(id_arrays, vocab_size):
+    """(vocab_size, len(id_arrays)) bool matrix; column j marks the ids of array j."""
+    mask = np.zeros((vocab_size, len(id_arrays)), dtype=bool)
+    for j, ids in enumerate(id_arrays):
+        mask[ids[ids < vocab_size], j] = True
+    return mask
+
+
+class KeywordOverlap:
+    """
+    Overlap of many row term-sets (CSR) against many column term-sets:
+    `counts[i, j]` is |row_i ∩ col_j| and `matched(i, j)` lists the ids.
+    """
+
+    def __init__(self, row_arrays, col_arrays, vocab_size):
+        self.indptr, self.indices = build_csr(row_arrays)
+        size = max(vocab_size, int(self.indices.max()) + 1 if self.indices.size else 0)
+        mask = indicator_matrix(col_arrays, size)
+        self.hits = mask[self.indices]                       # (nnz, n_cols)
+        # Segmented row sums via a running total sampled at the row bounds
+        running = np.zeros((self.hits.shape[0] + 1, len(col_arrays)), dtype=np.int64)
+        np.cumsum(self.hits, axis=0, out=running[1:])
+        self.counts = np.diff(running[self.indptr], axis=0)
+
+    def matched(self, i, j):
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.indices[lo:hi][self.hits[lo:hi, j]]
+
+
+def term_fields(resume, vocab):
+    """`keywordIds` + `keywordTerms` for a resume document (ingest / backfill)."""
+    terms = resume_terms(resume)
+    return {TERM_IDS_FIELD: encode_term_ids(vocab.ensure(terms)),
+            TERMS_FIELD   : normalize_terms(terms)}
+
+
+def backfill(db, batch_size=BACKFILL_BATCH):
+    """Write the term fields on every resume that does not have them yet."""
+    vocab = KeywordVocabulary.load(db)
+    resumes = db["resumes"]
+    query = {"$or": [{TERM_IDS_FIELD: {"$exists": False}}, {TERMS_FIELD: {"$exists": False}}]}
+    projection = {"keywords": 1, "skills": 1}
+    updated = 0
+    last_id = None
+    while True:
+        q = dict(query)
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        batch = list(resumes.find(q, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": term_fields(doc, vocab)}) for doc in batch]
+        updated += resumes.bulk_write(ops, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+        print(f"  resumes: {updated} term sets written, vocabulary {len(vocab.ids)} terms")
+    return updated
+
+
+if __name__ == "__main__":
+    from mongoconn import db_name, new_client
+    from indexcatalog import apply as apply_indexes
+    parser = argparse.ArgumentParser(description="Keyword vocabulary maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+    client = new_client()
+    try:
+        db = client[db_name]
+        apply_indexes(db, [VOCAB_COLLECTION, "resumes"])
+        print(f"✓ {backfill(db, args.batch_size)} resumes backfilled")
+    finally:
+        client.close()
@@ -0,0 +1,176 @@
+"""
+llmbatch.py - Rate-limited asyncio fan-out for AI scoring
+────────────────────────────────────────────────────────────────────────────
+Scoring used to fan out through a ThreadPoolExecutor fixed at
+PARALLEL_WORKERS = 4, far below the provider quota and blind to its
+requests-per-minute and tokens-per-minute limits. score_batches() runs
+every batch on one event loop instead:
+
+    async def call_openai(jd_text, batch, deadline=None):
+        resp = await request("chat/completions", payload, deadline)
+        …
+        return {resumeId: score, …}
+
+    report = score_batches(call_openai, jd_text, batches, deadline)
+    report.scores       # merged results of the calls that finished
+    report.errors       # exceptions raised by calls (they are not retried here)
+    report.unfinished   # calls still running when the deadline passed
+
+At most MAX_CONCURRENCY calls are in flight. Before sending, request()
+reserves one request and the payload's estimated tokens (prompt characters
+/ CHARS_PER_TOKEN + COMPLETION_TOKENS) from two token buckets refilled at
+RPM_LIMIT and TPM_LIMIT per minute, waiting if either is short. Once the
+response arrives, the reservation is corrected to the reported usage. The
+buckets are process-wide, so limits hold across warm invocations.
+
+The HTTP call itself is llmclient.post (keep-alive session, retries,
+hedging), run on a dedicated thread pool the loop awaits. Every run prints
+a throughput line: calls, wall time, req/s, tokens/min and time spent
+waiting on the limiter.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from llmclient import POOL_SIZE, Deadline, DeadlineExceeded, post
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+MAX_CONCURRENCY   = int(os.environ.get("LLM_MAX_CONCURRENCY", POOL_SIZE))
+RPM_LIMIT         = int(os.environ.get("LLM_RPM", 500))
+TPM_LIMIT         = int(os.environ.get("LLM_TPM", 30_000))
+CHARS_PER_TOKEN   = 4            # prompt-size estimate before the call
+COMPLETION_TOKENS = 400          # reserved for the answer until usage is known
+# ───────────────────────────────────────────────────────────────────────
+
+
+class TokenBucket:
+    """
+    Reservation-style bucket: take() always succeeds, may drive the level
+    negative, and returns how long the caller must wait. Only the event
+    loop thread touches it, so it needs no lock.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ScoreReport:
+    def __init__(self, batches):
+        self.batches = batches
+        self.scores = {}
+        self.errors = []
+        self.unfinished = 0
+        self.calls = 0
+        self.tokens = 0
+        self.limiter_wait_s = 0.0
+        self.call_s = 0.0           # summed time in llmclient.post
+        self.elapsed_s = 0.0
+
+    def summary(self):
+        minutes = max(self.elapsed_s, 1e-9) / 60
+        return (f"{self.batches - len(self.errors) - self.unfinished}/{self.batches} batches in "
+                f"{self.elapsed_s:.2f} s – {self.calls / max(self.elapsed_s, 1e-9):.1f} req/s, "
+                f"{self.tokens / minutes:,.0f} tok/min, {self.limiter_wait_s:.2f} s summed limiter wait "
+                f"(≤{MAX_CONCURRENCY} in flight, {RPM_LIMIT} RPM, {TPM_LIMIT:,} TPM)"
+                + (f", {len(self.errors)} failed" if self.errors else "")
+                + (f", {self.unfinished} unfinished at deadline" if self.unfinished else ""))
+
+
+_rpm = TokenBucket(RPM_LIMIT)
+_tpm = TokenBucket(TPM_LIMIT)
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="llm")
+_report = contextvars.ContextVar("llmbatch_report", default=None)
+
+
+def estimate_tokens(payload):
+    chars = sum(len(m.get("content") or "") for m in payload.get("messages", []))
+    return chars // CHARS_PER_TOKEN + payload.get("max_tokens", COMPLETION_TOKENS)
+
+
+async def request(endpoint, payload, deadline=None):
+    """Rate-limited llmclient.post; returns the Response."""
+    deadline = deadline or Deadline()
+    report = _report.get()
+    estimate = estimate_tokens(payload)
+    wait = max(_rpm.take(1), _tpm.take(estimate))
+    left = deadline.remaining()
+    if left is not None and wait >= left:
+        _rpm.give_back(1)
+        _tpm.give_back(estimate)
+        raise DeadlineExceeded(f"rate limit wait {wait:.1f}s exceeds the deadline" if left
+                               else "request deadline exhausted")
+    if wait:
+        await asyncio.sleep(wait)
+    t0 = time.perf_counter()
+    resp = await asyncio.get_running_loop().run_in_executor(
+        _executor, partial(post, endpoint, payload, deadline=deadline))
+    call_s = time.perf_counter() - t0
+    try:
+        used = resp.json().get("usage", {}).get("total_tokens")
+    except ValueError:
+        used = None
+    if used is not None:
+        _tpm.give_back(estimate - used)             # negative when we under-reserved
+    if report is not None:
+        report.calls += 1
+        report.tokens += used if used is not None else estimate
+        report.limiter_wait_s += wait
+        report.call_s += call_s
+    return resp
+
+
+async def _score(call, jd_text, batches, deadline, report):
+    gate = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def one(batch):
+        async with gate:
+            return await call(jd_text, batch, deadline)
+
+    tasks = [asyncio.ensure_future(one(b)) for b in batches]
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks, timeout=deadline.remaining())
+    for task in pending:
+        task.cancel()
+    for task in done:
+        if task.exception() is not None:
+            report.errors.append(task.exception())
+        else:
+            report.scores.update(task.result() or {})
+    report.unfinished = len(pending)
+
+
+def score_batches(call, jd_text, batches, deadline=None, label="aiScore"):
+    """Run `await call(jd_text, batch, deadline)` for every batch on one event loop."""
+    deadline = deadline or Deadline()
+    report = ScoreReport(len(batches))
+    token = _report.set(report)
+    t0 = time.perf_counter()
+    try:
+        asyncio.run(_score(call, jd_text, batches, deadline, report))
+    finally:
+        _report.reset(token)
+    report.elapsed_s = time.perf_counter() - t0
+    print(f"» {label}: {report.summary()}")
+    return report
@@ -0,0 +1,221 @@
+"""
+llmclient.py - Shared keep-alive HTTP session for OpenAI calls
+────────────────────────────────────────────────────────────────────────────
+Every embedding and chat-completion call used a bare `requests.post`, so
+each one opened (and threw away) its own TLS connection, and the parallel
+aiScore workers paid that handshake once per resume. post() sends through
+one process-wide requests.Session: connections are kept alive in a pool of
+POOL_SIZE per host, reused across warm Lambda invocations and shared by
+threads (the adapter's pool is thread-safe).
+
+    from llmclient import post
+    resp = post("chat/completions", payload)      # requests.Response
+
+Each endpoint has its own (connect, read) timeout, so a hung embedding
+call no longer blocks a handler until the Lambda itself times out.
+
+Tail latency (one slow or throttled call used to set the whole response
+time, and a 429 silently dropped that candidate's score):
+    Deadline      a request budget, normally Deadline.from_context(context):
+                  the Lambda's remaining time less DEADLINE_RESERVE_S for the
+                  writes and response. Every attempt's timeout is clipped to
+                  it and DeadlineExceeded is raised once it is spent, so
+                  handlers can stop waiting and return partial results.
+    retries       429 / 5xx / connection errors are retried up to MAX_RETRIES
+                  times with full-jitter exponential backoff (Retry-After is
+                  honoured), never sleeping past the deadline.
+    hedging       with hedge=True (LLM_HEDGE=1), a duplicate request is sent
+                  once the first has been in flight longer than the endpoint's
+                  recent HEDGE_PERCENTILE latency; the first good answer wins.
+
+OPENAI_BASE_URL points the whole process at a stub server
+(benchmarks/llm_keepalive.py, benchmarks/llm_tail.py).
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures import wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+OPENAI_API_KEY  = os.environ.get("OPENAI_API_KEY", "")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+POOL_SIZE       = int(os.environ.get("LLM_POOL_SIZE", 10))   # ≥ PARALLEL_WORKERS of any handler
+TIMEOUTS = {                                                  # (connect s, read s)
+    "embeddings"      : (5, 30),
+    "chat/completions": (5, 120),
+}
+DEFAULT_TIMEOUT = (5, 60)
+RETRY_STATUSES  = {429, 500, 502, 503, 504}
+MAX_RETRIES     = int(os.environ.get("LLM_MAX_RETRIES", 3))
+BACKOFF_BASE_S  = 0.5
+BACKOFF_CAP_S   = 8.0
+DEADLINE_RESERVE_S = 3.0       # kept back from the Lambda's remaining time
+HEDGE           = os.environ.get("LLM_HEDGE", "0") == "1"
+HEDGE_PERCENTILE  = 0.95
+HEDGE_MIN_SAMPLES = 20         # no hedging until this many latencies are known
+LATENCY_WINDOW    = 200
+# ───────────────────────────────────────────────────────────────────────
+
+_session = None
+_hedge_pool = None
+_latencies = {}                # endpoint → recent successful latencies (s)
+_lock = threading.Lock()
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class Deadline:
+    """Absolute time budget shared by every call made for one request."""
+
+    def __init__(self, seconds=None):
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    @classmethod
+    def from_context(cls, context, reserve=DEADLINE_RESERVE_S):
+        """Budget from a Lambda context (unbounded without one, e.g. locally)."""
+        remaining_ms = getattr(context, "get_remaining_time_in_millis", None)
+        if remaining_ms is None:
+            return cls()
+        return cls(max(0.0, remaining_ms() / 1000 - reserve))
+
+    def remaining(self):
+        """Seconds left, or None when unbounded."""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def clip(self, timeout):
+        """(connect, read) shortened to the time left; raises once it is spent."""
+        left = self.remaining()
+        if left is None:
+            return timeout
+        if left <= 0:
+            raise DeadlineExceeded("request deadline exhausted")
+        return tuple(min(t, left) for t in timeout)
+
+
+def get_session():
+    """The process-wide session (created on first use)."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Authorization": f"Bearer {OPENAI_API_KEY}"})
+            _session = session
+        return _session
+
+
+def reset_session():
+    """Close pooled connections; the next post() starts a fresh session."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def latency_percentile(endpoint, q=HEDGE_PERCENTILE):
+    with _lock:
+        samples = sorted(_latencies.get(endpoint, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def backoff(attempt):
+    return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+
+def retry_after(resp):
+    try:
+        return min(BACKOFF_CAP_S, float(resp.headers.get("Retry-After", "")))
+    except ValueError:
+        return None
+
+
+def post(endpoint, payload, timeout=None, deadline=None, retries=MAX_RETRIES, hedge=None):
+    """
+    POST `payload` as JSON to OPENAI_BASE_URL/<endpoint>; returns the Response.
+
+    Retryable failures are retried within `deadline`; if the last attempt
+    still got a 429/5xx that Response is returned (callers raise_for_status
+    as before). Raises DeadlineExceeded when the budget runs out first.
+    """
+    deadline = deadline or Deadline()
+    timeout = timeout or TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+    send = _send_hedged if (HEDGE if hedge is None else hedge) else _send
+    for attempt in range(retries + 1):
+        resp = error = None
+        try:
+            resp = send(endpoint, payload, deadline.clip(timeout))
+        except DeadlineExceeded:
+            raise
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            error = e
+        if resp is not None and (resp.status_code not in RETRY_STATUSES or attempt == retries):
+            return resp
+        pause = (resp is not None and retry_after(resp)) or backoff(attempt)
+        left = deadline.remaining()
+        if left is not None and pause >= left:
+            if resp is not None:
+                return resp
+            raise DeadlineExceeded(f"no time left to retry {endpoint}") from error
+        reason = resp.status_code if resp is not None else type(error).__name__
+        print(f"↪  {endpoint}: {reason}, retry {attempt + 1}/{retries} in {pause:.2f}s")
+        time.sleep(pause)
+
+
+def _send(endpoint, payload, timeout):
+    t0 = time.monotonic()
+    resp = get_session().post(f"{OPENAI_BASE_URL}/{endpoint}", json=payload, timeout=timeout)
+    if resp.status_code < 400:
+        with _lock:
+            _latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(time.monotonic() - t0)
+    return resp
+
+
+def _send_hedged(endpoint, payload, timeout):
+    global _hedge_pool
+    delay = latency_percentile(endpoint)
+    if delay is None:
+        return _send(endpoint, payload, timeout)
+    with _lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=2 * POOL_SIZE, thread_name_prefix="hedge")
+    first = _hedge_pool.submit(_send, endpoint, payload, timeout)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+    print(f"» {endpoint}: no answer after {delay * 1000:.0f} ms, hedging")
+    pending = {first, _hedge_pool.submit(_send, endpoint, payload, timeout)}
+    retryable = error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                resp = fut.result()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                continue
+            if resp.status_code not in RETRY_STATUSES:
+                return resp
+            retryable = resp
+        if retryable is not None:
+            return retryable        # the other leg is already past the percentile: retry, don't wait
+    raise error
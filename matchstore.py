@@ -0,0 +1,245 @@
+"""
+matchstore.py - Normalised (jobId, resumeId) match store
+────────────────────────────────────────────────────────────────────────────
+`matches` keeps one document per job with an array of candidate records,
+so reading or scoring one pair loads (or positionally rewrites) the whole
+array. `job_matches` holds the same records one document per pair:
+
+    {jobId, resumeId, name, …, commonKeys, commonKeyCount,
+     similarityScore, commonExperiences, [aiScore, keyMatchPoints, …]}
+
+Indexes (INDEXES, applied via indexcatalog.py):
+    (jobId, resumeId) unique                     – point reads / AI-score writes
+    (jobId, commonKeyCount, similarityScore)     – ranked job reads
+    (jobId, aiScore, similarityScore)            – AI-ranked job reads
+    (jobId, createdOn)                           – recency reads
+    (resumeId)                                   – resume deletes
+
+MATCH_STORE picks the layout handlers use:
+    embedded     legacy arrays only
+    dual         write both, read the arrays (default) – run
+                 `migrate_matches.py --normalize` while in this mode
+    normalized   rows only, once the backfill has been verified
+Reads return records shaped like the array entries, in the array's rank
+order. The fields stored only for ranking and filtering (INTERNAL_FIELDS:
+commonKeyCount and searchfields.MATCH_SEARCH_FIELDS) are projected out, so
+handler payloads keep the shape they had before those fields existed.
+
+`ranked()` pushes request-time filtering and ranking into one aggregation
+($filter/$sortArray/$slice over the array, $match/$sort/$limit over rows),
+so a request reads a few dozen records however long the job's list grows.
+Rank keys are aggregation expressions over a match bound to `$$m`.
+"""
+
+import os
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne
+
+from searchfields import MATCH_SEARCH_FIELDS
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+MATCH_STORE       = os.environ.get("MATCH_STORE", "dual")    # embedded | dual | normalized
+MATCH_COLLECTION  = "job_matches"
+TOP_LIMIT         = 500          # per-job cap, same as getResumeScoreForJD
+# ───────────────────────────────────────────────────────────────────────
+
+RANK_SORT = [("commonKeyCount", DESCENDING), ("similarityScore", DESCENDING)]
+INTERNAL_FIELDS = ("commonKeyCount",) + MATCH_SEARCH_FIELDS   # stored, never returned
+ROW_PROJECTION = {"_id": 0, "jobId": 0, **dict.fromkeys(INTERNAL_FIELDS, 0)}
+
+INDEXES = [
+    ([("jobId", ASCENDING), ("resumeId", ASCENDING)], {"unique": True}),
+    ([("jobId", ASCENDING)] + RANK_SORT, {}),
+    ([("jobId", ASCENDING), ("aiScore", DESCENDING), ("similarityScore", DESCENDING)], {}),
+    ([("jobId", ASCENDING), ("createdOn", DESCENDING)], {}),
+    ([("resumeId", ASCENDING)], {}),
+]
+
+
+def to_row(job_id, match):
+    return {"jobId": job_id, **match}
+
+
+def normalized_country(field="$$m.country"):
+    """Stored countryKey, else searchfields.normalize_country as an expression."""
+    return {"$ifNull": ["$$m.countryKey", {"$cond": [{"$eq": [{"$type": field}, "string"]},
+                                                     {"$toLower": {"$trim": {"input": field}}}, ""]}]}
+
+
+def match_filter(keywords=None, countries=None):
+    """Boolean expression over `$$m`: every keyword in commonKeys, country in the set."""
+    conds = []
+    if keywords:
+        conds.append({"$setIsSubset": [list(keywords), {"$ifNull": ["$$m.commonKeys", []]}]})
+    if countries is not None:
+        conds.append({"$in": [normalized_country(), list(countries)]})
+    return {"$and": conds} if conds else True
+
+
+def rank_fields(keys):
+    """[(expr, direction)] → ({_rankN: expr}, {_rankN: direction})."""
+    fields = {f"_rank{i}": expr for i, (expr, _) in enumerate(keys)}
+    order = {f"_rank{i}": direction for i, (_, direction) in enumerate(keys)}
+    return fields, order
+
+
+def strip_internal_fields(matches):
+    """Drop rank keys and INTERNAL_FIELDS from records read off the array."""
+    for m in matches:
+        for k in [k for k in m if k.startswith("_rank") or k in INTERNAL_FIELDS]:
+            del m[k]
+    return matches
+
+
+class MatchStore:
+    def __init__(self, db, mode=None):
+        self.mode = mode or MATCH_STORE
+        if self.mode not in ("embedded", "dual", "normalized"):
+            raise ValueError(f"Unknown MATCH_STORE {self.mode!r}")
+        self.embedded = db["matches"]
+        self.rows = db[MATCH_COLLECTION]
+
+    @property
+    def reads_rows(self):
+        return self.mode == "normalized"
+
+    @property
+    def writes_rows(self):
+        return self.mode != "embedded"
+
+    @property
+    def writes_embedded(self):
+        return self.mode != "normalized"
+
+    # ── reads ─────────────────────────────────────────────────────────
+    def job_matches(self, job_id):
+        """Every stored record for a job, best first (same payload as the array)."""
+        if self.reads_rows:
+            return list(self.rows.find({"jobId": job_id}, ROW_PROJECTION)
+                        .sort(RANK_SORT).limit(TOP_LIMIT))
+        doc = self.embedded.find_one({"jobId": job_id}, {"_id": 0})
+        return strip_internal_fields(doc.get("matches", [])) if doc else []
+
+    def pair(self, job_id, resume_id):
+        """One (job, resume) record or None."""
+        if self.reads_rows:
+            return self.rows.find_one({"jobId": job_id, "resumeId": resume_id}, ROW_PROJECTION)
+        doc = self.embedded.find_one({"jobId": job_id, "matches.resumeId": resume_id},
+                                     {"matches.$": 1})
+        if doc and doc.get("matches"):
+            return strip_internal_fields(doc["matches"][:1])[0]
+        return None
+
+    def ranked(self, job_id, rankings, keywords=None, countries=None):
+        """
+        Filtered, ranked slices of a job's matches in one round trip.
+
+        rankings   {name: ([(expr over $$m, 1 | -1), …], limit)}
+        keywords   only matches whose commonKeys contain all of these
+        countries  only matches whose normalised country is in this set
+        Returns {name: [match, …]} with each list best first.
+        """
+        cond = match_filter(keywords, countries)
+        if self.reads_rows:
+            bind = lambda expr: {"$let": {"vars": {"m": "$$ROOT"}, "in": expr}}
+            facets = {}
+            for name, (keys, limit) in rankings.items():
+                fields, order = rank_fields(keys)
+                facets[name] = [{"$addFields": {k: bind(e) for k, e in fields.items()}},
+                                {"$sort": order}, {"$limit": limit},
+                                {"$project": ROW_PROJECTION}]
+            pipeline = [{"$match": {"jobId": job_id}}]
+            if cond is not True:
+                pipeline.append({"$match": {"$expr": bind(cond)}})
+            pipeline.append({"$facet": facets})
+            docs = list(self.rows.aggregate(pipeline))
+        else:
+            slices = {}
+            for name, (keys, limit) in rankings.items():
+                fields, order = rank_fields(keys)
+                keyed = {"$map": {"input": "$filtered", "as": "m",
+                                  "in": {"$mergeObjects": ["$$m", fields]}}}
+                slices[name] = {"$slice": [{"$sortArray": {"input": keyed, "sortBy": order}}, limit]}
+            docs = list(self.embedded.aggregate([
+                {"$match": {"jobId": job_id}},
+                {"$project": {"_id": 0, "filtered": {"$filter": {
+                    "input": {"$ifNull": ["$matches", []]}, "as": "m", "cond": cond}}}},
+                {"$project": slices},
+            ]))
+        doc = docs[0] if docs else {}
+        return {name: strip_internal_fields(doc.get(name, [])) for name in rankings}
+
+    # ── writes ────────────────────────────────────────────────────────
+    def replace_job(self, job_id, matches):
+        """
+        Store a job's full ranked list (matcher path). Rows are replaced in
+        place and only then are the ones no longer listed deleted, so a
+        failure part-way leaves the old list (or a superset of the new one),
+        never an empty job.
+        """
+        if self.writes_embedded:
+            self.embedded.update_one({"jobId": job_id}, {"$set": {"matches": matches}}, upsert=True)
+        if self.writes_rows:
+            if matches:
+                self.rows.bulk_write([
+                    ReplaceOne({"jobId": job_id, "resumeId": m["resumeId"]}, to_row(job_id, m), upsert=True)
+                    for m in matches
+                ], ordered=False)
+            self.rows.delete_many({"jobId": job_id,
+                                   "resumeId": {"$nin": [m["resumeId"] for m in matches]}})
+
+    def add_resume(self, resume_id, job_matches, sort, limit=TOP_LIMIT):
+        """
+        Add one resume's record to many jobs (ingest path). Returns how many
+        jobs now rank it in their top `limit`. Rows beyond the top `limit`
+        are harmless – reads stop at TOP_LIMIT – and are pruned by
+        `migrate_matches.py --trim`. In normalized mode every upserted or
+        changed row counts.
+        """
+        if not job_matches:
+            return 0
+        added = 0
+        if self.writes_embedded:
+            ops = [UpdateOne({"jobId": job_id},
+                             {"$push": {"matches": {"$each": [m], "$sort": sort, "$slice": limit}}},
+                             upsert=True)
+                   for job_id, m in job_matches]
+            result = self.embedded.bulk_write(ops, ordered=False)
+            added = result.modified_count + result.upserted_count
+        if self.writes_rows:
+            ops = [UpdateOne({"jobId": job_id, "resumeId": resume_id},
+                             {"$set": to_row(job_id, m)}, upsert=True)
+                   for job_id, m in job_matches]
+            result = self.rows.bulk_write(ops, ordered=False)
+            if not self.writes_embedded:
+                added = result.modified_count + result.upserted_count
+        return added
+
+    def set_fields(self, job_id, fields_by_resume):
+        """Set extra fields (AI score etc.) on existing records: {resumeId: {field: value}}."""
+        if not fields_by_resume:
+            return
+        if self.writes_rows:
+            self.rows.bulk_write([
+                UpdateOne({"jobId": job_id, "resumeId": rid}, {"$set": fields})
+                for rid, fields in fields_by_resume.items()
+            ], ordered=False)
+        if self.writes_embedded:
+            self.embedded.bulk_write([
+                UpdateOne({"jobId": job_id, "matches.resumeId": rid},
+                          {"$set": {f"matches.$.{k}": v for k, v in fields.items()}})
+                for rid, fields in fields_by_resume.items()
+            ], ordered=False)
+
+    def remove_resume(self, resume_id):
+        if self.writes_embedded:
+            self.embedded.update_many({"matches.resumeId": resume_id},
+                                      {"$pull": {"matches": {"resumeId": resume_id}}})
+        if self.writes_rows:
+            self.rows.delete_many({"resumeId": resume_id})
+
+    def remove_job(self, job_id):
+        if self.writes_embedded:
+            self.embedded.delete_many({"jobId": job_id})
+        if self.writes_rows:
+            self.rows.delete_many({"jobId": job_id})
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+migrate_embeddings.py - Convert stored embeddings to packed binary
+────────────────────────────────────────────────────────────────────────────
+Rewrites `embedding` arrays of doubles in `resumes` and `job_description`
+as unit-normalised packed float32/float16 BSON Binary (see embeddingcodec.py).
+
+Resumable: each batch only selects documents whose embedding is still an
+array, and every update re-checks that, so the tool can be stopped and
+re-run at any point. Readers dual-read both formats in the meantime.
+
+    python migrate_embeddings.py                   # migrate, float32
+    python migrate_embeddings.py --storage float16
+    python migrate_embeddings.py --report          # sizes + read latency only
+    python migrate_embeddings.py --compact d256-int8   # backfill embeddingCompact
+"""
+
+import argparse
+import time
+
+import bson
+from pymongo import UpdateOne
+
+from embeddingcodec import decode_embedding, encode_embedding, SUBTYPES
+from embeddingprofile import COMPACT_FIELD, PROFILES, encode_compact, get_profile
+from mongoconn import db_name, new_client
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+COLLECTIONS = ["resumes", "job_description"]
+BATCH_SIZE  = 200
+SAMPLE_SIZE = 200             # documents timed per format in the report
+# ───────────────────────────────────────────────────────────────────────
+
+LEGACY_FILTER = {"embedding": {"$type": "array"}}
+PACKED_FILTER = {"embedding": {"$type": "binData"}}
+
+
+def migrate_collection(col, storage, batch_size):
+    """Convert every legacy embedding in `col`; returns (docs, bytes_before, bytes_after)."""
+    migrated = bytes_before = bytes_after = 0
+    last_id = None
+    while True:
+        query = dict(LEGACY_FILTER)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(col.find(query, {"embedding": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            packed = encode_embedding(doc["embedding"], storage)
+            bytes_before += len(bson.encode({"embedding": doc["embedding"]}))
+            bytes_after  += len(bson.encode({"embedding": packed}))
+            ops.append(UpdateOne({"_id": doc["_id"], **LEGACY_FILTER},
+                                 {"$set": {"embedding": packed}}))
+        result = col.bulk_write(ops, ordered=False)
+        migrated += result.modified_count
+        last_id = batch[-1]["_id"]
+        print(f"  {col.name}: {migrated} migrated (last _id {last_id})")
+    return migrated, bytes_before, bytes_after
+
+
+def backfill_compact(col, profile_name, batch_size):
+    """Write `embeddingCompact` for documents that lack it; returns docs updated."""
+    profile = get_profile(profile_name)
+    missing = {COMPACT_FIELD: {"$exists": False}, "embedding": {"$exists": True}}
+    updated = 0
+    last_id = None
+    while True:
+        query = dict(missing)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(col.find(query, {"embedding": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            vec = decode_embedding(doc["embedding"])
+            if vec is None:
+                continue
+            ops.append(UpdateOne({"_id": doc["_id"], COMPACT_FIELD: {"$exists": False}},
+                                 {"$set": {COMPACT_FIELD: encode_compact(vec, profile)}}))
+        if ops:
+            updated += col.bulk_write(ops, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+        print(f"  {col.name}: {updated} compact vectors written (last _id {last_id})")
+    return updated
+
+
+def time_reads(col, query, sample_size):
+    """Seconds per document to fetch and decode `sample_size` embeddings."""
+    t0 = time.perf_counter()
+    n = 0
+    for doc in col.find(query, {"embedding": 1}).limit(sample_size):
+        decode_embedding(doc.get("embedding"))
+        n += 1
+    return (time.perf_counter() - t0) / n if n else None
+
+
+def report(db, sample_size):
+    for name in COLLECTIONS:
+        col = db[name]
+        stats = db.command("collStats", name)
+        legacy = col.count_documents(LEGACY_FILTER)
+        packed = col.count_documents(PACKED_FILTER)
+        print(f"▶ {name}: {legacy} legacy, {packed} packed, "
+              f"avgObjSize {stats.get('avgObjSize', 0):,.0f} B, "
+              f"size {stats.get('size', 0) / 2**20:,.1f} MiB, "
+              f"storage {stats.get('storageSize', 0) / 2**20:,.1f} MiB")
+        t_legacy = time_reads(col, LEGACY_FILTER, sample_size)
+        t_packed = time_reads(col, PACKED_FILTER, sample_size)
+        if t_legacy:
+            print(f"  legacy read+decode: {t_legacy * 1000:.3f} ms/doc")
+        if t_packed:
+            print(f"  packed read+decode: {t_packed * 1000:.3f} ms/doc")
+        if legacy == 0:
+            print("  ✓ migration complete – dual-read fallback no longer needed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", choices=sorted(SUBTYPES), default="float32")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--report", action="store_true", help="only print the report")
+    parser.add_argument("--compact", choices=[p for p in PROFILES if PROFILES[p]],
+                        help="backfill embeddingCompact for this profile instead of migrating")
+    args = parser.parse_args()
+
+    client = new_client()
+    try:
+        db = client[db_name]
+        if args.compact:
+            for name in COLLECTIONS:
+                print(f"▶ Backfilling {COMPACT_FIELD} ({args.compact}) in {name}")
+                backfill_compact(db[name], args.compact, args.batch_size)
+        elif not args.report:
+            for name in COLLECTIONS:
+                print(f"▶ Migrating {name} → {args.storage}")
+                n, before, after = migrate_collection(db[name], args.storage, args.batch_size)
+                if n:
+                    print(f"✓ {name}: {n} docs, embedding bytes {before:,} → {after:,} "
+                          f"({100 * (1 - after / before):.1f}% smaller)")
+                else:
+                    print(f"✓ {name}: nothing to migrate")
+        report(db, SAMPLE_SIZE)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+migrate_matches.py - Maintenance for the `matches` / `job_matches` collections
+────────────────────────────────────────────────────────────────────────────
+--counts     Backfills `commonKeyCount` (the length of `commonKeys`) on
+             match entries written before it existed. The ingest path keeps
+             each job's array ordered with `$push … $sort: {commonKeyCount:
+             -1, similarityScore: -1}`, which would otherwise rank legacy
+             entries last and trim them first. Only job documents with an
+             entry still lacking the field are touched.
+--indexes    Creates the `job_matches` indexes (indexcatalog.py).
+--normalize  Copies every job's `matches` array into `job_matches`, one
+             document per (jobId, resumeId), as upserts – safe to rerun and
+             to resume with --after <last _id printed>. Run it with handlers
+             on MATCH_STORE=dual so new writes land in both layouts, then
+             switch them to MATCH_STORE=normalized.
+--trim       Deletes `job_matches` rows ranked below each job's top
+             TOP_LIMIT (left behind by the ingest path, which does not trim
+             rows on write).
+
+    python migrate_matches.py --counts --indexes --normalize
+    python migrate_matches.py --normalize --after 665f1c…
+    python migrate_matches.py --trim
+"""
+
+import argparse
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from indexcatalog import apply as apply_indexes
+from matchstore import MATCH_COLLECTION, RANK_SORT, TOP_LIMIT, to_row
+from mongoconn import db_name, new_client
+from searchfields import match_search_fields
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+NORMALIZE_BATCH = 50          # job documents per cursor batch
+# ───────────────────────────────────────────────────────────────────────
+
+MISSING_COUNT = {"matches": {"$elemMatch": {"commonKeyCount": {"$exists": False}}}}
+
+
+def backfill_key_counts(matches_col):
+    """Set commonKeyCount on every entry of every job that lacks it; returns jobs updated."""
+    pipeline = [{"$set": {"matches": {"$map": {
+        "input": "$matches",
+        "in": {"$mergeObjects": ["$$this", {
+            "commonKeyCount": {"$size": {"$ifNull": ["$$this.commonKeys", []]}}
+        }]},
+    }}}}]
+    return matches_col.update_many(MISSING_COUNT, pipeline).modified_count
+
+
+def normalize_job(rows_col, job_id, matches):
+    """Upsert one job's array entries as rows; returns rows written."""
+    ops, seen = [], set()
+    for m in matches:
+        rid = m.get("resumeId")
+        if rid is None or rid in seen:
+            continue
+        seen.add(rid)
+        row = to_row(job_id, m)
+        row.setdefault("commonKeyCount", len(m.get("commonKeys") or []))
+        for k, v in match_search_fields(m).items():
+            row.setdefault(k, v)
+        ops.append(ReplaceOne({"jobId": job_id, "resumeId": rid}, row, upsert=True))
+    if ops:
+        rows_col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def normalize(db, after=None):
+    """Copy every `matches` array into `job_matches`, in _id order."""
+    query = {"_id": {"$gt": ObjectId(after)}} if after else {}
+    jobs = rows = 0
+    cursor = (db["matches"].find(query, {"jobId": 1, "matches": 1})
+              .sort("_id", 1).batch_size(NORMALIZE_BATCH))
+    for doc in cursor:
+        rows += normalize_job(db[MATCH_COLLECTION], doc["jobId"], doc.get("matches") or [])
+        jobs += 1
+        if jobs % 100 == 0:
+            print(f"» {jobs} jobs, {rows} rows – last _id {doc['_id']}")
+    return jobs, rows
+
+
+def trim(rows_col, limit=TOP_LIMIT):
+    """Delete rows ranked below each job's top `limit`; returns rows deleted."""
+    deleted = 0
+    for job_id in rows_col.distinct("jobId"):
+        extra = [r["_id"] for r in rows_col.find({"jobId": job_id}, {"_id": 1})
+                 .sort(RANK_SORT).skip(limit)]
+        if extra:
+            deleted += rows_col.delete_many({"_id": {"$in": extra}}).deleted_count
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", action="store_true", help="backfill commonKeyCount")
+    parser.add_argument("--indexes", action="store_true", help=f"create {MATCH_COLLECTION} indexes")
+    parser.add_argument("--normalize", action="store_true", help=f"copy matches into {MATCH_COLLECTION}")
+    parser.add_argument("--after", help="resume --normalize after this matches _id")
+    parser.add_argument("--trim", action="store_true", help=f"drop {MATCH_COLLECTION} rows below top N")
+    args = parser.parse_args()
+
+    client = new_client()
+    try:
+        db = client[db_name]
+        if not (args.counts or args.indexes or args.normalize or args.trim):
+            parser.print_help()
+            return
+        if args.counts:
+            print("▶ Backfilling commonKeyCount in matches")
+            print(f"✓ {backfill_key_counts(db['matches'])} jobs updated")
+        if args.indexes:
+            print(f"▶ Creating {MATCH_COLLECTION} indexes")
+            apply_indexes(db, [MATCH_COLLECTION])
+            print("✓ Indexes ready")
+        if args.normalize:
+            print(f"▶ Copying matches into {MATCH_COLLECTION}")
+            jobs, rows = normalize(db, args.after)
+            print(f"✓ {jobs} jobs, {rows} rows upserted")
+        if args.trim:
+            print(f"▶ Trimming {MATCH_COLLECTION} to top {TOP_LIMIT} per job")
+            print(f"✓ {trim(db[MATCH_COLLECTION])} rows deleted")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
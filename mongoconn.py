@@ -0,0 +1,97 @@
+"""
+mongoconn.py - One pooled MongoClient per Lambda container
+────────────────────────────────────────────────────────────────────────────
+Handlers used to build a MongoClient inside lambda_handler and close it in
+`finally`, paying DNS + TCP + TLS + SCRAM on every request. get_mongo_client()
+now returns a process-wide client that is created lazily on the first
+invocation and reused by every warm one (and by every thread in it):
+
+    from mongoconn import db_name, get_mongo_client
+    db = get_mongo_client()[db_name]        # never close() it in a handler
+
+A frozen container can wake up with sockets the server or a NAT has already
+dropped. maxIdleTimeMS discards pooled sockets idle for longer than that
+before they are checked out, retryReads/retryWrites let the driver retry an
+operation once on a fresh socket, and a client idle for more than
+STALE_AFTER_S is pinged first and rebuilt if the ping fails.
+
+Scripts that run once (migrations, index catalogue, benchmarks) use
+new_client(), which has the same settings but is the caller's to close.
+Every setting can be overridden with a MONGO_* environment variable.
+"""
+
+import os
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+host        = os.environ.get("MONGO_HOST", "notify.pesuacademy.com")
+port        = int(os.environ.get("MONGO_PORT", 27017))
+username    = os.environ.get("MONGO_USERNAME", "admin")
+password    = os.environ.get("MONGO_PASSWORD", "")
+auth_db     = os.environ.get("MONGO_AUTH_DB", "admin")
+db_name     = os.environ.get("MONGO_DB", "resumes_database")
+
+MAX_POOL_SIZE      = int(os.environ.get("MONGO_MAX_POOL_SIZE", 10))   # ≥ handler thread fan-out
+MIN_POOL_SIZE      = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MAX_IDLE_MS        = int(os.environ.get("MONGO_MAX_IDLE_MS", 60_000)) # below NAT / LB idle cut-offs
+CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5_000))
+SOCKET_TIMEOUT_MS  = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 30_000))
+SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SELECTION_TIMEOUT_MS", 5_000))
+STALE_AFTER_S      = float(os.environ.get("MONGO_STALE_AFTER_S", 120))
+# ───────────────────────────────────────────────────────────────────────
+
+_client = None
+_last_used = 0.0
+_lock = threading.Lock()
+
+
+def client_options():
+    return dict(
+        host=host, port=port, username=username, password=password, authSource=auth_db,
+        maxPoolSize=MAX_POOL_SIZE, minPoolSize=MIN_POOL_SIZE, maxIdleTimeMS=MAX_IDLE_MS,
+        connectTimeoutMS=CONNECT_TIMEOUT_MS, socketTimeoutMS=SOCKET_TIMEOUT_MS,
+        serverSelectionTimeoutMS=SELECTION_TIMEOUT_MS,
+        retryReads=True, retryWrites=True, appname=os.environ.get("AWS_LAMBDA_FUNCTION_NAME"),
+    )
+
+
+def new_client(**overrides):
+    """A client with the shared settings that the caller owns (and closes)."""
+    return MongoClient(**{**client_options(), **overrides})
+
+
+def get_mongo_client():
+    """The process-wide client; created on first use, revalidated after long idle."""
+    global _client, _last_used
+    with _lock:
+        now = time.monotonic()
+        if _client is not None and now - _last_used > STALE_AFTER_S:
+            try:
+                _client.admin.command("ping")
+            except ConnectionFailure as e:
+                print(f"! Pooled MongoClient unusable after {now - _last_used:.0f}s idle ({e}); reconnecting")
+                _discard()
+        if _client is None:
+            _client = new_client()
+        _last_used = now
+        return _client
+
+
+def reset_client():
+    """Drop the shared client (e.g. after a failover); the next call reconnects."""
+    with _lock:
+        _discard()
+
+
+def _discard():
+    global _client
+    if _client is not None:
+        try:
+            _client.close()
+        except Exception:
+            pass
+    _client = None
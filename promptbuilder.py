@@ -0,0 +1,172 @@
+"""
+promptbuilder.py - Token-budgeted resume and JD text for aiScore prompts
+────────────────────────────────────────────────────────────────────────────
+Without resumeText the scorers fell back to json.dumps(resume, indent=2),
+which sent nulls, derived search fields and deep indentation. Neither a
+resume nor a JD had a length limit. Everything that goes into a scoring
+prompt now passes through here:
+
+    format_resume(resume)   "### Resume ID: … ###" block. resumeText has its
+                            whitespace tidied; otherwise the document is
+                            compact JSON without nulls, empty values or
+                            OMIT_FIELDS, with string fields clipped to
+                            FIELD_CHARS. Capped at RESUME_TOKEN_BUDGET.
+    format_jd(jd_text)      tidied JD capped at JD_TOKEN_BUDGET.
+    count_tokens(text)      gpt-4o token count: a word-piece estimate by
+                            default, tiktoken's ENCODING when its BPE file
+                            is in TOKENIZER_CACHE (see below).
+
+Over-budget text keeps its head and gets TRUNCATION_MARK appended. The cut
+is deterministic, so the system prompt + JD opening every prompt for a job
+is byte-identical across calls and stays eligible for the provider's
+prompt-prefix caching.
+
+tiktoken fetches BPE files over the network on first use, so promptbuilder
+never lets it: the exact count is used only when ENCODING's file is already
+cached locally. buildinglambdadependencies bakes it into the layer under
+python/tiktoken_cache (/opt/python/tiktoken_cache at runtime); point
+TIKTOKEN_CACHE_DIR elsewhere to use another cache. Budgets are soft limits,
+so the estimate is good enough wherever the file is missing.
+
+benchmarks/prompt_tokens.py reports the input-token reduction on a sample
+corpus.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:                      # not in the Lambda layer: estimate instead
+    tiktoken = None
+
+from keywordvocab import RESUME_PAYLOAD_PROJECTION
+from searchfields import RESUME_SEARCH_FIELDS
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+ENCODING            = "o200k_base"       # gpt-4o / gpt-4o-mini tokenizer
+ENCODING_URL        = "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+ENCODING_SHA256     = "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d"
+TOKENIZER_CACHE     = os.environ.get("TIKTOKEN_CACHE_DIR", "/opt/python/tiktoken_cache")
+RESUME_TOKEN_BUDGET = int(os.environ.get("AISCORE_RESUME_TOKENS", 3000))
+JD_TOKEN_BUDGET     = int(os.environ.get("AISCORE_JD_TOKENS", 2000))
+FIELD_CHARS         = 600                # per string field in JSON resumes
+TRUNCATION_MARK     = "\n[… truncated]"
+OMIT_FIELDS = {                          # not scoring inputs
+    *RESUME_PAYLOAD_PROJECTION,          # _id, embeddings, keywordIds, keywordTerms
+    *RESUME_SEARCH_FIELDS,               # derived at ingest
+    "createdOn", "ownedBy", "email", "contactNo",
+}
+# ───────────────────────────────────────────────────────────────────────
+
+_PIECE = re.compile(r"\w+|[^\w\s]|\s{2,}|\n")    # estimate: words, symbols, whitespace runs
+_encoding = None
+
+
+def _bpe_cached():
+    """
+    True if an intact copy of ENCODING's BPE file is in TOKENIZER_CACHE
+    (tiktoken names it sha1(url)). tiktoken re-downloads a file that fails
+    its hash check, so the check is repeated here first.
+    """
+    path = os.path.join(TOKENIZER_CACHE, hashlib.sha1(ENCODING_URL.encode()).hexdigest())
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest() == ENCODING_SHA256
+    except OSError:
+        return False
+
+
+def _encoder():
+    """tiktoken encoding when it loads without a download, else None to estimate."""
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None and _bpe_cached():
+            os.environ["TIKTOKEN_CACHE_DIR"] = TOKENIZER_CACHE
+            try:
+                _encoding = tiktoken.get_encoding(ENCODING)
+            except Exception as e:
+                print(f"! promptbuilder: {ENCODING} unavailable ({e.__class__.__name__}), estimating tokens")
+    return _encoding or None
+
+
+def count_tokens(text):
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return sum(max(1, (len(p) + 3) // 4) for p in _PIECE.findall(text))
+
+
+def _prefix_chars(text, budget):
+    """Length of the longest prefix of `text` within `budget` tokens."""
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.decode(enc.encode(text, disallowed_special=())[:budget]))
+    used = 0
+    for m in _PIECE.finditer(text):
+        used += max(1, (len(m.group()) + 3) // 4)
+        if used > budget:
+            return m.start()
+    return len(text)
+
+
+def truncate(text, budget):
+    """(text, tokens dropped): the head of `text` within `budget` tokens, cut at a line or word break."""
+    total = count_tokens(text)
+    if total <= budget:
+        return text, 0
+    head = text[:_prefix_chars(text, max(0, budget - count_tokens(TRUNCATION_MARK)))]
+    for sep in ("\n", " "):
+        cut = head.rfind(sep)
+        if cut > len(head) * 0.8:
+            head = head[:cut]
+            break
+    head = head.rstrip()
+    return head + TRUNCATION_MARK, total - count_tokens(head)
+
+
+def tidy_text(text):
+    """Collapse runs of spaces/tabs, trailing blanks and blank-line runs (PDF extraction leaves many)."""
+    text = re.sub("[ \t\u00a0]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def compact(value, top=True):
+    """`value` without None / empty values (and OMIT_FIELDS at the top level), strings clipped."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if top and k in OMIT_FIELDS:
+                continue
+            v = compact(v, False)
+            if v not in (None, "", [], {}):
+                out[k] = v
+        return out
+    if isinstance(value, list):
+        return [v for v in (compact(v, False) for v in value) if v not in (None, "", [], {})]
+    if isinstance(value, str):
+        value = value.strip()
+        return value if len(value) <= FIELD_CHARS else value[:FIELD_CHARS].rstrip() + "…"
+    return value
+
+
+def compact_json(resume):
+    resume = {k: v for k, v in resume.items() if k != "resumeId"}      # already in the header
+    return json.dumps(compact(resume), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def format_resume(resume, budget=RESUME_TOKEN_BUDGET):
+    rid = resume.get("resumeId")
+    if resume.get("resumeText"):
+        body, _ = truncate(tidy_text(resume["resumeText"]), budget)
+        return f'### Resume ID: {rid} ###\n"""\n{body}\n"""'
+    body, _ = truncate(compact_json(resume), budget)
+    return f"### Resume ID: {rid} ###\n{body}"
+
+
+def format_jd(jd_text, budget=JD_TOKEN_BUDGET):
+    return truncate(tidy_text(jd_text or ""), budget)[0]
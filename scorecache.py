@@ -0,0 +1,123 @@
+"""
+scorecache.py - AI-score cache keyed by the scoring inputs
+────────────────────────────────────────────────────────────────────────────
+AI scores used to live only on match records. A match rebuild
+(delete_jd_data / delete_resume_data on re-upload) threw them away, so an
+unchanged JD/resume pair was paid for again. A new prompt or model, on the
+other hand, never invalidated an old score. `ai_scores` keeps one document
+per scoring input instead:
+
+    {_id, jdHash, resumeHash, promptVersion, model, resumeId, result, createdOn}
+
+    jdHash         sha256 of the JD text exactly as sent (format_jd output)
+    resumeHash     sha256 of format_resume(resume), so an upload whose
+                   prompt text is unchanged still hits, and a change to
+                   the text or the prompt budgets misses
+    promptVersion  prompt_version(SYSTEM_PROMPT, …): a hash, so editing a
+                   prompt invalidates its cached scores by itself
+    model          the chat model that produced `result`
+    _id            sha256 of the four above (the lookup key)
+
+Match records still carry aiScore for ranking; the cache is what refills
+them after a rebuild. All scoring call sites go through read_through():
+
+    cache = ScoreCache(db, PROMPT_VERSION, OPENAI_MODEL)
+    scores = cache.read_through(jd_text, resumes, score_misses)
+
+Hits come from one `_id: {$in}` query and misses are written back in one
+unordered bulk upsert. Entries expire CACHE_TTL_DAYS after they were
+written (TTL index on createdOn, applied via indexcatalog.py).
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+from promptbuilder import format_resume
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+CACHE_COLLECTION = "ai_scores"
+CACHE_TTL_DAYS   = int(os.environ.get("AISCORE_CACHE_TTL_DAYS", 90))
+CACHE_ENABLED    = os.environ.get("AISCORE_CACHE", "1") == "1"
+# ───────────────────────────────────────────────────────────────────────
+
+INDEXES = [
+    ([("createdOn", ASCENDING)], {"expireAfterSeconds": CACHE_TTL_DAYS * 86400}),
+]
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def prompt_version(*parts):
+    """Short hash of everything fixed in a prompt (system prompt, template tag, …)."""
+    return sha256("\x1f".join(parts))[:16]
+
+
+class ScoreCache:
+    def __init__(self, db, prompt_version, model):
+        self.col = db[CACHE_COLLECTION]
+        self.prompt_version = prompt_version
+        self.model = model
+
+    def keys(self, jd_text, resumes):
+        """{resumeId: (_id, jdHash, resumeHash)}."""
+        jd_hash = sha256(jd_text)
+        out = {}
+        for resume in resumes:
+            resume_hash = sha256(format_resume(resume))
+            key = sha256("\x1f".join((jd_hash, resume_hash, self.prompt_version, self.model)))
+            out[resume["resumeId"]] = (key, jd_hash, resume_hash)
+        return out
+
+    def get_many(self, jd_text, resumes, keys=None):
+        """Cached results for `resumes`: {resumeId: result}."""
+        keys = keys or self.keys(jd_text, resumes)
+        if not keys:
+            return {}
+        by_key = {key: rid for rid, (key, _, _) in keys.items()}
+        return {by_key[d["_id"]]: d["result"]
+                for d in self.col.find({"_id": {"$in": list(by_key)}}, {"result": 1})}
+
+    def put_many(self, jd_text, resumes, results, keys=None):
+        """Store {resumeId: result} for the given resumes in one bulk upsert."""
+        keys = keys or self.keys(jd_text, [r for r in resumes if r["resumeId"] in results])
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne({"_id": key}, {"$set": {
+                "jdHash": jd_hash, "resumeHash": resume_hash,
+                "promptVersion": self.prompt_version, "model": self.model,
+                "resumeId": rid, "result": results[rid], "createdOn": now,
+            }}, upsert=True)
+            for rid, (key, jd_hash, resume_hash) in keys.items() if rid in results
+        ]
+        if ops:
+            self.col.bulk_write(ops, ordered=False)
+
+    def read_through(self, jd_text, resumes, score):
+        """
+        {resumeId: result} for `resumes`: cached results, plus
+        score(misses) → {resumeId: result} for the rest, written back.
+        A cache failure never fails scoring; it only costs the LLM calls.
+        """
+        if not CACHE_ENABLED:
+            return score(resumes) if resumes else {}
+        try:
+            keys = self.keys(jd_text, resumes)
+            hits = self.get_many(jd_text, resumes, keys)
+        except Exception as e:
+            print(f"! Score cache read failed: {e}")
+            keys, hits = None, {}
+        misses = [r for r in resumes if r["resumeId"] not in hits]
+        print(f"» Score cache: {len(hits)} hit(s), {len(misses)} to score")
+        fresh = score(misses) if misses else {}
+        if fresh and keys is not None:
+            try:
+                self.put_many(jd_text, misses, fresh,
+                              {rid: keys[rid] for rid in fresh if rid in keys})
+            except Exception as e:
+                print(f"! Score cache write failed: {e}")
+        return {**hits, **fresh}
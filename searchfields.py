@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+searchfields.py - Ingest-time derived search fields
+────────────────────────────────────────────────────────────────────────────
+Read paths used to re-derive the same values on every request (country
+normalisation, createdOn parsing, duration → years). They are now written
+once, next to the raw fields, by every writer:
+
+    countryKey       country.strip().lower() ("" if absent)
+    regionId         region whose country variants include countryKey
+    createdOnEpoch   createdOn as epoch ms (Int64 ms, ISO-8601 or
+                     epoch-ms string; None if unparseable)
+
+Resumes and match records (`matches` arrays, `job_matches` rows) carry all
+three. They are stripped from API payloads and prompts (keywordvocab's
+RESUME_PAYLOAD_PROJECTION, matchstore's INTERNAL_FIELDS). Experience
+filters use the resume's own `totalExperience`: addResumeToZap has always
+stored the sum of positive jobExperiences durations there, and the backfill
+fills it in on older resumes that lack a number. The lower-cased
+skill/keyword set is keywordvocab's `keywordTerms`.
+
+RESUME_INDEXES is part of indexcatalog.py. Backfill existing documents
+(and create the resume indexes) with:
+
+    python searchfields.py backfill
+"""
+
+import argparse
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+BACKFILL_BATCH = 500
+# ───────────────────────────────────────────────────────────────────────
+
+REGION_COUNTRIES = {
+    "0966bbc7-8d15-11ef-a224-000c29dc611c": ["Australia"],
+    "2039bca5-8d14-11ef-a224-000c29dc611c": ["United Arab Emirates", "Uae"],
+    "2853b6af-04af-11f0-b74e-52540e737e83": ["Hong Kong", "Hong Kong Sar"],
+    "28820f8a-04af-11f0-b74e-52540e737e83": ["Japan"],
+    "28cccee1-04af-11f0-b74e-52540e737e83": ["Germany"],
+    "29ef8adf-8d16-11ef-a224-000c29dc611c": ["Saudi Arabia", "Ksa"],
+    "3e58491b-8d13-11ef-a224-000c29dc611c": ["Philippines", "The Philippines"],
+    "6f48aadb-08a0-11f0-a380-5254828ec570": ["Singapore"],
+    "7c1f71d7-8d25-11ef-a224-000c29dc611c": ["Thailand"],
+    "9a7be17b-8d15-11ef-a224-000c29dc611c": ["New Zealand"],
+    "9e21a39d-d1a6-4aca-bfc2-4a241d4cbec8": ["India", "Ind"],
+    "a227528b-8d13-11ef-a224-000c29dc611c": ["Malaysia"],
+    "ba184d1f-8d14-11ef-a224-000c29dc611c": ["United States", "Usa", "Us"],
+    "c7c45e99-ff53-42e1-981b-3ba1f0794b24": ["Indonesia"],
+    "e573ba69-2886-11ef-b4be-000c29dc611c": ["Vietnam", "Viet Nam", "Vn", "Vietnamese"],
+}
+
+RESUME_INDEXES = [
+    [("countryKey", ASCENDING), ("totalExperience", ASCENDING)],
+    [("regionId", ASCENDING), ("totalExperience", ASCENDING)],
+    [("totalExperience", ASCENDING)],
+    [("createdOnEpoch", DESCENDING)],
+]
+RETIRED_INDEXES = ["countryKey_1_totalExperienceYears_1", "regionId_1_totalExperienceYears_1",
+                   "totalExperienceYears_1"]
+
+MISSING_FIELDS = {"countryKey": {"$exists": False}}
+RESUMES_TO_BACKFILL = {"$or": [MISSING_FIELDS,
+                               {"totalExperience": {"$not": {"$type": "number"}}},
+                               {"totalExperienceYears": {"$exists": True}}]}
+
+
+def normalize_country(value):
+    return value.strip().lower() if isinstance(value, str) else ""
+
+
+COUNTRY_REGIONS = {normalize_country(c): region
+                   for region, countries in REGION_COUNTRIES.items() for c in countries}
+
+
+def region_countries(region_id):
+    """Normalised country variants of a region (None for an unknown region)."""
+    countries = REGION_COUNTRIES.get(region_id)
+    return {normalize_country(c) for c in countries} if countries else None
+
+
+def created_on_epoch(value):
+    """Epoch ms from Int64 ms, an ISO-8601 string or an epoch-ms string (None otherwise)."""
+    try:
+        if isinstance(value, (int, float)):
+            datetime.fromtimestamp(value / 1000, tz=timezone.utc)      # range check
+            return int(value)
+        if isinstance(value, str):
+            if not value.isdigit():
+                try:
+                    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+                    if dt.tzinfo is None:
+                        dt = dt.replace(tzinfo=timezone.utc)
+                    return int(dt.timestamp() * 1000)
+                except ValueError:
+                    pass
+            return created_on_epoch(int(value))
+    except (ValueError, TypeError, OverflowError, OSError):
+        pass
+    return None
+
+
+def total_experience_years(job_experiences):
+    """Sum of positive, numeric jobExperiences durations (whole years each)."""
+    total = 0
+    if isinstance(job_experiences, list):
+        for exp in job_experiences:
+            dur = exp.get("duration") if isinstance(exp, dict) else None
+            if dur is None:
+                continue
+            try:
+                dur_str = str(dur).strip()
+                if dur_str == "":
+                    continue
+                dur_val = float(dur_str)
+                if dur_val > 0:
+                    total += int(dur_val)
+            except (ValueError, TypeError, OverflowError):
+                continue
+    return total
+
+
+MATCH_SEARCH_FIELDS  = ("countryKey", "regionId", "createdOnEpoch")
+RESUME_SEARCH_FIELDS = MATCH_SEARCH_FIELDS               # added to resumes, never returned
+
+
+def match_search_fields(record):
+    """Derived fields for a match record (or the resume it is built from)."""
+    country = normalize_country(record.get("country"))
+    return {
+        "countryKey"    : country,
+        "regionId"      : COUNTRY_REGIONS.get(country),
+        "createdOnEpoch": created_on_epoch(record.get("createdOn")),
+    }
+
+
+def resume_search_fields(resume):
+    """Derived fields plus `totalExperience`, computed the way addResumeToZap stores it."""
+    return {**match_search_fields(resume),
+            "totalExperience": total_experience_years(resume.get("jobExperiences"))}
+
+
+def backfill_resumes(db, batch_size=BACKFILL_BATCH):
+    resumes = db["resumes"]
+    for name in RETIRED_INDEXES:
+        try:
+            resumes.drop_index(name)
+        except OperationFailure:
+            pass                               # never created
+    projection = {"country": 1, "createdOn": 1, "jobExperiences.duration": 1}
+    updated, last_id = 0, None
+    while True:
+        q = dict(RESUMES_TO_BACKFILL)
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        batch = list(resumes.find(q, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": resume_search_fields(doc),
+                                                "$unset": {"totalExperienceYears": ""}})
+               for doc in batch]
+        updated += resumes.bulk_write(ops, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+        print(f"  resumes: {updated} updated")
+    return updated
+
+
+def backfill_matches(db, batch_size=BACKFILL_BATCH):
+    """
+    Embedded entries are updated in place by resumeId (arrayFilters), so
+    concurrent $push/$pull on the same job is never overwritten.
+    """
+    from matchstore import MATCH_COLLECTION
+
+    jobs = 0
+    cursor = db["matches"].find({"matches": {"$elemMatch": MISSING_FIELDS}},
+                                {"matches.resumeId": 1, "matches.country": 1,
+                                 "matches.createdOn": 1, "matches.countryKey": 1})
+    for doc in cursor.batch_size(batch_size):
+        ops = [UpdateOne({"_id": doc["_id"]},
+                         {"$set": {f"matches.$[m].{k}": v for k, v in match_search_fields(m).items()}},
+                         array_filters=[{"m.resumeId": m["resumeId"]}])
+               for m in doc.get("matches") or [] if "countryKey" not in m and m.get("resumeId")]
+        if ops:
+            db["matches"].bulk_write(ops, ordered=False)
+            jobs += 1
+    rows = db[MATCH_COLLECTION]
+    updated, last_id = 0, None
+    while True:
+        q = dict(MISSING_FIELDS)
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        batch = list(rows.find(q, {"country": 1, "createdOn": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": match_search_fields(doc)}) for doc in batch]
+        updated += rows.bulk_write(ops, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+    return jobs, updated
+
+
+if __name__ == "__main__":
+    from mongoconn import db_name, new_client
+    from indexcatalog import apply as apply_indexes
+    parser = argparse.ArgumentParser(description="Derived search field maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+    client = new_client()
+    try:
+        db = client[db_name]
+        apply_indexes(db, ["resumes"])
+        print(f"✓ {backfill_resumes(db, args.batch_size)} resumes backfilled")
+        jobs, rows = backfill_matches(db, args.batch_size)
+        print(f"✓ {jobs} match arrays, {rows} match rows backfilled")
+    finally:
+        client.close()
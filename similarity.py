@@ -0,0 +1,79 @@
+"""
+similarity.py - Vectorised cosine-similarity engine
+────────────────────────────────────────────────────────────────────────────
+Loads candidate embeddings into one contiguous float32 matrix and scores a
+query vector against every row with a single matrix-vector product.
+
+Rows that are missing, malformed, or do not match the query length score
+0.0, exactly like the original pure-Python cosine (kept as the reference in
+benchmarks/similarity_bench.py). Both legacy arrays and packed embeddings
+(embeddingcodec.py) are accepted.
+"""
+
+import numpy as np
+
+from embeddingcodec import decode_embedding, embedding_length
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+EMBEDDING_DIM = 3072           # text-embedding-3-large
+SCORE_CHUNK_SIZE = 1000        # rows scored per matrix-vector product
+# ───────────────────────────────────────────────────────────────────────
+
+
+def to_query_vector(vec):
+    """Return `vec` as a float32 array, or None if it is missing/malformed."""
+    return decode_embedding(vec)
+
+
+def build_embedding_matrix(vectors, dim):
+    """
+    Stack `vectors` into a C-contiguous (len(vectors), dim) float32 matrix.
+    Returns (matrix, valid) where `valid[i]` is False for rows that were
+    missing or had the wrong length; those rows are left as zeros.
+    """
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+    valid = np.zeros(len(vectors), dtype=bool)
+    for i, vec in enumerate(vectors):
+        if dim and embedding_length(vec) == dim:
+            arr = decode_embedding(vec)
+            if arr is not None and arr.shape[0] == dim:
+                matrix[i] = arr
+                valid[i] = True
+    return matrix, valid
+
+
+def cosine_similarities(matrix, query):
+    """
+    Cosine similarity of every row of `matrix` against `query`.
+    Zero-norm rows (including the zero rows left for invalid vectors) and a
+    zero-norm query score 0.0. Returns a float64 array of len(matrix).
+    """
+    out = np.zeros(matrix.shape[0], dtype=np.float64)
+    if query is None or matrix.shape[0] == 0 or query.shape[0] != matrix.shape[1]:
+        return out
+    q_norm = float(np.linalg.norm(query))
+    if q_norm == 0:
+        return out
+    row_norms = np.linalg.norm(matrix, axis=1)
+    dots = matrix @ query
+    nz = row_norms > 0
+    out[nz] = dots[nz] / (row_norms[nz] * q_norm)
+    return out
+
+
+def cosine_similarity_matrix(matrix, queries):
+    """
+    Cosine similarity of every row of `matrix` against every row of
+    `queries` with one matrix-matrix product. Zero-norm rows on either side
+    score 0.0. Returns a float64 array of shape (len(matrix), len(queries)).
+    """
+    out = np.zeros((matrix.shape[0], queries.shape[0]), dtype=np.float64)
+    if matrix.shape[0] == 0 or queries.shape[0] == 0 or queries.shape[1] != matrix.shape[1]:
+        return out
+    row_norms = np.linalg.norm(matrix, axis=1)
+    q_norms = np.linalg.norm(queries, axis=1)
+    denom = np.outer(row_norms, q_norms)
+    dots = matrix @ queries.T
+    nz = denom > 0
+    out[nz] = dots[nz] / denom[nz]
+    return out
@@ -0,0 +1,109 @@
+"""
+titlematch.py - Trigram-indexed fuzzy job-title matching
+────────────────────────────────────────────────────────────────────────────
+Replaces the resume-title × JD-title difflib loops in get_common_experiences.
+Scores are still difflib.SequenceMatcher(None, a, b).ratio() on the same
+lower-cased, stripped titles, so `matchScore` is unchanged; the index only
+skips pairs that provably cannot reach the threshold.
+
+Both bounds are exact (they never drop a pair difflib would accept):
+  length    ratio = 2M/(la+lb) ≤ 2·min(la, lb)/(la+lb)
+  trigram   ratio ≥ t needs M ≥ t(la+lb)/2 matching chars, and M ≤ L, the
+            LCS length. Deleting the la-L (lb-L) chars outside the LCS kills
+            at most 3 trigrams each; what survives of both titles lies in
+            the LCS's own trigrams, so the titles share at least
+            (la-2 - 3(la-L)) + (lb-2 - 3(lb-L)) - max(L-2, 0) trigrams.
+Pairs that pass are scored through an LRU shared by the whole process, as
+the same titles recur across thousands of resumes and JDs.
+"""
+
+import difflib
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+# ── CONFIG ─────────────────────────────────────────────────────────────
+TITLE_CACHE_SIZE = 100_000       # memoised (resume title, JD title) ratios
+# ───────────────────────────────────────────────────────────────────────
+
+Q = 3
+EPS = 1e-9
+
+
+def normalize_experiences(exps):
+    """[(lower-cased title, duration)] for entries with a title."""
+    out = []
+    if not isinstance(exps, list):
+        return out
+    for exp in exps:
+        if not isinstance(exp, dict):
+            continue
+        title = str(exp.get("title", "")).lower().strip()
+        if title:
+            out.append((title, exp.get("duration")))
+    return out
+
+
+def trigrams(title):
+    return Counter(title[i:i + Q] for i in range(len(title) - Q + 1))
+
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def title_similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def min_shared_trigrams(la, lb, threshold):
+    """Trigrams two titles of these lengths must share to reach `threshold`."""
+    lcs = math.ceil(threshold * (la + lb) / 2 - EPS)
+    return (la - Q + 1 - Q * (la - lcs)) + (lb - Q + 1 - Q * (lb - lcs)) - max(lcs - Q + 1, 0)
+
+
+class TitleIndex:
+    """Trigram index over a fixed list of normalised titles."""
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.by_length = defaultdict(list)      # title length → [idx]
+        self.postings = defaultdict(list)       # trigram → [(idx, count)]
+        for idx, title in enumerate(self.titles):
+            self.by_length[len(title)].append(idx)
+            for gram, count in trigrams(title).items():
+                self.postings[gram].append((idx, count))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def search(self, title, threshold, inclusive=True):
+        """
+        [(idx, ratio)] of indexed titles scoring ≥ `threshold` against
+        `title` (> when not `inclusive`), in index order.
+        """
+        if not self.titles or not title:
+            return []
+        la = len(title)
+        shared = defaultdict(int)
+        for gram, count in trigrams(title).items():
+            for idx, other in self.postings.get(gram, ()):
+                shared[idx] += min(count, other)
+
+        # Minimum shared trigrams per indexed length; None → length bound fails
+        need = {}
+        candidates = []
+        for lb, bucket in self.by_length.items():
+            if 2 * min(la, lb) < threshold * (la + lb) - EPS:
+                continue
+            need[lb] = min_shared_trigrams(la, lb, threshold)
+            if need[lb] <= 0:
+                candidates.extend(bucket)
+        for idx, count in shared.items():
+            lb_need = need.get(len(self.titles[idx]))
+            if lb_need is not None and 0 < lb_need <= count:
+                candidates.append(idx)
+
+        out = []
+        for idx in sorted(candidates):
+            score = title_similarity(title, self.titles[idx])
+            if score >= threshold if inclusive else score > threshold:
+                out.append((idx, score))
+        return out